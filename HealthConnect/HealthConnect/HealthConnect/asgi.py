@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HealthConnect.settings')
 
 application = get_asgi_application()
+
+# Load the username/email filter before the first signup needs it
+from core.availability import warm  # noqa: E402
+
+warm()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,13 +81,58 @@ WSGI_APPLICATION = 'HealthConnect.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer; busy_timeout makes a writer wait for the lock instead of
+# failing with "database is locked"; synchronous=NORMAL is durable in WAL
+# mode except for the last commits on power loss.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,  # ms
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,  # bytes
+    'cache_size': -20000,  # negative = KiB, i.e. ~20 MB per connection
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock when a transaction starts, so two
+            # read-then-write transactions can't deadlock upgrading their locks
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Keep connections open between requests; check them before reuse
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replicas (core.replicas). Safe requests to the API viewsets and admin
+# changelists read from one of ALIASES; users who wrote stay on the primary
+# for STICKY_SECONDS, which must exceed the replication lag. Pins are kept in
+# CACHE_ALIAS, which needs a shared backend when running several workers.
+# To try it locally, point HEALTHCONNECT_SQLITE_REPLICA at a second file and
+# run `manage.py replicate_sqlite` next to the server.
+SQLITE_REPLICA = os.environ.get('HEALTHCONNECT_SQLITE_REPLICA')
+if SQLITE_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': SQLITE_REPLICA,
+        'OPTIONS': {'init_command': DATABASES['default']['OPTIONS']['init_command'] + ';PRAGMA query_only=ON'},
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_REPLICAS = {
+    'ALIASES': ['replica'] if SQLITE_REPLICA else [],
+    'STICKY_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
 }
 
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -136,16 +183,128 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'core.Users'
 
+# Users may sign in with either their email or their username
+AUTHENTICATION_BACKENDS = [
+    'core.backends.EmailOrUsernameBackend',
+]
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # orjson-backed JSON (core.renderers / core.parsers); both fall back to
+    # the stdlib implementation when orjson isn't installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.CachedCountPagination',
     'PAGE_SIZE': 10,
+    # Throttles key on REMOTE_ADDR. Behind N reverse proxies set this to N so
+    # the client address is read from X-Forwarded-For; left as None, DRF would
+    # trust whatever X-Forwarded-For the client sends.
+    'NUM_PROXIES': 0,
+}
+
+# Caching
+# The verified-doctor directory is cached through DIRECTORY_CACHE_ALIAS. Local
+# memory is per process; multi-worker deployments should point the alias at a
+# shared backend, e.g. FileBasedCache ('LOCATION': '/var/tmp/healthconnect_cache')
+# or RedisCache, so invalidations are seen by every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'healthconnect-default',
+    },
+}
+
+DIRECTORY_CACHE_ALIAS = 'default'
+DIRECTORY_CACHE_TIMEOUT = 300  # seconds
+
+# Row counts of paginated lists and admin changelists (core.counts): exact up
+# to EXACT_LIMIT rows, estimated or capped beyond. API counts are cached in
+# CACHE_ALIAS until a table they read is written, or for CACHE_TIMEOUT seconds.
+ROW_COUNTS = {
+    'EXACT_LIMIT': 10_000,
+    'CACHE_ALIAS': 'default',
+    'CACHE_TIMEOUT': 300,  # seconds
+}
+
+# Batch actions (/api/<patients|doctors|users>/batch/, core.batch)
+BATCH_REQUESTS = {
+    'MAX_ITEMS': 500,
+}
+
+# Resolved API tokens are cached per process (core.authentication).
+# Signal-based invalidation is local, so in 'bounded' mode entries expire after
+# MAX_STALENESS seconds. MODE 'local' keeps them for TTL: only use it with a
+# single server process, never with several workers.
+TOKEN_AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,  # seconds, used in 'local' mode
+    'MODE': 'bounded',
+    'MAX_STALENESS': 5,  # seconds, used in 'bounded' mode
+}
+
+# Thread pool for password hashing in the async login/signup views
+# (core.hashing). Requests beyond WORKERS + MAX_QUEUE get 503 + Retry-After.
+PASSWORD_HASHING_POOL = {
+    'WORKERS': 4,
+    'MAX_QUEUE': 16,
+    'RETRY_AFTER': 1,  # seconds
+}
+
+# Profile pictures are resized and stripped of metadata off the request path
+# (core.images) by a local thread pool once the upload is committed.
+PROFILE_PICTURE_PIPELINE = {
+    'WORKERS': 1,
+    'EAGER': False,
+}
+
+# Username/email availability (core.availability): a counting Bloom filter
+# per process, about 20 bytes per expected account at a 1% false-positive rate.
+ACCOUNT_NAME_FILTER = {
+    'EXPECTED_ACCOUNTS': 100_000,
+    'ERROR_RATE': 0.01,
+    'REBUILD_SECONDS': 300,  # bounds staleness from other workers' writes
+    'BUILD_AT_STARTUP': True,
+}
+
+# "Doctors near me" (core.proximity): pincode coordinates come from
+# manage.py import_pincodes; each process keeps its own grid of doctors.
+DOCTOR_PROXIMITY = {
+    'CELL_DEGREES': 0.1,
+    'REBUILD_SECONDS': 300,  # bounds staleness from other workers' writes
+    'DEFAULT_RADIUS_KM': 10,
+    'MAX_RADIUS_KM': 100,
+    'DEFAULT_LIMIT': 10,
+    'MAX_LIMIT': 50,
+}
+
+# Login/signup throttling (core.throttling): token buckets per client IP and
+# per username/email, checked before any query or password hash. The signup
+# availability check has a per-IP bucket. Buckets are
+# per process unless CACHE_ALIAS names a shared cache.
+THROTTLE = {
+    'RATES': {
+        'login.ip': '30/min',
+        'login.identifier': '10/min',
+        'signup.ip': '20/hour',
+        'signup.identifier': '5/hour',
+        'availability.ip': '60/min',
+    },
+    'SHARDS': 16,
+    'MAX_KEYS': 100_000,
+    'CACHE_ALIAS': None,
 }
 
 # CORS Settings
@@ -173,12 +332,21 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-match',
+    'if-modified-since',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
 
+# Let the frontend read validators for conditional requests (If-Match)
+CORS_EXPOSE_HEADERS = [
+    'etag',
+    'last-modified',
+]
+
 # Security for Production
 if not DEBUG:
     ALLOWED_HOSTS = ['yourdomain.com', 'www.yourdomain.com']
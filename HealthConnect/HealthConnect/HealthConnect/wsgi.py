@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HealthConnect.settings')
 
 application = get_wsgi_application()
+
+# Load the username/email filter before the first signup needs it
+from core.availability import warm  # noqa: E402
+
+warm()
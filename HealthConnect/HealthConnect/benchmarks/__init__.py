@@ -0,0 +1,70 @@
+"""
+Micro-benchmarks for the HealthConnect API.
+
+Each module is runnable on its own, e.g. ``python -m benchmarks.user_search``
+from the directory containing ``manage.py``. Benchmarks run against a scratch
+in-memory copy of the schema, never against ``db.sqlite3``.
+"""
+import os
+import statistics
+import time
+
+import django
+
+from core.seeding import fake_user_fields
+
+
+def setup(database=None):
+    """Configure Django and migrate a scratch database (in memory unless a path is given)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HealthConnect.settings')
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    if database:
+        connection.settings_dict['TEST']['NAME'] = database
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    return connection
+
+
+def fake_users(count, start=0, seed=0, password='!'):
+    """Yield unsaved ``Users`` with plausible, unique names."""
+    from core.models import Users
+    for fields in fake_user_fields(count, start, seed):
+        yield Users(password=password, **fields)
+
+
+def populate_users(total, batch_size=5000, **kwargs):
+    from core.models import Users
+    existing = Users.objects.count()
+    while existing < total:
+        size = min(batch_size, total - existing)
+        Users.objects.bulk_create(fake_users(size, start=existing, **kwargs), batch_size=batch_size)
+        existing += size
+
+
+def measure(func, repeat=20, warmup=2):
+    """Return timing stats (milliseconds) for ``repeat`` calls of ``func``."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'p50': statistics.median(samples),
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        'mean': statistics.fmean(samples),
+    }
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = '  '.join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(str(c).ljust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,96 @@
+"""
+Username/email availability: the Bloom filter (core.availability) against
+one indexed query per check, and duplicate signups with and without the
+pre-check.
+
+    python -m benchmarks.account_names [--users 100000] [--repeat 200]
+
+Signups use the project's real password hasher, so the old path pays a full
+PBKDF2 run before the unique constraint refuses the name.
+"""
+import argparse
+import logging
+import time
+
+from benchmarks import measure, populate_users, print_table, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import IntegrityError, transaction
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    from core.availability import account_names
+    from core.models import Users
+    from core.serializers import PatientCreateSerializer
+
+    # One client address: the availability and signup buckets would run dry
+    override_settings(THROTTLE={'RATES': {}}).enable()
+    populate_users(args.users)
+    started = time.perf_counter()
+    account_names.build()
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f'Filter over {args.users} accounts built in {elapsed:.0f} ms, '
+          f'{account_names._filter.size / 2 ** 20:.1f} MiB of counters')
+
+    taken = Users.objects.order_by('pk').values_list('username', 'email').first()
+    counter = iter(range(10 ** 9))
+
+    def query_check(username, email):
+        return Users.objects.filter(username=username).exists(), Users.objects.filter(email=email).exists()
+
+    def free():
+        n = next(counter)
+        return f'free{n}', f'free{n}@example.com'
+
+    client = APIClient()
+    # The duplicate signups below are 400s by design
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    rows = []
+    for label, func in [
+        ('free name, filter', lambda: account_names.taken(**dict(zip(('username', 'email'), free())))),
+        ('free name, 2 queries', lambda: query_check(*free())),
+        ('taken name, filter + confirm', lambda: account_names.taken(username=taken[0], email=taken[1])),
+        ('taken name, 2 queries', lambda: query_check(*taken)),
+        ('GET availability, free', lambda: client.get('/api/signup/availability/', dict(
+            zip(('username', 'email'), free())))),
+    ]:
+        stats = measure(func, repeat=args.repeat)
+        rows.append([label, '%.3f' % stats['p50'], '%.3f' % stats['p99']])
+
+    before = dict(account_names.stats)
+    for _ in range(10_000):
+        account_names.taken(**dict(zip(('username', 'email'), free())))
+    false_positives = account_names.stats['false_positives'] - before['false_positives']
+    print(f'False positives: {false_positives / 200:.2f}% of 20000 free names')
+
+    data = {'username': taken[0], 'email': taken[1], 'password': 'secret-pass',
+            'first_name': 'Dup', 'last_name': 'User', 'user_type': 'patient'}
+
+    def duplicate_without_precheck():
+        serializer = PatientCreateSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            return
+        raise AssertionError('duplicate was created')
+
+    for label, func in [
+        ('duplicate signup, constraint only (old)', duplicate_without_precheck),
+        ('duplicate signup, pre-checked', lambda: client.post('/api/signup/', data, format='json')),
+    ]:
+        stats = measure(func, repeat=20)
+        rows.append([label, '%.3f' % stats['p50'], '%.3f' % stats['p99']])
+    print_table(['check', 'p50 ms', 'p99 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
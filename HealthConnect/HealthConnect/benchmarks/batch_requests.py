@@ -0,0 +1,73 @@
+"""
+N single-record requests vs. one batch request, for reads and partial updates.
+
+    python -m benchmarks.batch_requests [--users 20000] [--sizes 10 50 200] [--database /tmp/batch.sqlite3]
+
+Accounts come from the seed command. A doctor's token authenticates every
+request, as the frontend's would. Singles are ``GET``/``PATCH
+/api/patients/<id>/``; batches are ``GET /api/patients/batch/?ids=`` and
+``PATCH /api/patients/batch/``. With ``--database`` the scratch database is a
+file, so each single PATCH pays for its own commit.
+"""
+import argparse
+import random
+
+from benchmarks import measure, print_table, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--database', help='SQLite file for the scratch database (default: in memory)')
+    args = parser.parse_args()
+
+    setup(args.database)
+    from django.core.management import call_command
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+
+    from core.models import Patient, Users
+
+    call_command('seed', users=args.users, verbosity=0)
+    client = APIClient()
+    # Batch updates are for staff
+    staff = Users.objects.filter(user_type='doctor').first()
+    Users.objects.filter(pk=staff.pk).update(is_staff=True)
+    token = Token.objects.create(user=staff)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    patient_ids = list(Patient.objects.values_list('pk', flat=True))
+    rng = random.Random(0)
+
+    rows = []
+    for size in args.sizes:
+        ids = rng.sample(patient_ids, size)
+        updates = [{'id': pk, 'allergies': rng.choice(['Pollen', 'Dust', 'Peanuts'])} for pk in ids]
+
+        def single_reads():
+            for pk in ids:
+                client.get(f'/api/patients/{pk}/')
+
+        def batch_read():
+            client.get('/api/patients/batch/', {'ids': ','.join(map(str, ids))})
+
+        def single_updates():
+            for update in updates:
+                client.patch(f"/api/patients/{update['id']}/", update, format='json')
+
+        def batch_update():
+            client.patch('/api/patients/batch/', updates, format='json')
+
+        for label, single, batch in (('read', single_reads, batch_read), ('update', single_updates, batch_update)):
+            singles = measure(single, repeat=args.repeat, warmup=1)
+            batches = measure(batch, repeat=args.repeat, warmup=1)
+            rows.append([
+                label, size, '%.1f' % singles['p50'], '%.1f' % batches['p50'],
+                '%.1fx' % (singles['p50'] / batches['p50']),
+            ])
+    print_table(['operation', 'records', 'N singles p50 ms', 'one batch p50 ms', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
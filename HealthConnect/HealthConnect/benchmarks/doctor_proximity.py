@@ -0,0 +1,103 @@
+"""
+"Doctors near me": the in-memory grid (core.proximity) against a naive scan.
+
+    python -m benchmarks.doctor_proximity [--doctors 100000] [--repeat 50]
+
+Every city gets a couple of hundred pincodes scattered within ~30 km of its
+centre and every user is made a doctor (90% verified) at one of them. The
+naive scan is what a client does today: read every verified doctor with its
+pincode and measure the distance to each one. Endpoint timings cover the
+whole request through the test client.
+"""
+import argparse
+import random
+import time
+
+from benchmarks import measure, populate_users, print_table, setup
+from benchmarks.doctor_search import populate_doctors
+from core.seeding import CITIES, fake_pincodes
+
+
+def populate_pincodes():
+    """Pincodes around each city centre; returns them grouped by city"""
+    from core.models import Pincode
+    by_city = fake_pincodes(random.Random(0))
+    Pincode.objects.bulk_create(
+        Pincode(pincode=code, latitude=latitude, longitude=longitude)
+        for rows in by_city.values() for code, latitude, longitude in rows
+    )
+    return {city: [code for code, latitude, longitude in rows] for city, rows in by_city.items()}
+
+
+def scatter_users(by_city):
+    """Move each user to a random pincode of their city"""
+    from core.models import Users
+    rng = random.Random(1)
+    assigned = {}
+    for pk, city in Users.objects.values_list('pk', 'city').iterator():
+        assigned.setdefault(rng.choice(by_city[city]), []).append(pk)
+    for pincode, pks in assigned.items():
+        for start in range(0, len(pks), 500):
+            Users.objects.filter(pk__in=pks[start:start + 500]).update(pincode=pincode)
+
+
+def naive_nearest(latitude, longitude, radius_km, limit):
+    from core.models import Doctor, Pincode
+    from core.proximity import haversine_km, normalize_pincode
+    locations = {p: (lat, lon) for p, lat, lon in Pincode.objects.values_list('pincode', 'latitude', 'longitude')}
+    matches = []
+    for doctor_id, pincode in Doctor.objects.filter(is_verified=True).values_list('pk', 'user__pincode'):
+        location = locations.get(normalize_pincode(pincode))
+        if location is None:
+            continue
+        distance = haversine_km(latitude, longitude, *location)
+        if distance <= radius_km:
+            matches.append((distance, doctor_id))
+    matches.sort()
+    return matches[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--doctors', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.test import APIClient
+
+    from core.models import Doctor, Users
+    from core.proximity import doctor_locations, pincode_location
+
+    populate_users(args.doctors)
+    populate_doctors()
+    scatter_users(populate_pincodes())
+    client = APIClient()
+    client.force_authenticate(Users.objects.first())
+
+    started = time.perf_counter()
+    doctor_locations.build()
+    print(f'Grid of {len(doctor_locations)} doctors built in {(time.perf_counter() - started) * 1000:.0f} ms')
+    doctor = Doctor.objects.filter(is_verified=True).first()
+    refresh = measure(lambda: doctor_locations.refresh(pk=doctor.pk), repeat=args.repeat)
+    print(f'Incremental refresh after a save: p50 {refresh["p50"]:.2f} ms')
+    print()
+
+    pincode = CITIES[3][2]  # Bengaluru
+    location = pincode_location(pincode)
+    rows = []
+    for radius_km, limit in [(2, 10), (10, 10), (25, 10), (25, 50), (100, 50)]:
+        within = len(doctor_locations.nearest(*location, radius_km, args.doctors))
+        assert naive_nearest(*location, radius_km, limit) == doctor_locations.nearest(*location, radius_km, limit)
+        naive = measure(lambda: naive_nearest(*location, radius_km, limit), repeat=max(args.repeat // 10, 3))
+        grid = measure(lambda: doctor_locations.nearest(*location, radius_km, limit), repeat=args.repeat)
+        endpoint = measure(lambda: client.get('/api/doctors/nearby/', {
+            'pincode': pincode, 'radius': radius_km, 'limit': limit}), repeat=args.repeat)
+        rows.append([f'{radius_km} km, {limit} nearest', within, '%.1f' % naive['p50'], '%.2f' % grid['p50'],
+                     '%.2f' % grid['p99'], '%.1f' % endpoint['p50'], '%.1f' % endpoint['p99']])
+    print_table(['query', 'within radius', 'naive p50 ms', 'grid p50 ms', 'grid p99 ms',
+                 'endpoint p50 ms', 'endpoint p99 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
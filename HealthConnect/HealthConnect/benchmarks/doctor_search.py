@@ -0,0 +1,89 @@
+"""
+Latency of DoctorViewSet.search: one page plus facet counts per request.
+
+    python -m benchmarks.doctor_search [--doctors 100000] [--repeat 50] [--cold-repeat 10]
+
+Every user is made a doctor (90% verified) with a generated clinic name and
+bio. Timings cover the whole request through the test client, authentication,
+serialization and rendering included. Responses come from the directory
+cache once computed; the cold columns invalidate it before every request.
+"""
+import argparse
+import random
+
+from benchmarks import measure, populate_users, print_table, setup
+from core.seeding import CITIES, fake_bio, fake_clinic_name
+
+
+def populate_doctors():
+    from core.models import Doctor, Users
+    rng = random.Random(0)
+    specializations = [value for value, label in Doctor.SPECIALIZATION_CHOICES]
+    doctors = []
+    for pk in Users.objects.values_list('pk', flat=True).order_by('pk').iterator():
+        doctors.append(Doctor(
+            user_id=pk, license_number=f'LIC-{pk}', specialization=rng.choice(specializations),
+            clinic_name=fake_clinic_name(rng), bio=fake_bio(rng),
+            experience_years=rng.randint(0, 40), is_verified=rng.random() < 0.9,
+        ))
+        if len(doctors) == 5000:
+            Doctor.objects.bulk_create(doctors)
+            doctors = []
+    Doctor.objects.bulk_create(doctors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--doctors', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--cold-repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.test import APIClient
+
+    from core.cache import verified_doctors_cache
+    from core.models import Users
+
+    populate_users(args.doctors)
+    populate_doctors()
+    client = APIClient()
+    client.force_authenticate(Users.objects.first())
+    city = CITIES[0][0]
+
+    def second_page(params):
+        link = client.get('/api/doctors/search/', params).data['next']
+        return lambda: client.get(link)
+
+    cases = [
+        ('no filters', {}),
+        ('specialization', {'specialization': 'cardiology'}),
+        ('specialization + city', {'specialization': 'cardiology', 'city': city}),
+        ('experience range', {'min_experience': 10, 'max_experience': 12}),
+        ('q, common word', {'q': 'clinic'}),
+        ('q, two words', {'q': 'heart surgery'}),
+        ('q, prefix', {'q': 'rehab'}),
+        ('q + all filters', {'q': 'sleep', 'specialization': 'neurology', 'city': city,
+                             'min_experience': 5}),
+    ]
+    rows = []
+    for label, params in cases:
+        data = client.get('/api/doctors/search/', params).data
+        requests = [(label, lambda params=params: client.get('/api/doctors/search/', params))]
+        if data['next']:
+            requests.append((f'{label}, page 2', second_page(params)))
+        for name, request in requests:
+            stats = measure(request, repeat=args.repeat)
+
+            def cold(request=request):
+                verified_doctors_cache.invalidate()
+                request()
+
+            cold_stats = measure(cold, repeat=args.cold_repeat, warmup=0)
+            rows.append([name, data['count'], '%.1f' % stats['p50'], '%.1f' % stats['p99'],
+                         '%.1f' % cold_stats['p50'], '%.1f' % cold_stats['p99']])
+    print_table(['query', 'matches', 'p50 ms', 'p99 ms', 'cold p50 ms', 'cold p99 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Account import throughput: looping over PatientCreateSerializer vs. manage.py import_accounts.
+
+    python -m benchmarks.import_accounts [--records 20000] [--workers N] [--fast-hasher]
+
+With the production PBKDF2 hasher the command's speed-up is bounded by the
+number of hashing workers (cores). --fast-hasher swaps in MD5 to measure the
+validation + write path on its own.
+"""
+import argparse
+import csv
+import io
+import os
+import tempfile
+import time
+
+from benchmarks import print_table, setup
+from core.seeding import FIRST_NAMES, LAST_NAMES
+
+
+def write_csv(path, count, prefix):
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['username', 'email', 'password', 'first_name', 'last_name', 'city', 'phone_number'])
+        for i in range(count):
+            first, last = FIRST_NAMES[i % len(FIRST_NAMES)], LAST_NAMES[i % len(LAST_NAMES)]
+            writer.writerow([f'{prefix}{i}', f'{prefix}{i}@example.com', f'pw-{i}-secret',
+                             first, last, 'Mumbai', f'98{i:08d}'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=20_000)
+    parser.add_argument('--baseline-records', type=int, help='Records for the serializer loop '
+                        '(defaults to --records; lower it when hashing is slow)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--fast-hasher', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # File-backed, so per-row commits pay for durability as they would in production
+        setup(database=os.path.join(tmp, 'bench.sqlite3'))
+        run(args, tmp)
+
+
+def run(args, tmp):
+    from django.conf import settings
+    from django.core.management import call_command
+    from rest_framework.authtoken.models import Token
+
+    from core.serializers import PatientCreateSerializer
+
+    if args.fast_hasher:
+        settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+    baseline = args.baseline_records or args.records
+    loop_path = os.path.join(tmp, 'loop.csv')
+    import_path = os.path.join(tmp, 'import.csv')
+    write_csv(loop_path, baseline, 'loop')
+    write_csv(import_path, args.records, 'bulk')
+
+    started = time.perf_counter()
+    with open(loop_path, newline='') as handle:
+        for row in csv.DictReader(handle):
+            serializer = PatientCreateSerializer(data=row)
+            serializer.is_valid(raise_exception=True)
+            patient = serializer.save()
+            Token.objects.create(user=patient.user)
+    loop_rate = baseline / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    call_command('import_accounts', import_path, workers=args.workers,
+                 batch_size=args.batch_size, stdout=io.StringIO())
+    import_rate = args.records / (time.perf_counter() - started)
+
+    print_table(['method', 'records', 'records/s'], [
+        ['serializer loop', baseline, '%.0f' % loop_rate],
+        [f'import_accounts (workers={args.workers})', args.records, '%.0f' % import_rate],
+        ['speed-up', '', '%.1fx' % (import_rate / loop_rate)],
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+JSON render/parse throughput: DRF's stdlib JSONRenderer/JSONParser vs. the
+orjson-backed FastJSONRenderer/FastJSONParser.
+
+Payloads are user-list pages, shaped like UserViewSet.list output, of 1 to
+100k rows.
+
+    python -m benchmarks.json_codec [--rows 1 100 10000 100000]
+"""
+import argparse
+import io
+import itertools
+
+from benchmarks import measure, print_table, setup
+from core.seeding import CITIES, FIRST_NAMES, LAST_NAMES
+
+
+def payload(rows):
+    import datetime
+    joined = datetime.datetime(2024, 5, 17, 9, 30, 12, 123456, tzinfo=datetime.timezone.utc)
+    names = itertools.cycle(itertools.product(FIRST_NAMES, LAST_NAMES, CITIES))
+    results = []
+    for i, (first, last, (city, state, pincode)) in zip(range(rows), names):
+        results.append({
+            'id': i + 1, 'username': f'{first.lower()}.{last.lower()}{i}',
+            'email': f'{first.lower()}.{last.lower()}{i}@example.com',
+            'first_name': first, 'last_name': last,
+            'profile_picture': None, 'profile_picture_url': None, 'profile_picture_variants': None,
+            'user_type': 'patient', 'address_line1': f'{i} MG Road', 'city': city,
+            'state': state, 'pincode': pincode,
+            # Serializers hand over strings; raw datetimes exercise the default hook
+            'date_joined': joined if i % 2 else joined.isoformat(),
+        })
+    return {'results': results, 'count': rows, 'next': None, 'previous': None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 10, 100, 1000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from core.parsers import FastJSONParser
+    from core.renderers import FastJSONRenderer
+
+    table = []
+    for rows in args.rows:
+        data = payload(rows)
+        body = JSONRenderer().render(data)
+        assert FastJSONRenderer().render(data) == body
+        repeat = max(3, min(args.repeat * 100, args.repeat * 10_000 // max(rows, 1)))
+        mb = len(body) / 1e6
+        for label, slow, fast in [
+            ('render', lambda: JSONRenderer().render(data), lambda: FastJSONRenderer().render(data)),
+            ('parse', lambda: JSONParser().parse(io.BytesIO(body)),
+             lambda: FastJSONParser().parse(io.BytesIO(body))),
+        ]:
+            stdlib = measure(slow, repeat=repeat)
+            orjson = measure(fast, repeat=repeat)
+            table.append([
+                label, rows, '%.1f' % (len(body) / 1024),
+                '%.3f' % stdlib['p50'], '%.3f' % orjson['p50'],
+                '%.0f' % (mb / stdlib['p50'] * 1000), '%.0f' % (mb / orjson['p50'] * 1000),
+                '%.1fx' % (stdlib['p50'] / orjson['p50']),
+            ])
+    print_table(['op', 'rows', 'KiB', 'stdlib p50 ms', 'orjson p50 ms',
+                 'stdlib MB/s', 'orjson MB/s', 'speedup'], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Username logins per second per core: the old two-authenticate path vs. EmailOrUsernameBackend.
+
+    python -m benchmarks.login [--logins 20]
+
+Uses the project's real password hasher, so each login costs a full PBKDF2 run.
+"""
+import argparse
+import time
+
+from benchmarks import print_table, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.backends import ModelBackend
+
+    from core.backends import EmailOrUsernameBackend
+    from core.models import Users
+
+    user = Users.objects.create_user(
+        email='bench@example.com', username='bench', password='bench-password',
+        first_name='Bench', last_name='User', user_type='patient',
+    )
+
+    def legacy(identifier, password):
+        # login_view before EmailOrUsernameBackend: email attempt, then username lookup
+        backend = ModelBackend()
+        found = backend.authenticate(None, username=identifier, password=password)
+        if found is None:
+            try:
+                by_username = Users.objects.get(username=identifier)
+            except Users.DoesNotExist:
+                return None
+            found = backend.authenticate(None, username=by_username.email, password=password)
+        return found
+
+    def single(identifier, password):
+        return EmailOrUsernameBackend().authenticate(None, username=identifier, password=password)
+
+    rows = []
+    for label, func in [('ModelBackend x2 (legacy)', legacy), ('EmailOrUsernameBackend', single)]:
+        for identifier in ('bench', 'bench@example.com'):
+            started = time.perf_counter()
+            for _ in range(args.logins):
+                assert func(identifier, 'bench-password') == user
+            elapsed = time.perf_counter() - started
+            rows.append([label, identifier, '%.2f' % (args.logins / elapsed),
+                         '%.1f' % (elapsed / args.logins * 1000)])
+    print_table(['path', 'identifier', 'logins/s/core', 'ms/login'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Mixed-traffic load test: /api/users/me/ latency while logins hammer the server.
+
+    python -m benchmarks.login_storm [--seconds 5] [--storm 32]
+
+Requests go through Django's ASGI handler in-process (AsyncClient). Synchronous
+views share one thread under ASGI, so a storm on /api/login/ stalls /me/. The
+same storm on /api/async/login/ hashes in the bounded pool, and /me/ stays flat.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks import print_table, setup
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else float('nan')
+
+
+async def reader(client, token, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get('/api/users/me/', headers={'Authorization': f'Token {token}'})
+        assert response.status_code == 200, response.status_code
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def attacker(client, url, stop, outcomes):
+    while not stop.is_set():
+        response = await client.post(url, {'username': 'storm', 'password': 'storm-password'},
+                                     content_type='application/json')
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response['Retry-After']) / 10)
+
+
+async def phase(client, token, url, seconds, storm):
+    stop = asyncio.Event()
+    latencies, outcomes = [], {}
+    tasks = [asyncio.create_task(reader(client, token, stop, latencies))]
+    if url:
+        tasks += [asyncio.create_task(attacker(client, url, stop, outcomes)) for _ in range(storm)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return latencies, outcomes
+
+
+async def run(args):
+    from asgiref.sync import sync_to_async
+    from django.test import AsyncClient
+    from rest_framework.authtoken.models import Token
+
+    from core.models import Users
+
+    def fixtures():
+        Users.objects.create_user(email='storm@example.com', username='storm', password='storm-password',
+                                  first_name='Storm', last_name='User', user_type='patient')
+        reader_user = Users.objects.create_user(email='reader@example.com', username='reader',
+                                                first_name='Read', last_name='Er', user_type='patient')
+        return Token.objects.create(user=reader_user).key
+
+    token = await sync_to_async(fixtures)()
+    client = AsyncClient()
+    rows = []
+    for label, url in [('no storm', None), ('storm on /api/login/', '/api/login/'),
+                       ('storm on /api/async/login/', '/api/async/login/')]:
+        latencies, outcomes = await phase(client, token, url, args.seconds, args.storm)
+        logins = outcomes.get(200, 0)
+        rows.append([
+            label, len(latencies),
+            '%.1f' % percentile(latencies, 0.5), '%.1f' % percentile(latencies, 0.95),
+            '%.1f' % percentile(latencies, 0.99),
+            '%.1f' % (logins / args.seconds), outcomes.get(503, 0),
+        ])
+    print_table(['phase', '/me/ requests', 'p50 ms', 'p95 ms', 'p99 ms', 'logins/s', '503s'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--storm', type=int, default=32, help='concurrent login clients')
+    args = parser.parse_args()
+    setup()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Credential stuffing against the login throttle (core.throttling).
+
+    python -m benchmarks.login_throttle [--seconds 10] [--attackers 32] [--rate 100] [--users 200]
+
+Requests go through Django's ASGI handler in-process, as in login_storm. One
+attacking address tries a new username on every request, at up to
+``--rate`` requests a second across its clients (this box's CPU runs both
+the attackers and the server). Meanwhile,
+legitimate users each log in once from their own address, and a reader polls
+/api/users/me/. Each login endpoint is attacked twice: once with the throttle
+off and once with the default rates. Passwords use the project's real
+hasher, so every login the throttle lets through costs a full PBKDF2 run.
+
+The attack is measured once it is under way: the attacker's buckets start
+empty. A fresh attacker first gets its bucket's burst, 30 logins at the
+default rate, and after that only the refill rate (one every two seconds).
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks import print_table, setup
+from benchmarks.login_storm import percentile
+
+ATTACKER_ADDRESS = '203.0.113.9'
+
+
+def client_at(address):
+    """AsyncClient whose requests come from ``address`` (the ASGI scope's client)"""
+    from django.test import AsyncClient
+
+    class AddressedClient(AsyncClient):
+        def _base_scope(self, **request):
+            scope = super()._base_scope(**request)
+            scope['client'] = [address, 0]
+            return scope
+
+    return AddressedClient()
+
+
+async def reader(token, stop, latencies):
+    client = client_at('10.0.0.1')
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get('/api/users/me/', headers={'Authorization': f'Token {token}'})
+        assert response.status_code == 200, response.status_code
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def legitimate(url, users, stop, latencies, outcomes):
+    """Each user logs in once, from their own address, until the phase ends"""
+    for i in range(users):
+        if stop.is_set():
+            break
+        client = client_at(f'10.1.{i // 250}.{i % 250 + 1}')
+        started = time.perf_counter()
+        response = await client.post(url, {'username': f'legit{i}', 'password': 'legit-password'},
+                                     content_type='application/json')
+        latencies.append((time.perf_counter() - started) * 1000)
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+        await asyncio.sleep(0.02)
+
+
+async def attacker(url, stop, counter, outcomes, pause):
+    client = client_at(ATTACKER_ADDRESS)
+    while not stop.is_set():
+        username = f'victim{next(counter)}'
+        response = await client.post(url, {'username': username, 'password': 'guess'},
+                                     content_type='application/json')
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response['Retry-After']) / 10)
+        await asyncio.sleep(pause)
+
+
+async def phase(token, url, attack, args):
+    stop = asyncio.Event()
+    reads, logins, legit_outcomes, attack_outcomes = [], [], {}, {}
+    counter = iter(range(10 ** 9))
+    tasks = [asyncio.create_task(reader(token, stop, reads)),
+             asyncio.create_task(legitimate(url, args.users, stop, logins, legit_outcomes))]
+    if attack:
+        tasks += [asyncio.create_task(attacker(url, stop, counter, attack_outcomes, args.attackers / args.rate))
+                  for _ in range(args.attackers)]
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return reads, logins, legit_outcomes, attack_outcomes
+
+
+async def run(args):
+    from asgiref.sync import sync_to_async
+    from django.contrib.auth.hashers import make_password
+    from django.test import override_settings
+    from rest_framework.authtoken.models import Token
+
+    from core.models import Users
+    from core.throttling import check, get_config, parse_rate, throttle_buckets
+
+    def fixtures():
+        password = make_password('legit-password')
+        Users.objects.bulk_create(
+            Users(username=f'legit{i}', email=f'legit{i}@example.com', password=password,
+                  first_name='Legit', last_name='User', user_type='patient')
+            for i in range(args.users)
+        )
+        reader_user = Users.objects.create_user(email='reader@example.com', username='reader',
+                                                first_name='Read', last_name='Er', user_type='patient')
+        return Token.objects.create(user=reader_user).key
+
+    token = await sync_to_async(fixtures)()
+    rows = []
+    for label, url, attack, throttled in [
+        ('no attack', '/api/async/login/', False, True),
+        ('attack /api/async/login/, throttle off', '/api/async/login/', True, False),
+        ('attack /api/async/login/, throttle on', '/api/async/login/', True, True),
+        ('attack /api/login/, throttle off', '/api/login/', True, False),
+        ('attack /api/login/, throttle on', '/api/login/', True, True),
+    ]:
+        throttle_buckets.clear()
+        with override_settings(THROTTLE={} if throttled else {'RATES': {}}):
+            if attack and throttled:
+                capacity, _ = parse_rate(get_config()['RATES']['login.ip'])
+                for _ in range(capacity):
+                    check('login', ATTACKER_ADDRESS, None)
+                throttle_buckets.stats.reset()
+            reads, logins, legit_outcomes, attack_outcomes = await phase(token, url, attack, args)
+        attempts = sum(attack_outcomes.values())
+        rows.append([
+            label,
+            '%.1f' % percentile(logins, 0.5), '%.1f' % percentile(logins, 0.99),
+            '%d/%d' % (legit_outcomes.get(200, 0), len(logins)),
+            '%.1f' % percentile(reads, 0.5), '%.1f' % percentile(reads, 0.99),
+            attempts, attempts - attack_outcomes.get(429, 0) - attack_outcomes.get(503, 0),
+        ])
+    print_table(['phase', 'login p50 ms', 'login p99 ms', 'logins ok', '/me/ p50 ms', '/me/ p99 ms',
+                 'attack requests', 'attack hashes'], rows)
+    print(f'Throttle counters (last phase): {throttle_buckets.stats.snapshot()}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--attackers', type=int, default=32, help='concurrent attacking clients')
+    parser.add_argument('--rate', type=float, default=100, help='attack requests per second, at most')
+    parser.add_argument('--users', type=int, default=200, help='legitimate users logging in')
+    args = parser.parse_args()
+    setup()
+    # Refused logins are logged, 503s as errors
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
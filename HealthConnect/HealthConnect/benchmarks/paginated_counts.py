@@ -0,0 +1,85 @@
+"""
+Paginated list requests with and without the count cache.
+
+    python -m benchmarks.paginated_counts [--users 200000] [--repeat 30]
+
+Accounts come from the seed command (one in ten a doctor). Each case pages
+through a list endpoint three ways:
+
+- "exact": an exact COUNT(*) on every request, as before CachedCountPagination
+- "uncached": the count cache emptied before every request, so counts above
+  ROW_COUNTS['EXACT_LIMIT'] are estimated or capped
+- "cached": steady state, where the count comes from the cache
+
+Timings cover the whole request through the test client.
+"""
+import argparse
+
+from benchmarks import measure, print_table, setup
+
+CASES = [
+    ('patients', '/api/patients/', {}),
+    ('doctors', '/api/doctors/', {}),
+    ('users', '/api/users/', {}),
+    ('users, type filter', '/api/users/', {'user_type': 'patient'}),
+    ('users, search', '/api/users/', {'search': 'sharma'}),
+]
+PAGES = [1, 20]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup()
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    from core.counts import row_counts
+    from core.models import Doctor, Patient, Users
+
+    call_command('seed', users=args.users, verbosity=0)
+    client = APIClient()
+    client.force_authenticate(Users.objects.filter(user_type='doctor').first())
+
+    def forget_counts():
+        for model in (Users, Patient, Doctor):
+            row_counts.invalidate(model)
+
+    def run(request, before=None):
+        def call():
+            if before:
+                before()
+            return request()
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = call().data
+        return data, len(ctx.captured_queries), measure(call, repeat=args.repeat)
+
+    rows = []
+    for label, url, params in CASES:
+        for page in PAGES:
+            request = lambda url=url, params=dict(params, page=page): client.get(url, params)
+            with override_settings(ROW_COUNTS={'EXACT_LIMIT': 10 ** 12}):
+                data, exact_queries, exact = run(request, forget_counts)
+            if 'results' not in data:
+                continue
+            approximate, _, uncached = run(request, forget_counts)
+            _, cached_queries, cached = run(request)
+            count = approximate['count'] if approximate['count_exact'] else f"~{approximate['count']}"
+            rows.append([
+                label, page, data['count'], count,
+                '%.1f' % exact['p50'], '%.1f' % uncached['p50'], '%.1f' % cached['p50'],
+                f'{exact_queries} -> {cached_queries}',
+            ])
+    print_table(['list', 'page', 'exact count', 'reported', 'exact p50 ms', 'uncached p50 ms',
+                 'cached p50 ms', 'queries'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""
+End-to-end load test: every route in core/urls.py under a weighted mix.
+
+    python -m benchmarks.scenarios [--users 10000] [--mix browse] [--concurrency 16]
+        [--seconds 10] [--json report.json] [--baseline baseline.json]
+
+A scratch database is seeded with ``manage.py seed`` (pass ``--database`` to
+keep it in a file; 1M accounts take a few GB of RAM otherwise). Then
+``--concurrency`` clients send requests through Django's ASGI handler
+in-process, as in login_storm, each picking a scenario by the mix's
+weights. A mix is one of MIXES or ``route=weight,...``.
+
+Before the load, each scenario runs once on its own to count its queries
+(the load itself interleaves requests, so queries can't be told apart
+there). The report gives p50/p95/p99 latency, throughput and queries per
+request for each route. ``--json`` writes it out. ``--baseline`` compares it
+with an earlier report and exits with status 1 if a route got slower by
+more than ``--tolerance``, lost throughput or issues more queries. Routes
+with too few requests in either run to say are skipped.
+
+The throttle is off unless ``--throttle`` is given: every client shares one
+address, and login, signup and the availability check would be refused
+after the first few dozen requests.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import sys
+import time
+
+from benchmarks import print_table, setup
+from benchmarks.login_storm import percentile
+from core.seeding import CITIES, WORDS
+
+PASSWORD = 'healthconnect'
+ACTORS = 50
+# Routes with fewer requests than this in either run aren't compared
+MIN_SAMPLES = 20
+
+
+class Scenario:
+    """One kind of request: who sends it, and how to build it from the context"""
+
+    def __init__(self, actor, method, path, data=None, ok=(200,), stream=False):
+        self.actor = actor
+        self.method = method
+        self.path = path
+        self.data = data
+        self.ok = ok
+        self.stream = stream
+
+    def request(self, context, rng):
+        kwargs = {}
+        if self.actor:
+            kwargs['headers'] = {'Authorization': f'Token {rng.choice(context.tokens[self.actor])}'}
+        if self.data:
+            kwargs.update(data=self.data(context, rng), content_type='application/json')
+        return self.method, self.path(context, rng), kwargs
+
+
+def search_params(context, rng):
+    params = [f'q={rng.choice(WORDS)}', f'specialization={rng.choice(context.specializations)}',
+              f'city={rng.choice(CITIES)[0]}', f'min_experience={rng.randint(0, 30)}']
+    return '&'.join(rng.sample(params, rng.randint(1, 3)))
+
+
+def signup_data(context, rng):
+    n = next(context.counter)
+    data = {'username': f'bench{n}', 'email': f'bench{n}@example.com', 'password': PASSWORD,
+            'first_name': 'Bench', 'last_name': 'User', 'user_type': 'patient'}
+    if rng.random() < 0.2:
+        data.update(user_type='doctor', license_number=f'BENCH-{n}',
+                    specialization=rng.choice(context.specializations))
+    return data
+
+
+def availability_path(context, rng):
+    username = rng.choice(context.usernames) if rng.random() < 0.5 else f'free{next(context.counter)}'
+    return f'/api/signup/availability/?username={username}'
+
+
+def batch_ids(ids, rng, size=20):
+    return ','.join(map(str, rng.sample(ids, min(size, len(ids)))))
+
+
+def login_data(context, rng):
+    return {'username': rng.choice(context.usernames), 'password': PASSWORD}
+
+
+SCENARIOS = {
+    'api-root': Scenario(None, 'get', lambda c, r: '/api/'),
+    'user-list': Scenario('doctor', 'get', lambda c, r: f'/api/users/?page={r.randint(1, 20)}'),
+    'user-current-user': Scenario('patient', 'get', lambda c, r: '/api/users/current_user/'),
+    'user-me': Scenario('patient', 'get', lambda c, r: '/api/users/me/'),
+    'patient-list': Scenario('doctor', 'get', lambda c, r: f'/api/patients/?page={r.randint(1, 20)}'),
+    'patient-detail': Scenario('doctor', 'get', lambda c, r: f'/api/patients/{r.choice(c.patient_ids)}/'),
+    'patient-my-profile': Scenario('patient', 'get', lambda c, r: '/api/patients/my_profile/'),
+    'patient-update-profile': Scenario(
+        'patient', 'patch', lambda c, r: '/api/patients/update_profile/',
+        data=lambda c, r: {'allergies': r.choice(['Pollen', 'Dust', 'None known'])}),
+    'doctor-list': Scenario('patient', 'get', lambda c, r: f'/api/doctors/?page={r.randint(1, 20)}'),
+    'doctor-detail': Scenario('patient', 'get', lambda c, r: f'/api/doctors/{r.choice(c.doctor_ids)}/'),
+    'doctor-my-profile': Scenario('doctor', 'get', lambda c, r: '/api/doctors/my_profile/'),
+    'doctor-update-profile': Scenario(
+        'doctor', 'patch', lambda c, r: '/api/doctors/update_profile/',
+        data=lambda c, r: {'bio': ' '.join(r.sample(WORDS, 8))}),
+    'doctor-verified-doctors': Scenario(
+        'patient', 'get', lambda c, r: f'/api/doctors/verified_doctors/?specialization={r.choice(c.specializations)}'),
+    'doctor-search': Scenario('patient', 'get', lambda c, r: f'/api/doctors/search/?{search_params(c, r)}'),
+    'doctor-nearby': Scenario(
+        'patient', 'get', lambda c, r: f'/api/doctors/nearby/?pincode={r.choice(c.pincodes)}&radius=25'),
+    'patient-batch': Scenario(
+        'doctor', 'get', lambda c, r: f'/api/patients/batch/?ids={batch_ids(c.patient_ids, r)}'),
+    'doctor-batch': Scenario(
+        'patient', 'get', lambda c, r: f'/api/doctors/batch/?ids={batch_ids(c.doctor_ids, r)}'),
+    'user-batch': Scenario(
+        'doctor', 'get', lambda c, r: f'/api/users/batch/?ids={batch_ids(c.user_ids, r)}'),
+    'doctor-directory-cache-stats': Scenario('staff', 'get', lambda c, r: '/api/doctors/directory_cache_stats/'),
+    'patient-export': Scenario('staff', 'get', lambda c, r: '/api/patients/export/', stream=True),
+    'doctor-export': Scenario('staff', 'get', lambda c, r: '/api/doctors/export/?export_format=csv', stream=True),
+    'signup': Scenario(None, 'post', lambda c, r: '/api/signup/', data=signup_data, ok=(201,)),
+    'signup-availability': Scenario(None, 'get', availability_path),
+    'login': Scenario(None, 'post', lambda c, r: '/api/login/', data=login_data),
+    'async-signup': Scenario(None, 'post', lambda c, r: '/api/async/signup/', data=signup_data, ok=(201,)),
+    'async-login': Scenario(None, 'post', lambda c, r: '/api/async/login/', data=login_data),
+    'throttle-stats': Scenario('staff', 'get', lambda c, r: '/api/throttle/stats/'),
+}
+
+MIXES = {
+    # Signed-in traffic: mostly reads, the odd login and profile edit
+    'browse': {
+        'user-me': 20, 'doctor-search': 15, 'doctor-verified-doctors': 10, 'doctor-detail': 10,
+        'doctor-list': 5, 'doctor-nearby': 5, 'patient-my-profile': 10, 'doctor-my-profile': 5,
+        'patient-list': 3, 'patient-detail': 3, 'user-list': 2, 'signup-availability': 5,
+        'patient-update-profile': 3, 'doctor-update-profile': 1, 'async-login': 2, 'async-signup': 1,
+    },
+    # Sign-in rush: password hashing dominates
+    'auth': {'async-login': 40, 'login': 10, 'async-signup': 10, 'signup': 5, 'signup-availability': 15,
+             'user-me': 20},
+    'write': {'patient-update-profile': 40, 'doctor-update-profile': 20, 'async-signup': 10,
+              'user-me': 30},
+    # Every route, exports included
+    'all': dict.fromkeys(SCENARIOS, 1),
+}
+
+
+class Context:
+    """Seeded ids and names the scenarios pick from, plus a token per actor"""
+
+    def __init__(self):
+        from rest_framework.authtoken.models import Token
+
+        from core.models import Doctor, Patient, Pincode, Users
+
+        self.counter = itertools.count()
+        self.specializations = [value for value, label in Doctor.SPECIALIZATION_CHOICES]
+        self.patient_ids = list(Patient.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+        self.doctor_ids = list(Doctor.objects.filter(is_verified=True).order_by('pk')
+                               .values_list('pk', flat=True)[:1000])
+        self.user_ids = list(Users.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+        self.usernames = list(Users.objects.order_by('pk').values_list('username', flat=True)[:1000])
+        self.pincodes = list(Pincode.objects.values_list('pincode', flat=True)[:1000])
+        staff = Users.objects.create_user(email='bench-staff@example.com', username='bench-staff',
+                                          first_name='Bench', last_name='Staff', user_type='doctor',
+                                          is_staff=True)
+        patients = Users.objects.filter(user_type='patient').order_by('pk')[:ACTORS]
+        doctors = Users.objects.filter(user_type='doctor', doctor__is_verified=True).order_by('pk')[:ACTORS]
+        self.tokens = {
+            actor: [Token.objects.get_or_create(user=user)[0].key for user in users]
+            for actor, users in (('patient', patients), ('doctor', doctors), ('staff', [staff]))
+        }
+
+
+def route_names(patterns):
+    from django.urls import URLResolver
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def parse_mix(value):
+    if value in MIXES:
+        return MIXES[value]
+    weights = {}
+    for part in value.split(','):
+        route, _, weight = part.partition('=')
+        if route not in SCENARIOS:
+            raise SystemExit(f'Unknown route {route!r}; choose from {", ".join(SCENARIOS)}')
+        weights[route] = float(weight or 1)
+    return weights
+
+
+def count_queries(context):
+    """Queries of one warm request per scenario, sent on its own through the WSGI test client"""
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    rng = random.Random(0)
+    counts = {}
+    for name, scenario in SCENARIOS.items():
+        for _ in range(2):
+            method, path, kwargs = scenario.request(context, rng)
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(path, **kwargs)
+                if scenario.stream:
+                    b''.join(response.streaming_content)
+        counts[name] = len(queries)
+    return counts
+
+
+async def consume(response):
+    from asgiref.sync import sync_to_async
+    if response.is_async:
+        async for _ in response.streaming_content:
+            pass
+    else:
+        # The generator queries the database, which isn't allowed on the event loop
+        await sync_to_async(lambda: b''.join(response.streaming_content))()
+
+
+async def worker(number, context, weights, stop, samples):
+    from django.test import AsyncClient
+    client = AsyncClient()
+    rng = random.Random(number)
+    names, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+    while not stop.is_set():
+        name = rng.choices(names, cum_weights=cumulative)[0]
+        scenario = SCENARIOS[name]
+        method, path, kwargs = scenario.request(context, rng)
+        started = time.perf_counter()
+        response = await getattr(client, method)(path, **kwargs)
+        if scenario.stream:
+            await consume(response)
+        samples.append((name, (time.perf_counter() - started) * 1000, response.status_code in scenario.ok))
+
+
+async def load(context, weights, args):
+    stop = asyncio.Event()
+    samples = []
+    tasks = [asyncio.create_task(worker(i, context, weights, stop, samples)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return samples, time.perf_counter() - started
+
+
+def summarize(latencies, errors, elapsed, queries=None):
+    return {
+        'requests': len(latencies), 'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'queries': queries,
+    }
+
+
+def build_report(samples, elapsed, queries, args, weights):
+    by_route = {}
+    for name, latency, ok in samples:
+        route = by_route.setdefault(name, ([], [0]))
+        route[0].append(latency)
+        route[1][0] += not ok
+    return {
+        'config': {'users': args.users, 'mix': args.mix, 'weights': weights,
+                   'concurrency': args.concurrency, 'seconds': args.seconds},
+        'routes': {
+            name: summarize(latencies, errors[0], elapsed, queries[name])
+            for name, (latencies, errors) in sorted(by_route.items())
+        },
+        'total': summarize([s[1] for s in samples], sum(not s[2] for s in samples), elapsed),
+    }
+
+
+def compare(report, baseline, tolerance, min_ms):
+    """Regressions of ``report`` against ``baseline``, as messages"""
+    regressions = []
+    for name, current in report['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None or min(before['requests'], current['requests']) < MIN_SAMPLES:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            # Small absolute changes are noise, whatever the ratio
+            if current[key] > before[key] * (1 + tolerance) and current[key] - before[key] > min_ms:
+                regressions.append(f'{name}: {key} {before[key]} -> {current[key]}')
+        if current['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} rps")
+        if before.get('queries') is not None and current['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {current['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10_000, help='accounts to seed')
+    parser.add_argument('--database', help='SQLite file for the seeded data (default: in memory)')
+    parser.add_argument('--mix', default='browse', help=f'{", ".join(MIXES)} or route=weight,...')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--throttle', action='store_true', help='keep the login/signup/availability throttle on')
+    parser.add_argument('--json', help='write the report here')
+    parser.add_argument('--baseline', help='report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--min-ms', type=float, default=2.0, help='latency changes below this are noise')
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    setup(args.database)
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    from core import urls as core_urls
+
+    missing = route_names(core_urls.urlpatterns) - set(SCENARIOS)
+    if missing:
+        print(f'No scenario for: {", ".join(sorted(missing))}', file=sys.stderr)
+    call_command('seed', users=args.users, password=PASSWORD)
+    # Failed logins and such are expected; the report counts them
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+    with override_settings(**({} if args.throttle else {'THROTTLE': {'RATES': {}}})):
+        context = Context()
+        queries = count_queries(context)
+        samples, elapsed = asyncio.run(load(context, weights, args))
+    report = build_report(samples, elapsed, queries, args, weights)
+
+    rows = [
+        [name, r['requests'], r['errors'], r['p50_ms'], r['p95_ms'], r['p99_ms'], r['throughput_rps'], r['queries']]
+        for name, r in report['routes'].items()
+    ]
+    total = report['total']
+    rows.append(['total', total['requests'], total['errors'], total['p50_ms'], total['p95_ms'],
+                 total['p99_ms'], total['throughput_rps'], ''])
+    print_table(['route', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries'], rows)
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(report, json.load(handle), args.tolerance, args.min_ms)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
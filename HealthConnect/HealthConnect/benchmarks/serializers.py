@@ -0,0 +1,84 @@
+"""
+Rows/sec for list serialization: DRF ModelSerializers vs. core.fast_serializers.
+
+Each sample fetches one page and turns it into response data, which is
+the work the list endpoints do per request.
+
+    python -m benchmarks.serializers [--users 20000] [--page-sizes 10 100 1000]
+"""
+import argparse
+
+from benchmarks import measure, populate_users, print_table, setup
+
+
+def populate_profiles():
+    from core.models import Doctor, Patient, Users
+    doctors, patients = [], []
+    for i, (pk, user_type) in enumerate(Users.objects.values_list('pk', 'user_type').order_by('pk')):
+        if user_type == 'doctor':
+            doctors.append(Doctor(user_id=pk, license_number=f'LIC-{pk}', specialization='general',
+                                  clinic_name='City Clinic', bio='Experienced physician.',
+                                  experience_years=i % 30, is_verified=True))
+        else:
+            patients.append(Patient(user_id=pk, allergies='Dust', phone_number='9876543210'))
+    Doctor.objects.bulk_create(doctors, batch_size=5000)
+    Patient.objects.bulk_create(patients, batch_size=5000)
+    # Every third user has a processed picture, so URL building is exercised
+    sizes = {name: {'webp': f'profile_pictures/sha256/ab/x/{name}.webp',
+                    'jpeg': f'profile_pictures/sha256/ab/x/{name}.jpg'} for name in ('large', 'thumb')}
+    picture = sizes['large']['jpeg']
+    Users.objects.filter(pk__in=Users.objects.values_list('pk', flat=True)[::3]).update(
+        profile_picture=picture, profile_picture_variants={'picture': picture, 'sizes': sizes},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from core.fast_serializers import DOCTOR_SERIALIZER, PATIENT_SERIALIZER, USER_SERIALIZER
+    from core.models import Doctor, Patient, Users
+    from core.serializers import DoctorSerializer, PatientSerializer, UserSerializer
+
+    populate_users(args.users)
+    populate_profiles()
+    request = Request(APIRequestFactory().get('/api/users/'))
+    renderer = JSONRenderer()
+    cases = [
+        ('users', Users.objects.order_by('id'), UserSerializer, USER_SERIALIZER),
+        ('patients', Patient.objects.select_related('user').order_by('id'), PatientSerializer, PATIENT_SERIALIZER),
+        ('doctors', Doctor.objects.select_related('user').order_by('id'), DoctorSerializer, DOCTOR_SERIALIZER),
+    ]
+
+    rows = []
+    for label, queryset, serializer_class, fast in cases:
+        for size in args.page_sizes:
+            def drf():
+                return serializer_class(queryset[:size], many=True, context={'request': request}).data
+
+            def compiled():
+                return fast.many(fast.rows(queryset)[:size], request)
+
+            assert renderer.render(drf()) == renderer.render(compiled()), label
+            count = len(compiled())
+            slow = measure(drf, repeat=args.repeat)
+            quick = measure(compiled, repeat=args.repeat)
+            rows.append([
+                label, count,
+                '%.0f' % (count / slow['p50'] * 1000), '%.0f' % (count / quick['p50'] * 1000),
+                '%.2f' % slow['p50'], '%.2f' % quick['p50'],
+                '%.1fx' % (slow['p50'] / quick['p50']),
+            ])
+    print_table(['endpoint', 'rows', 'drf rows/s', 'fast rows/s', 'drf p50 ms', 'fast p50 ms', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
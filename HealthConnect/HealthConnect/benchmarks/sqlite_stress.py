@@ -0,0 +1,176 @@
+"""
+Concurrent read/write stress test for the SQLite settings.
+
+    python -m benchmarks.sqlite_stress [--seconds 5] [--writers 4] [--readers 4]
+
+Worker threads run the write paths that contend in production:
+- signup: create the user, profile and token in one transaction;
+- update_profile: read the profile, then save it in one transaction;
+- token get_or_create.
+
+Other threads run patient-list reads at the same time. Each thread brackets
+every operation the way a request does, with close_old_connections()
+before and after. Each mode runs against its own copy of a migrated
+database file:
+- default: Django's stock SQLite settings. Rollback journal,
+  BEGIN DEFERRED, and a fresh connection per request.
+- tuned: settings.DATABASES as shipped. SQLITE_PRAGMAS (WAL etc.),
+  BEGIN IMMEDIATE, CONN_MAX_AGE and health checks.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks import populate_users, print_table, setup
+
+PASSWORD_HASH = 'md5$stress$0123456789abcdef0123456789abcdef'
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else float('nan')
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def run(self, name, func):
+        from django.db import OperationalError, close_old_connections
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            func()
+        except OperationalError as e:
+            with self.lock:
+                self.errors[name, str(e)] = self.errors.get((name, str(e)), 0) + 1
+            return
+        finally:
+            close_old_connections()
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.latencies.setdefault(name, []).append(elapsed)
+
+
+def operations(worker):
+    from django.db import transaction
+    from rest_framework.authtoken.models import Token
+
+    from core.models import Patient, Users
+    counter = iter(range(10 ** 9))
+    rng = random.Random(worker)
+
+    def signup():
+        n = next(counter)
+        with transaction.atomic():
+            user = Users.objects.create_user_with_hash(
+                email=f'stress{worker}.{n}@example.com', username=f'stress{worker}.{n}',
+                password_hash=PASSWORD_HASH, first_name='Stress', last_name='Test', user_type='patient',
+            )
+            Patient.objects.create(user=user)
+            Token.objects.create(user=user)
+
+    def update_profile():
+        with transaction.atomic():
+            patient = Patient.objects.select_related('user').order_by('?').first()
+            patient.allergies = rng.choice(['Dust', 'Pollen', 'Peanuts'])
+            patient.save()
+
+    def token():
+        user_id = Users.objects.order_by('?').values_list('pk', flat=True).first()
+        Token.objects.get_or_create(user_id=user_id)
+
+    def read():
+        patients = Patient.objects.select_related('user').order_by('id')
+        patients.count()
+        start = rng.randrange(max(1, Patient.objects.count() - 20))
+        list(patients[start:start + 20])
+
+    return {'signup': signup, 'update_profile': update_profile, 'token': token}, read
+
+
+def worker_loop(worker, stop, recorder, writer):
+    writes, read = operations(worker)
+    names = sorted(writes)
+    rng = random.Random(worker)
+    while not stop.is_set():
+        if writer:
+            name = rng.choice(names)
+            recorder.run(name, writes[name])
+        else:
+            recorder.run('read', read)
+
+
+def run_mode(args, database, options):
+    from django.db import connections
+    settings_dict = connections['default'].settings_dict
+    settings_dict['NAME'] = database
+    settings_dict['OPTIONS'] = options['OPTIONS']
+    settings_dict['CONN_MAX_AGE'] = options['CONN_MAX_AGE']
+    settings_dict['CONN_HEALTH_CHECKS'] = options['CONN_HEALTH_CHECKS']
+    connections.close_all()
+
+    stop = threading.Event()
+    recorder = Recorder()
+    threads = [threading.Thread(target=worker_loop, args=(i, stop, recorder, i < args.writers))
+               for i in range(args.writers + args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.sqlite3')
+        connection = setup(database=template)
+        from django.conf import settings
+
+        from core.models import Patient, Users
+        populate_users(args.users)
+        Patient.objects.bulk_create(Patient(user_id=pk) for pk in Users.objects.values_list('pk', flat=True))
+        connection.close()
+        tuned = dict(settings.DATABASES['default'])
+
+        modes = [
+            ('default', {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}, 'DELETE'),
+            ('tuned', tuned, 'WAL'),
+        ]
+        rows = []
+        for label, options, journal_mode in modes:
+            database = os.path.join(tmp, f'{label}.sqlite3')
+            shutil.copy(template, database)
+            with sqlite3.connect(database) as db:
+                db.execute(f'PRAGMA journal_mode={journal_mode}')
+            recorder = run_mode(args, database, options)
+            for name in ['signup', 'update_profile', 'token', 'read']:
+                latencies = recorder.latencies.get(name, [])
+                errors = sum(count for (op, _), count in recorder.errors.items() if op == name)
+                rows.append([
+                    label, name, len(latencies), '%.0f' % (len(latencies) / args.seconds),
+                    '%.1f' % percentile(latencies, 0.5), '%.1f' % percentile(latencies, 0.99), errors,
+                ])
+            for (name, message), count in sorted(recorder.errors.items()):
+                print(f'{label}: {name}: {count} x {message}')
+        print_table(['mode', 'operation', 'ok', 'ops/s', 'p50 ms', 'p99 ms', 'lock errors'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Requests/sec on /api/users/me/ with DRF TokenAuthentication vs. CachedTokenAuthentication.
+
+    python -m benchmarks.token_auth [--requests 5000] [--users 10000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import populate_users, print_table, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--clients', type=int, default=100, help='distinct tokens in rotation')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A file-backed database, so the token lookup pays a realistic cost
+        setup(database=os.path.join(tmp, 'bench.sqlite3'))
+        run(args)
+
+
+def run(args):
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+
+    from core.authentication import CachedTokenAuthentication, token_cache
+    from core.models import Users
+    from core.views import UserViewSet
+
+    populate_users(args.users)
+    users = list(Users.objects.order_by('id')[:args.clients])
+    keys = [Token.objects.create(user=user).key for user in users]
+    client = APIClient()
+
+    rows = []
+    for label, auth_class in [('TokenAuthentication', TokenAuthentication),
+                              ('CachedTokenAuthentication', CachedTokenAuthentication)]:
+        UserViewSet.authentication_classes = [auth_class]
+        token_cache.clear()
+        started = time.perf_counter()
+        for i in range(args.requests):
+            response = client.get('/api/users/me/', HTTP_AUTHORIZATION=f'Token {keys[i % len(keys)]}')
+            assert response.status_code == 200, response.status_code
+        elapsed = time.perf_counter() - started
+        rows.append([label, args.requests, '%.0f' % (args.requests / elapsed),
+                     '%.3f' % (elapsed / args.requests * 1000)])
+    print_table(['authentication', 'requests', 'req/s', 'ms/req'], rows)
+
+
+if __name__ == '__main__':
+    main()
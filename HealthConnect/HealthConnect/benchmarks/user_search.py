@@ -0,0 +1,50 @@
+"""
+User directory search: four-way icontains vs. the FTS5 trigram index.
+
+    python -m benchmarks.user_search [--sizes 10000 100000 1000000]
+"""
+import argparse
+
+from benchmarks import measure, populate_users, print_table, setup
+
+TERMS = ['sharma', 'priya', 'smith42', 'example.com', 'kavya nair']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from core.models import Users
+    from core.search import icontains_filter, search_users
+
+    def icontains(term):
+        qs = Users.objects.filter(icontains_filter(term))
+        return qs.count(), list(qs[:args.page_size])
+
+    def fts(term):
+        qs, _ = search_users(Users.objects.all(), term)
+        qs = qs.order_by('search_rank', '-date_joined', '-id')
+        return qs.count(), list(qs[:args.page_size])
+
+    rows = []
+    for size in sorted(args.sizes):
+        populate_users(size)
+        for term in TERMS:
+            slow = measure(lambda: icontains(term), repeat=args.repeat)
+            fast = measure(lambda: fts(term), repeat=args.repeat)
+            rows.append([
+                size, term,
+                '%.2f' % slow['p50'], '%.2f' % fast['p50'],
+                '%.2f' % slow['p95'], '%.2f' % fast['p95'],
+                '%.1fx' % (slow['p50'] / fast['p50']),
+            ])
+    print_table(['users', 'term', 'icontains p50 ms', 'fts p50 ms',
+                 'icontains p95 ms', 'fts p95 ms', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
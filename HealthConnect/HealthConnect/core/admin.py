@@ -1,10 +1,35 @@
 from django.contrib import admin
-from .models import Users, Patient, Doctor
+from django.db.models import Q
+from .models import Users, Patient, Doctor, Pincode
+from .pagination import EstimatedCountPaginator
+from .replicas import ReplicaReadsAdminMixin
+from .search import user_search_filter
+
+
+class LargeTableAdminMixin:
+    """
+    Changelists that stay fast on tables of millions of rows: counts are
+    estimated or capped (EstimatedCountPaginator), the unfiltered total
+    isn't counted a second time, and dates are browsed with a
+    date_hierarchy (see core/templatetags/admin_dates.py) rather than a
+    list_filter that reads every distinct date.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search through the user full-text index, like the API (``search_filter`` says how)"""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(self.search_filter(search_term, queryset.db)), False
+
 
 @admin.register(Users)
-class UsersAdmin(admin.ModelAdmin):
+class UsersAdmin(LargeTableAdminMixin, ReplicaReadsAdminMixin, admin.ModelAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'user_type', 'date_joined', 'is_active']
-    list_filter = ['user_type', 'is_active', 'date_joined']
+    list_filter = ['user_type', 'is_active']
+    date_hierarchy = 'date_joined'
     search_fields = ['username', 'email', 'first_name', 'last_name']
     fieldsets = (
         (None, {'fields': ('username', 'email', 'password')}),
@@ -14,26 +39,46 @@ class UsersAdmin(admin.ModelAdmin):
         ('Important Dates', {'fields': ('date_joined', 'last_login')}),
     )
 
+    def search_filter(self, term, alias):
+        return user_search_filter(term, alias=alias)
+
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(LargeTableAdminMixin, ReplicaReadsAdminMixin, admin.ModelAdmin):
     list_display = ['get_username', 'phone_number', 'date_of_birth', 'created_at']
-    list_filter = ['created_at', 'updated_at']
-    search_fields = ['user__username', 'user__email', 'phone_number']
+    list_select_related = ['user']
+    date_hierarchy = 'created_at'
+    search_fields = ['user__username', 'user__email', 'user__first_name', 'user__last_name', 'phone_number']
     readonly_fields = ['created_at', 'updated_at']
-    
+
     def get_username(self, obj):
         return obj.user.username
     get_username.short_description = 'Username'
 
+    def search_filter(self, term, alias):
+        # Phone numbers are matched whole, on patient_phone_idx
+        return user_search_filter(term, 'user__', alias) | Q(phone_number=term)
+
 
 @admin.register(Doctor)
-class DoctorAdmin(admin.ModelAdmin):
+class DoctorAdmin(LargeTableAdminMixin, ReplicaReadsAdminMixin, admin.ModelAdmin):
     list_display = ['get_full_name', 'specialization', 'license_number', 'is_verified', 'created_at']
-    list_filter = ['specialization', 'is_verified', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['specialization', 'is_verified']
+    date_hierarchy = 'created_at'
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'license_number']
     readonly_fields = ['created_at', 'updated_at']
-    
+
     def get_full_name(self, obj):
         return f"Dr. {obj.user.first_name} {obj.user.last_name}"
-    get_full_name.short_description = 'Full Name'
\ No newline at end of file
+    get_full_name.short_description = 'Full Name'
+
+    def search_filter(self, term, alias):
+        # License numbers are matched whole, on their unique index
+        return user_search_filter(term, 'user__', alias) | Q(license_number=term)
+
+
+@admin.register(Pincode)
+class PincodeAdmin(ReplicaReadsAdminMixin, admin.ModelAdmin):
+    list_display = ['pincode', 'latitude', 'longitude']
+    search_fields = ['pincode']
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import replicas, signals
+        connection_created.connect(replicas.install_write_tracking)
+        post_migrate.connect(signals.ensure_search_index, sender=self)
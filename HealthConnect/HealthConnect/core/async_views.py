@@ -0,0 +1,175 @@
+"""
+Async variants of login_view and signup_view for ASGI deployments.
+
+Same request formats and response bodies as the synchronous views, but the
+password hash runs in the bounded hashing pool (core.hashing) rather than on
+the thread that serves the synchronous views. When the pool is saturated the
+request is refused with 503 and Retry-After instead of queueing.
+"""
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import BaseThrottle
+
+from .availability import taken_errors
+from .hashing import HashingPoolSaturated, get_hashing_pool
+from .serializers import DoctorCreateSerializer, PatientCreateSerializer, UserSerializer
+from .throttling import check as throttle_check
+from .views import SIGNUP_REQUIRED_FIELDS, prepare_signup_data, signup_error_detail
+
+
+def request_data(request):
+    """JSON, form or multipart body as a mapping, like DRF's request.data"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    data = request.POST.copy()
+    for name, files in request.FILES.lists():
+        data.setlist(name, files)
+    return data
+
+
+def saturated_response(exc):
+    response = JsonResponse(
+        {'error': 'Server busy, please retry shortly.'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+def throttled_response(request, endpoint, identifier):
+    """429 if ``endpoint``'s buckets for this client are empty, else None (as the sync views' throttles)"""
+    wait = throttle_check(endpoint, BaseThrottle().get_ident(request), identifier)
+    if wait is None:
+        return None
+    response = JsonResponse(
+        {'detail': 'Request was throttled.'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def parse_error_response(exc):
+    return JsonResponse({'detail': f'JSON parse error - {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@csrf_exempt
+@require_POST
+async def async_login_view(request):
+    """Login endpoint that accepts both email and username"""
+    try:
+        data = request_data(request)
+    except ValueError as e:
+        return parse_error_response(e)
+    username = data.get('username')
+    password = data.get('password')
+    response = throttled_response(request, 'login', username)
+    if response is not None:
+        return response
+
+    if not username or not password:
+        return JsonResponse(
+            {'error': 'Username/email and password are required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        user = await aauthenticate(request, username=username, password=password)
+    except HashingPoolSaturated as e:
+        return saturated_response(e)
+
+    if user is None:
+        return JsonResponse(
+            {'error': 'Invalid credentials'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    if not user.is_active:
+        return JsonResponse(
+            {'error': 'User account is disabled'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    token, created = await Token.objects.aget_or_create(user=user)
+    user_serializer = UserSerializer(user, context={'request': request})
+    return JsonResponse({
+        'token': token.key,
+        'user': user_serializer.data,
+        'user_type': user.user_type,
+        'message': 'Login successful'
+    })
+
+
+def create_account(serializer, password_hash):
+    with transaction.atomic():
+        profile = serializer.save(password_hash=password_hash)
+        token, created = Token.objects.get_or_create(user=profile.user)
+    return profile.user, token
+
+
+@csrf_exempt
+@require_POST
+async def async_signup_view(request):
+    """Unified signup endpoint for both patients and doctors"""
+    try:
+        raw_data = request_data(request)
+    except ValueError as e:
+        return parse_error_response(e)
+    response = throttled_response(request, 'signup', raw_data.get('email'))
+    if response is not None:
+        return response
+    user_type = raw_data.get('user_type', 'patient')
+    data = prepare_signup_data(raw_data)
+
+    missing_fields = [field for field in SIGNUP_REQUIRED_FIELDS if not data.get(field)]
+    if missing_fields:
+        return JsonResponse(
+            {field: ['This field is required.'] for field in missing_fields},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if user_type == 'patient':
+        serializer = PatientCreateSerializer(data=data)
+    elif user_type == 'doctor':
+        serializer = DoctorCreateSerializer(data=data)
+    else:
+        return JsonResponse(
+            {'error': 'Invalid user_type. Must be "patient" or "doctor".'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Field validation is CPU-only and cheap; the create serializers touch no DB
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # Refuse taken names before paying for the password hash
+    errors = await sync_to_async(taken_errors)(serializer.validated_data)
+    if errors:
+        return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        password_hash = await get_hashing_pool().run(make_password, serializer.validated_data['password'])
+    except HashingPoolSaturated as e:
+        return saturated_response(e)
+
+    try:
+        user, token = await sync_to_async(create_account)(serializer, password_hash)
+    except Exception as e:
+        return JsonResponse(signup_error_detail(e), status=status.HTTP_400_BAD_REQUEST, safe=False)
+
+    user_serializer = UserSerializer(user, context={'request': request})
+    return JsonResponse({
+        'token': token.key,
+        'user': user_serializer.data,
+        'user_type': user.user_type
+    }, status=status.HTTP_201_CREATED)
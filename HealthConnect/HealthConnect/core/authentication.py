@@ -0,0 +1,189 @@
+"""
+Token authentication with an in-process cache of resolved tokens.
+
+``CachedTokenAuthentication`` is a drop-in replacement for DRF's
+``TokenAuthentication``: on a cache hit the request is authenticated without
+the ``authtoken_token`` -> ``core_users`` query. Entries live in a bounded LRU
+with a TTL and are evicted by signals when the token is deleted or the user is
+saved (deactivation, profile edits) or deleted.
+
+A miss loads the user, then caches it only if neither the user nor the
+token was evicted meanwhile (``TokenCache.stamp``), so a save racing the
+load can't leave the old row cached. The signals evict once when the row is
+saved and again when the transaction commits: a load in between still reads
+the committed, old row.
+
+Signals only reach the process that made the write, and ``QuerySet.update``
+sends none. In the default ``'bounded'`` mode entries expire after
+``MAX_STALENESS`` seconds, which bounds how long any worker may keep
+accepting a revoked token or serving a stale user. ``'local'`` keeps entries
+for the full ``TTL`` and is only safe with a single server process that
+makes every user and token write itself, through ``save()``/``delete()``:
+with several workers (or writes from management commands) a revoked token
+keeps working elsewhere for up to ``TTL`` seconds.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.fields.files import FieldFile
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,
+    'MODE': 'bounded',
+    'MAX_STALENESS': 5,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TOKEN_AUTH_CACHE', {}))
+    return config
+
+
+class TokenCache:
+    """
+    Thread-safe LRU of token key -> user row, with per-entry expiry.
+
+    Every eviction takes the next number of a sequence and is remembered
+    (up to ``MAX_ENTRIES`` of them) against its user or key. ``set`` with the
+    ``stamp()`` taken before loading a row refuses it if an eviction for
+    that user or key, or one no longer remembered, came after the stamp.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._evicted = OrderedDict()
+        self._sequence = 0
+        # Evictions up to here are forgotten: older stamps are refused
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def stamp(self):
+        with self._lock:
+            return self._sequence
+
+    def set(self, key, user_id, value, stamp=None):
+        """Cache ``value``; with a ``stamp``, only if nothing evicted it since. Returns whether it was cached."""
+        config = get_config()
+        ttl = config['TTL']
+        if config['MODE'] == 'bounded':
+            ttl = min(ttl, config['MAX_STALENESS'])
+        with self._lock:
+            if stamp is not None and (
+                stamp < self._floor
+                or self._evicted.get(('user', user_id), 0) > stamp
+                or self._evicted.get(('key', key), 0) > stamp
+            ):
+                return False
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, value, user_id)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > config['MAX_ENTRIES']:
+                self._discard(next(iter(self._entries)))
+        return True
+
+    def evict_key(self, key):
+        with self._lock:
+            self._remember(('key', key))
+            self._discard(key)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            self._remember(('user', user_id))
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._evicted.clear()
+            self._sequence += 1
+            self._floor = self._sequence
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, target):
+        self._sequence += 1
+        self._evicted[target] = self._sequence
+        self._evicted.move_to_end(target)
+        while len(self._evicted) > get_config()['MAX_ENTRIES']:
+            self._floor = self._evicted.popitem(last=False)[1]
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_user.get(entry[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry[2]]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers resolved tokens.
+
+    The cache stores plain field values rather than model instances, so every
+    request gets its own ``Users`` object and mutations never leak between
+    requests or threads.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return self._rebuild(key, *cached)
+
+        stamp = token_cache.stamp()
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user.pk, (user._state.db, self._snapshot(user), token.created), stamp)
+        return user, token
+
+    def _snapshot(self, user):
+        values = []
+        for field in user._meta.concrete_fields:
+            value = getattr(user, field.attname)
+            # FieldFile is bound to its instance; keep only the stored name
+            values.append(value.name if isinstance(value, FieldFile) else value)
+        return tuple(values)
+
+    def _rebuild(self, key, db, values, created):
+        User = get_user_model()
+        names = [field.attname for field in User._meta.concrete_fields]
+        # JSON fields hold dicts/lists; don't share them between requests
+        values = [copy.deepcopy(v) if isinstance(v, (dict, list)) else v for v in values]
+        user = User.from_db(db, names, values)
+        token = Token(key=key, user=user, created=created)
+        token._state.adding = False
+        return user, token
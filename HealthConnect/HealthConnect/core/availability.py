@@ -0,0 +1,285 @@
+"""
+Username and email availability without a database round trip.
+
+``account_names`` is a counting Bloom filter over every account's username
+and email, case-folded. A miss means the name is free and costs no query;
+a hit is confirmed with one indexed lookup, so false positives (about
+``ERROR_RATE`` of free names) never reject anyone. Counters rather than bits
+let deletions be taken back out.
+
+The filter is built when the server starts (wsgi.py/asgi.py) or on first
+use, and sized from ``EXPECTED_ACCOUNTS`` or twice the current number of
+accounts, whichever is larger; the names are streamed into it, not loaded
+into a list. Signals add created accounts and remove deleted ones in the
+process that made the write. Other processes see those writes at their next
+rebuild, after ``REBUILD_SECONDS``, which runs in a background thread while
+the old filter keeps answering; until then the unique constraints catch
+what the filter misses, as they did before.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'EXPECTED_ACCOUNTS': 100_000,
+    'ERROR_RATE': 0.01,
+    'REBUILD_SECONDS': 300,
+    'BUILD_AT_STARTUP': True,
+}
+
+FIELDS = ('username', 'email')
+MAX_COUNT = 255
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ACCOUNT_NAME_FILTER', {}))
+    return config
+
+
+def normalize(field, value):
+    """The value the unique constraint compares, or None if there is nothing to check"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    if field == 'email':
+        value = get_user_model().objects.normalize_email(value)
+    return value
+
+
+class CountingBloomFilter:
+    """Bloom filter with a saturating 8-bit counter per slot, so keys can be removed"""
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.counters = bytearray(self.size)
+
+    def _slots(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        counters = self.counters
+        for slot in self._slots(key):
+            if counters[slot] < MAX_COUNT:
+                counters[slot] += 1
+
+    def add_all(self, keys):
+        """``add`` for many keys, with the hashing inlined (it dominates building)"""
+        counters, size, hashes, blake2b = self.counters, self.size, self.hashes, hashlib.blake2b
+        for key in keys:
+            digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+            first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+            for i in range(hashes):
+                slot = (first + i * second) % size
+                if counters[slot] < MAX_COUNT:
+                    counters[slot] += 1
+
+    def remove(self, key):
+        slots = self._slots(key)
+        counters = self.counters
+        if not all(counters[slot] for slot in slots):
+            return
+        for slot in slots:
+            # A saturated counter may stand for more keys than it counted
+            if counters[slot] < MAX_COUNT:
+                counters[slot] -= 1
+
+    def __contains__(self, key):
+        counters = self.counters
+        return all(counters[slot] for slot in self._slots(key))
+
+
+class AccountNameFilter:
+    """
+    Builds read every account into a new filter and swap it in, one at a
+    time; writes made meanwhile are replayed onto it so the snapshot can't
+    undo them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._filter = None
+        self._built_at = None
+        # Bumped by clear(), so a build that started before it is thrown away
+        self._generation = 0
+        # (operation, key) of the writes made during a build
+        self._pending = None
+        self.stats = {'filtered': 0, 'confirmed': 0, 'false_positives': 0}
+
+    @property
+    def built(self):
+        return self._filter is not None
+
+    @staticmethod
+    def _key(field, value):
+        return f'{field}:{value.casefold()}'
+
+    @staticmethod
+    def _apply(bloom, operation, key):
+        if operation == 'remove':
+            bloom.remove(key)
+        elif operation == 'add' or key not in bloom:
+            bloom.add(key)
+
+    def _write(self, operation, key):
+        """Apply a write to the current filter and to the one being built. Call with the lock held."""
+        if self._filter is not None:
+            self._apply(self._filter, operation, key)
+        if self._pending is not None:
+            self._pending.append((operation, key))
+
+    def _build(self):
+        config = get_config()
+        User = get_user_model()
+        with self._lock:
+            generation = self._generation
+            self._pending = []
+        try:
+            accounts = User._default_manager.count()
+            bloom = CountingBloomFilter(max(config['EXPECTED_ACCOUNTS'], 2 * accounts) * len(FIELDS),
+                                        config['ERROR_RATE'])
+            names = User._default_manager.values_list(*FIELDS).iterator()
+            bloom.add_all(self._key(field, value) for row in names for field, value in zip(FIELDS, row))
+            with self._lock:
+                if generation != self._generation:
+                    return
+                for operation, key in self._pending:
+                    self._apply(bloom, operation, key)
+                self._filter = bloom
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def build(self):
+        with self._build_lock:
+            self._build()
+
+    def _stale(self):
+        return not self.built or time.monotonic() - self._built_at > get_config()['REBUILD_SECONDS']
+
+    def _rebuild(self):
+        try:
+            if self._stale():
+                self._build()
+        except Exception:
+            logger.exception('Rebuilding the account name filter failed')
+        finally:
+            self._build_lock.release()
+            # Connections are per thread; don't leave this one open
+            connections.close_all()
+
+    def ensure_built(self):
+        """
+        Build the filter on first use; callers wait for that one build. A
+        stale filter keeps answering while a background thread rebuilds it.
+        """
+        if not self.built:
+            with self._build_lock:
+                if not self.built:
+                    self._build()
+        elif self._stale() and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, name='account-names', daemon=True).start()
+
+    def add(self, user, created=True):
+        """
+        Record a saved account (a no-op until a filter is built or being
+        built). Updates only add names the filter doesn't have yet, so a
+        rename is covered without counting unchanged names twice.
+        """
+        with self._lock:
+            for field in FIELDS:
+                value = getattr(user, field)
+                if value:
+                    self._write('add' if created else 'add-missing', self._key(field, value))
+
+    def add_many(self, users):
+        for user in users:
+            self.add(user)
+
+    def remove(self, username, email):
+        with self._lock:
+            for field, value in zip(FIELDS, (username, email)):
+                if value:
+                    self._write('remove', self._key(field, value))
+
+    def clear(self):
+        with self._lock:
+            self._filter = None
+            self._built_at = None
+            self._generation += 1
+            self.stats = {'filtered': 0, 'confirmed': 0, 'false_positives': 0}
+
+    def might_exist(self, field, value):
+        self.ensure_built()
+        with self._lock:
+            return self._key(field, value) in self._filter
+
+    def taken(self, **values):
+        """
+        ``{field: bool}`` for the given ``username``/``email`` values, which
+        must already be normalized. At most one query, and none when the
+        filter rules every value out.
+        """
+        candidates = {field: value for field, value in values.items() if self.might_exist(field, value)}
+        taken = dict.fromkeys(values, False)
+        if not candidates:
+            self._record(filtered=len(values))
+            return taken
+        User = get_user_model()
+        query = Q()
+        for field, value in candidates.items():
+            query |= Q(**{field: value})
+        for row in User._default_manager.filter(query).values_list(*FIELDS):
+            for field, value in zip(FIELDS, row):
+                if candidates.get(field) == value:
+                    taken[field] = True
+        confirmed = sum(taken.values())
+        self._record(filtered=len(values) - len(candidates), confirmed=confirmed,
+                     false_positives=len(candidates) - confirmed)
+        return taken
+
+    def _record(self, **counts):
+        with self._lock:
+            for name, amount in counts.items():
+                self.stats[name] += amount
+
+
+account_names = AccountNameFilter()
+
+
+def taken_errors(data):
+    """Field errors for signup ``data`` whose username or email is already in use"""
+    values = {field: normalize(field, data.get(field)) for field in FIELDS}
+    values = {field: value for field, value in values.items() if value}
+    if not values:
+        return {}
+    return {
+        field: [f'A user with that {field} already exists.']
+        for field, taken in account_names.taken(**values).items() if taken
+    }
+
+
+def warm():
+    """Build the filter at startup if configured; the first lookup builds it otherwise"""
+    if not get_config()['BUILD_AT_STARTUP']:
+        return
+    try:
+        account_names.build()
+    except DatabaseError:
+        # Not migrated yet
+        pass
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Q
+
+from .hashing import get_hashing_pool
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """
+    Authenticate with either the email address or the username.
+
+    The account is resolved in one query over the two unique columns and the
+    password is hashed exactly once. Unknown identifiers still pay one hash,
+    so response time does not reveal whether an account exists.
+    """
+
+    def get_candidates(self, username):
+        User = get_user_model()
+        return User._default_manager.filter(Q(email=username) | Q(username=username))[:2]
+
+    def pick_candidate(self, candidates, username):
+        if not candidates:
+            return None
+        # An email match wins over another account whose username looks like it
+        return next((c for c in candidates if c.email == username), candidates[0])
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        User = get_user_model()
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.pick_candidate(list(self.get_candidates(username)), username)
+        if user is None:
+            # Run the default password hasher once to equalize timing
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """
+        Async variant: the query runs on the async ORM and the hash runs in the
+        bounded hashing pool (may raise HashingPoolSaturated).
+        """
+        User = get_user_model()
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        pool = get_hashing_pool()
+        candidates = [c async for c in self.get_candidates(username)]
+        user = self.pick_candidate(candidates, username)
+        if user is None:
+            await pool.run(make_password, password)
+            return None
+
+        upgraded = []
+        valid = await pool.run(
+            check_password, password, user.password, lambda raw: upgraded.append(make_password(raw))
+        )
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if upgraded:
+            # Hasher settings changed since this hash was made; store the new one
+            user.password = upgraded[0]
+            await user.asave(update_fields=['password'])
+        return user
@@ -0,0 +1,138 @@
+"""
+Batch reads and partial updates for the profile viewsets.
+
+Loading a panel of patients with one ``/api/patients/<id>/`` per record pays
+authentication, routing and a query per record. ``batch_read`` answers a
+list of ids with one ``IN`` query, users joined. ``batch_update`` validates
+every item with the model's serializer and saves the valid ones in a single
+transaction, so the batch commits once. Each item reports its own status.
+Batches are capped at ``MAX_ITEMS``. Updates can touch anyone's record, so
+the views only allow them to staff.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+DEFAULTS = {
+    'MAX_ITEMS': 500,
+}
+
+CONFLICT_MESSAGE = 'This update conflicts with another record.'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'BATCH_REQUESTS', {}))
+    return config
+
+
+def parse_ids(value):
+    """Unique ids, in order, from a comma-separated ``?ids=``; raises ValueError with a message for the client"""
+    ids = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            pk = int(part)
+        except ValueError:
+            raise ValueError(f'Invalid id: {part!r}.')
+        if pk < 1:
+            raise ValueError(f'Invalid id: {part!r}.')
+        ids.append(pk)
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError('ids is required.')
+    check_size(len(ids))
+    return ids
+
+
+def check_size(size):
+    limit = get_config()['MAX_ITEMS']
+    if size > limit:
+        raise ValueError(f'At most {limit} items per batch.')
+
+
+def batch_read(queryset, ids, row_serializer, request):
+    """``{'results': [...], 'missing': [...]}`` for ``ids``, in the order asked, from one query"""
+    rows = list(row_serializer.rows(queryset.filter(pk__in=ids)))
+    by_id = {row.id: record for row, record in zip(rows, row_serializer.many(rows, request))}
+    return {
+        'results': [by_id[pk] for pk in ids if pk in by_id],
+        'missing': [pk for pk in ids if pk not in by_id],
+    }
+
+
+def parse_updates(data):
+    """The list of partial updates in a batch request body; raises ValueError with a message for the client"""
+    if not isinstance(data, list) or not data:
+        raise ValueError('Expected a non-empty list of objects with an "id".')
+    check_size(len(data))
+    return data
+
+
+def item_id(item):
+    pk = item.get('id') if isinstance(item, dict) else None
+    return pk if isinstance(pk, int) and not isinstance(pk, bool) and pk > 0 else None
+
+
+def batch_update(queryset, items, serializer_class, row_serializer, request):
+    """
+    Apply partial updates ``items`` (dicts with an ``id``) through
+    ``serializer_class`` in one transaction. Returns ``(results, ok)``:
+    one ``{'id', 'status', 'data' | 'errors'}`` per item, in order, and
+    whether every item was saved. An item that fails doesn't stop the others.
+    Saved records are rendered by ``row_serializer`` from one more query.
+    """
+    results = [None] * len(items)
+    ids = [item_id(item) for item in items]
+    seen = set()
+    for index, pk in enumerate(ids):
+        if pk is None:
+            results[index] = {'id': None, 'status': status.HTTP_400_BAD_REQUEST,
+                              'errors': {'id': ['A positive integer id is required.']}}
+        elif pk in seen:
+            results[index] = {'id': pk, 'status': status.HTTP_400_BAD_REQUEST,
+                              'errors': {'id': ['Duplicate id in batch.']}}
+        seen.add(pk)
+
+    # One serializer for every item, as DRF suggests for ListSerializer
+    # updates: its fields are built once instead of once per item
+    serializer = serializer_class(context={'request': request}, partial=True)
+    saved = []
+    with transaction.atomic():
+        instances = queryset.select_for_update(of=('self',)).in_bulk(
+            [pk for index, pk in enumerate(ids) if results[index] is None]
+        )
+        valid = []
+        for index, (pk, item) in enumerate(zip(ids, items)):
+            if results[index] is not None:
+                continue
+            if pk not in instances:
+                results[index] = {'id': pk, 'status': status.HTTP_404_NOT_FOUND, 'errors': {'id': ['Not found.']}}
+                continue
+            serializer.instance = instances[pk]
+            serializer.initial_data = item
+            try:
+                valid.append((index, serializer.run_validation(item)))
+            except ValidationError as e:
+                results[index] = {'id': pk, 'status': status.HTTP_400_BAD_REQUEST, 'errors': e.detail}
+        for index, validated_data in valid:
+            pk = ids[index]
+            try:
+                # A savepoint each: a conflict between two items of the batch
+                # (the same new license number, say) only fails the later one
+                with transaction.atomic():
+                    serializer.update(instances[pk], validated_data)
+            except IntegrityError:
+                # The database's message names tables and columns; don't pass it on
+                results[index] = {'id': pk, 'status': status.HTTP_409_CONFLICT,
+                                  'errors': {'non_field_errors': [CONFLICT_MESSAGE]}}
+            else:
+                saved.append(index)
+        if saved:
+            data = batch_read(queryset, [ids[index] for index in saved], row_serializer, request)['results']
+            for index, record in zip(saved, data):
+                results[index] = {'id': ids[index], 'status': status.HTTP_200_OK, 'data': record}
+    return results, all(result['status'] == status.HTTP_200_OK for result in results)
@@ -0,0 +1,99 @@
+"""
+Read-through caching for rarely changing, frequently read endpoints.
+
+Entries are namespaced by a generation number kept in the cache itself.
+Invalidation bumps the generation instead of deleting keys, so it is a single
+``incr`` that every worker sharing the cache backend observes. The backend is
+any alias from ``settings.CACHES``: local memory by default, file-based or a
+shared cache (Redis, Memcached) for multi-worker deployments.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class CacheStats:
+    """In-process hit/miss counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def record(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+
+class ReadThroughCache:
+    def __init__(self, namespace, alias=None, timeout=None):
+        self.namespace = namespace
+        self.alias = alias
+        self.timeout = timeout
+        self.stats = CacheStats()
+
+    @property
+    def backend(self):
+        return caches[self.alias or getattr(settings, 'DIRECTORY_CACHE_ALIAS', 'default')]
+
+    @property
+    def generation_key(self):
+        return f'{self.namespace}:generation'
+
+    def generation(self):
+        generation = self.backend.get(self.generation_key)
+        if generation is None:
+            # add() so concurrent workers agree on the first generation. Seeding
+            # from the clock keeps an evicted generation from reviving old keys.
+            self.backend.add(self.generation_key, self._seed(), timeout=None)
+            generation = self.backend.get(self.generation_key, 0)
+        return generation
+
+    def _seed(self):
+        return int(time.time() * 1000)
+
+    def make_key(self, *parts):
+        digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+        return f'{self.namespace}:{self.generation()}:{digest}'
+
+    def get_or_compute(self, parts, compute):
+        """Return ``(value, hit)`` for the entry identified by ``parts``."""
+        key = self.make_key(*parts)
+        value = self.backend.get(key)
+        if value is not None:
+            self.stats.record('hits')
+            return value, True
+        self.stats.record('misses')
+        value = compute()
+        timeout = self.timeout if self.timeout is not None else getattr(
+            settings, 'DIRECTORY_CACHE_TIMEOUT', 300)
+        self.backend.set(key, value, timeout=timeout)
+        return value, False
+
+    def invalidate(self):
+        try:
+            self.backend.incr(self.generation_key)
+        except ValueError:
+            self.backend.set(self.generation_key, self._seed(), timeout=None)
+        self.stats.record('invalidations')
+
+
+verified_doctors_cache = ReadThroughCache('verified_doctors')
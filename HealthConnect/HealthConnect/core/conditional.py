@@ -0,0 +1,53 @@
+"""
+ETag / Last-Modified validators for the polled profile and directory endpoints.
+
+ETags are derived from version columns (``updated_at`` on Users, Patient and
+Doctor), never from the rendered body, so a matching ``If-None-Match`` is
+answered with 304 before any serializer runs. Each tag also covers the
+parts of the request that change the bytes: the host (picture URLs are
+absolute) and the negotiated media type. That keeps the tags strong.
+Only ETags decide conditional requests; Last-Modified is informational.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(request, *versions):
+    media_type = getattr(request, 'accepted_media_type', '')
+    key = repr((request.scheme, request.get_host(), media_type) + versions)
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def profile_validators(request, *instances):
+    """ETag and Last-Modified for a response built from ``instances``"""
+    versions = tuple((type(obj).__name__, obj.pk, obj.updated_at) for obj in instances)
+    last_modified = max(obj.updated_at for obj in instances)
+    return make_etag(request, *versions), last_modified
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may keep a copy but must revalidate it on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def precondition_response(request, etag, last_modified=None):
+    """
+    The 304 (GET/HEAD) or 412 response that the request's If-Match and
+    If-None-Match headers call for, or None when the view should go on and
+    do the work.
+
+    If-Modified-Since and If-Unmodified-Since are ignored: HTTP dates only
+    have whole seconds, so two edits in the same second would look
+    unchanged. ``last_modified`` is only echoed in the response.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return None
+    return set_validators(response, etag, last_modified)
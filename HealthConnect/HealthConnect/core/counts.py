@@ -0,0 +1,148 @@
+"""
+Row counts that don't scan big tables.
+
+An exact ``COUNT(*)`` reads every row (or index entry) it counts, which is
+what times out list pages over a few hundred thousand rows. For the whole
+table ``estimated_count`` asks the planner's statistics on PostgreSQL. On
+other backends it takes the span of the integer primary key, two index
+seeks, which overcounts by the rows deleted since. Filtered querysets can't
+be estimated that way, so ``bounded_count`` stops counting at a limit.
+Counts at or below ``EXACT_LIMIT`` are always exact.
+
+``row_counts`` caches those counts for paginated API responses. Entries are
+keyed by the count query and namespaced by a write generation of every table
+the count depends on. A save or delete bumps its table's generation
+(core/signals.py), which retires every count that read that table.
+Generations live in the cache backend, so workers sharing one see each
+other's writes. Bulk writes that skip signals call ``invalidate`` themselves.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models
+
+from .cache import CacheStats
+
+DEFAULTS = {
+    'EXACT_LIMIT': 10_000,
+    'CACHE_ALIAS': 'default',
+    'CACHE_TIMEOUT': 300,  # seconds
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ROW_COUNTS', {}))
+    return config
+
+
+def estimated_count(model, using='default'):
+    """Approximate number of rows in ``model``'s table, or None if it can't be estimated cheaply"""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # -1 until the table is first vacuumed or analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if not isinstance(model._meta.pk, models.AutoField):
+            return None
+        pk = quote(model._meta.pk.column)
+        # Separate subqueries: MIN and MAX together in one SELECT would scan
+        cursor.execute(f'SELECT (SELECT MIN({pk}) FROM {quote(table)}), (SELECT MAX({pk}) FROM {quote(table)})')
+        low, high = cursor.fetchone()
+    return 0 if low is None else high - low + 1
+
+
+def is_filtered(queryset):
+    query = queryset.query
+    return bool(query.where) or query.is_sliced or query.distinct
+
+
+def bounded_count(queryset, limit):
+    """``(count, exact)``: the count, or ``limit`` and False if there are more than ``limit`` rows"""
+    count = queryset.order_by().values('pk')[:limit + 1].count()
+    return (count, True) if count <= limit else (limit, False)
+
+
+def fast_count(queryset):
+    """
+    ``(count, exact)`` for ``queryset``: exact up to ``EXACT_LIMIT``, beyond
+    that an estimate for an unfiltered table and the limit for a filtered one.
+    """
+    count, exact = bounded_count(queryset, get_config()['EXACT_LIMIT'])
+    if not exact and not is_filtered(queryset):
+        estimate = estimated_count(queryset.model, queryset.db)
+        if estimate is not None:
+            return max(estimate, count), False
+    return count, exact
+
+
+def count_tables(queryset):
+    """Tables a count of ``queryset`` depends on: its own, those it joins and those it points at"""
+    tables = {queryset.model._meta.db_table}
+    tables.update(join.table_name for join in queryset.query.alias_map.values())
+    # Filters through a foreign key (user__pk__in=...) compare the local column
+    tables.update(
+        field.related_model._meta.db_table
+        for field in queryset.model._meta.concrete_fields if field.is_relation
+    )
+    return sorted(tables)
+
+
+class CountCache:
+    def __init__(self, namespace='row_counts'):
+        self.namespace = namespace
+        self.stats = CacheStats()
+
+    @property
+    def backend(self):
+        return caches[get_config()['CACHE_ALIAS']]
+
+    def generation_key(self, table):
+        return f'{self.namespace}:generation:{table}'
+
+    def generations(self, tables):
+        keys = [self.generation_key(table) for table in tables]
+        found = self.backend.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # Seeded from the clock so an evicted generation can't revive old counts
+                self.backend.add(key, int(time.time() * 1000), timeout=None)
+                found[key] = self.backend.get(key, 0)
+        return [found[key] for key in keys]
+
+    def count(self, queryset):
+        """``(count, exact)`` as ``fast_count`` gives it, from the cache while no table it reads was written"""
+        try:
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        except EmptyResultSet:
+            return 0, True
+        tables = count_tables(queryset)
+        digest = hashlib.sha1(repr((queryset.db, sql, params)).encode('utf-8')).hexdigest()
+        generations = '.'.join(map(str, self.generations(tables)))
+        key = f'{self.namespace}:{digest}:{generations}'
+        value = self.backend.get(key)
+        if value is not None:
+            self.stats.record('hits')
+            return tuple(value)
+        self.stats.record('misses')
+        value = fast_count(queryset)
+        self.backend.set(key, value, timeout=get_config()['CACHE_TIMEOUT'])
+        return value
+
+    def invalidate(self, model):
+        key = self.generation_key(model._meta.db_table)
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            self.backend.set(key, int(time.time() * 1000), timeout=None)
+        self.stats.record('invalidations')
+
+
+row_counts = CountCache()
@@ -0,0 +1,264 @@
+"""
+Faceted search over verified doctors (``DoctorViewSet.search``).
+
+A request costs two queries: the page, and one GROUP BY (specialization,
+city) for the facets. The facets are disjunctive, as in most shop-style
+filters: specialization counts ignore the ``specialization`` filter and city
+counts ignore ``city``, so a client can always see what the other choices
+would return. Both are summed from that one grouped query, along with the
+total number of matches.
+
+Grouping every verified doctor by city takes a few hundred milliseconds at
+100k doctors. On SQLite the counts are therefore kept per (specialization,
+city, state, experience) in ``core_doctor_facets``, a summary table that
+triggers update on every write, ``bulk_create`` and ``QuerySet.update``
+included; summing its few thousand rows takes a few milliseconds. Text and
+pincode filters can't be answered from it, so those requests still group
+the matching doctors, and keep the result in the directory cache
+(``verified_doctors_cache``), which doctor and doctor-user saves invalidate.
+The grouped rows don't depend on the specialization or city filter and are
+shared by every selection of them.
+"""
+from collections import Counter
+
+from django.db import connections, router
+from django.db.models import Count
+
+from .cache import verified_doctors_cache
+from .models import Doctor
+from .search import search_doctors
+
+CITY_FACET_LIMIT = 20
+
+
+class FacetTable:
+    """Verified doctor counts per facet group, kept up to date by triggers"""
+
+    table = 'core_doctor_facets'
+    key = ('specialization', 'city', 'state', 'experience_years')
+    triggers = ('doctor_ai', 'doctor_ad', 'doctor_au', 'users_au')
+
+    def __init__(self):
+        self._available = {}
+
+    def _add(self, doctor, city, state, source, where):
+        """Upsert adding one to the group of ``doctor`` (``new`` or ``old``) per row of ``source``"""
+        return (
+            f"INSERT INTO {self.table} ({', '.join(self.key)}, n) "
+            f"SELECT {doctor}.specialization, COALESCE({city}, ''), COALESCE({state}, ''), "
+            f"{doctor}.experience_years, 1 FROM {source} WHERE {where} "
+            f"ON CONFLICT ({', '.join(self.key)}) DO UPDATE SET n = n + 1;"
+        )
+
+    def _remove(self, doctor, city, state, source, where):
+        return (
+            f"UPDATE {self.table} SET n = n - 1 WHERE ({', '.join(self.key)}) IN ("
+            f"SELECT {doctor}.specialization, COALESCE({city}, ''), COALESCE({state}, ''), "
+            f"{doctor}.experience_years FROM {source} WHERE {where}); "
+            f"DELETE FROM {self.table} WHERE n <= 0;"
+        )
+
+    def statements(self):
+        table = self.table
+        add_new = self._add('new', 'u.city', 'u.state', 'core_users u', 'u.id = new.user_id AND new.is_verified')
+        remove_old = self._remove('old', 'u.city', 'u.state', 'core_users u',
+                                  'u.id = old.user_id AND old.is_verified')
+        moved = ' OR '.join(f'old.{c} IS NOT new.{c}'
+                            for c in ('specialization', 'experience_years', 'is_verified', 'user_id'))
+        relocated = ' OR '.join(f"COALESCE(old.{c}, '') != COALESCE(new.{c}, '')" for c in ('city', 'state'))
+        doctors = 'core_doctor d'
+        verified = 'd.user_id = new.id AND d.is_verified'
+        return [
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f"specialization varchar(50) NOT NULL, city varchar(100) NOT NULL, state varchar(100) NOT NULL, "
+            f"experience_years integer NOT NULL, n integer NOT NULL, "
+            f"PRIMARY KEY ({', '.join(self.key)})) WITHOUT ROWID",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_doctor_ai AFTER INSERT ON core_doctor "
+            f"WHEN new.is_verified BEGIN {add_new} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_doctor_ad AFTER DELETE ON core_doctor "
+            f"WHEN old.is_verified BEGIN {remove_old} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_doctor_au AFTER UPDATE OF "
+            f"specialization, experience_years, is_verified, user_id ON core_doctor "
+            f"WHEN {moved} BEGIN {remove_old} {add_new} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_users_au AFTER UPDATE OF city, state ON core_users "
+            f"WHEN {relocated} BEGIN "
+            f"{self._remove('d', 'old.city', 'old.state', doctors, verified)} "
+            f"{self._add('d', 'new.city', 'new.state', doctors, verified)} END",
+        ]
+
+    def rebuild(self, cursor):
+        cursor.execute(f'DELETE FROM {self.table}')
+        cursor.execute(
+            f"INSERT INTO {self.table} ({', '.join(self.key)}, n) "
+            f"SELECT d.specialization, COALESCE(u.city, ''), COALESCE(u.state, ''), d.experience_years, count(*) "
+            f"FROM core_doctor d JOIN core_users u ON u.id = d.user_id WHERE d.is_verified "
+            f"GROUP BY 1, 2, 3, 4"
+        )
+
+    def install(self, connection, rebuild=True):
+        """Create the table and its triggers if missing. Idempotent."""
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            for statement in self.statements():
+                cursor.execute(statement)
+            if rebuild:
+                self.rebuild(cursor)
+        self._available[connection.alias] = True
+        return True
+
+    def uninstall(self, connection):
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            for suffix in self.triggers:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {self.table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+        self._available.pop(connection.alias, None)
+
+    def available(self, alias='default'):
+        if alias not in self._available:
+            connection = connections[alias]
+            self._available[alias] = (
+                connection.vendor == 'sqlite'
+                and self.table in connection.introspection.table_names()
+            )
+        return self._available[alias]
+
+    def ensure_triggers(self, connection):
+        """Reinstall the triggers, and recount, if a migration rebuilt core_doctor or core_users"""
+        if connection.vendor != 'sqlite':
+            return
+        if self.table not in connection.introspection.table_names():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{self.table}_%'],
+            )
+            complete = cursor.fetchone()[0] == len(self.triggers)
+        if not complete:
+            self.install(connection)
+
+    def groups(self, params, alias='default'):
+        """``(specialization, city, n)`` rows for the state and experience filters in ``params``"""
+        connection = connections[alias]
+        where, values = [], []
+        if 'state' in params:
+            # iexact, as the state filter
+            where.append("state LIKE %s ESCAPE '\\'")
+            values.append(connection.ops.prep_for_like_query(params['state']))
+        if 'min_experience' in params:
+            where.append('experience_years >= %s')
+            values.append(params['min_experience'])
+        if 'max_experience' in params:
+            where.append('experience_years <= %s')
+            values.append(params['max_experience'])
+        where = f"WHERE {' AND '.join(where)} " if where else ''
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT specialization, city, sum(n) FROM {self.table} {where}'
+                           f'GROUP BY specialization, city', values)
+            return cursor.fetchall()
+
+
+DOCTOR_FACETS = FacetTable()
+
+
+def _non_negative_int(name, value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a whole number.')
+    if number < 0:
+        raise ValueError(f'{name} must not be negative.')
+    return number
+
+
+def parse_search_params(query_params):
+    """Validated filters from the query string; raises ValueError with a message for the client"""
+    params = {}
+    specialization = query_params.get('specialization')
+    if specialization:
+        if specialization not in dict(Doctor.SPECIALIZATION_CHOICES):
+            raise ValueError('Invalid specialization.')
+        params['specialization'] = specialization
+    for name in ('q', 'city', 'state', 'pincode'):
+        value = query_params.get(name, '').strip()
+        if value:
+            params[name] = value
+    for name in ('min_experience', 'max_experience'):
+        if query_params.get(name):
+            params[name] = _non_negative_int(name, query_params[name])
+    if params.get('min_experience', 0) > params.get('max_experience', float('inf')):
+        raise ValueError('min_experience must not exceed max_experience.')
+    return params
+
+
+def filtered_doctors(params, facets=False):
+    """
+    ``(queryset, ranked)`` of the verified doctors matching ``params``. With
+    ``facets`` the specialization and city filters are left to ``facet_counts``.
+    """
+    doctors = Doctor.objects.filter(is_verified=True)
+    if not facets and 'specialization' in params:
+        doctors = doctors.filter(specialization=params['specialization'])
+    if not facets and 'city' in params:
+        doctors = doctors.filter(user__city__iexact=params['city'])
+    if 'state' in params:
+        doctors = doctors.filter(user__state__iexact=params['state'])
+    if 'pincode' in params:
+        doctors = doctors.filter(user__pincode=params['pincode'])
+    if 'min_experience' in params:
+        doctors = doctors.filter(experience_years__gte=params['min_experience'])
+    if 'max_experience' in params:
+        doctors = doctors.filter(experience_years__lte=params['max_experience'])
+    if 'q' in params:
+        return search_doctors(doctors, params['q'])
+    return doctors, False
+
+
+def facet_counts(params):
+    """``(total, facets)`` for ``params``, from a single aggregate query"""
+    alias = router.db_for_read(Doctor)
+    if 'q' not in params and 'pincode' not in params and DOCTOR_FACETS.available(alias):
+        groups = DOCTOR_FACETS.groups(params, alias)
+    else:
+        groups = _grouped_matches(params)
+    return _facets(groups, params)
+
+
+def _grouped_matches(params):
+    def group():
+        queryset, _ = filtered_doctors(params, facets=True)
+        return list(queryset.values_list('specialization', 'user__city').annotate(n=Count('pk')).order_by())
+
+    key = ('search-facets',) + tuple(
+        sorted((name, value) for name, value in params.items() if name not in ('specialization', 'city'))
+    )
+    groups, _ = verified_doctors_cache.get_or_compute(key, group)
+    return groups
+
+
+def _facets(groups, params):
+    specialization = params.get('specialization')
+    city = params.get('city', '').lower()
+    by_specialization, by_city, total = Counter(), Counter(), 0
+    for group_specialization, group_city, n in groups:
+        in_specialization = not specialization or group_specialization == specialization
+        # iexact, as the city filter
+        in_city = not city or (group_city or '').lower() == city
+        if in_city:
+            by_specialization[group_specialization] += n
+        if in_specialization and group_city:
+            by_city[group_city] += n
+        if in_specialization and in_city:
+            total += n
+
+    cities = sorted(by_city.items(), key=lambda item: (-item[1], item[0]))[:CITY_FACET_LIMIT]
+    return total, {
+        'specialization': [
+            {'value': value, 'label': label, 'count': by_specialization[value]}
+            for value, label in Doctor.SPECIALIZATION_CHOICES
+        ],
+        'city': [{'value': value, 'count': n} for value, n in cities],
+    }
@@ -0,0 +1,237 @@
+"""
+Read-only fast path for list responses.
+
+For every row, a DRF ``ModelSerializer`` walks its bound fields, resolves
+attributes on model instances and calls each field's ``to_representation``.
+``UserSerializer`` also calls ``build_absolute_uri`` for each picture URL.
+The list endpoints skip that work:
+
+- rows are fetched as tuples with ``values_list()``, using the same joins
+  as ``select_related``;
+- each row goes through a plan of ``(name, getter)`` pairs, compiled once
+  per request, where each getter reads a column by index;
+- picture URLs are built from a single absolute media prefix.
+
+The output is the same as UserSerializer, PatientSerializer and
+DoctorSerializer, down to the rendered bytes (see the tests). Keep the
+plans below in step with those serializers' ``Meta.fields``.
+"""
+import datetime
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+
+from .models import Users
+
+# Output field -> (kind, model columns). 'value' fields are passed through:
+# the database already returns the type the DRF field would produce.
+USER_FIELDS = [
+    ('id', 'value', ['id']),
+    ('username', 'value', ['username']),
+    ('email', 'value', ['email']),
+    ('first_name', 'value', ['first_name']),
+    ('last_name', 'value', ['last_name']),
+    ('profile_picture', 'picture_url', ['profile_picture', 'profile_picture_variants']),
+    ('profile_picture_url', 'picture_url', ['profile_picture', 'profile_picture_variants']),
+    ('profile_picture_variants', 'variants', ['profile_picture', 'profile_picture_variants']),
+    ('user_type', 'value', ['user_type']),
+    ('address_line1', 'value', ['address_line1']),
+    ('city', 'value', ['city']),
+    ('state', 'value', ['state']),
+    ('pincode', 'value', ['pincode']),
+    ('date_joined', 'datetime', ['date_joined']),
+]
+
+PATIENT_FIELDS = [
+    ('id', 'value', ['id']),
+    ('user', 'user', []),
+    ('medical_history', 'value', ['medical_history']),
+    ('allergies', 'value', ['allergies']),
+    ('emergency_contact', 'value', ['emergency_contact']),
+    ('phone_number', 'value', ['phone_number']),
+    ('date_of_birth', 'date', ['date_of_birth']),
+    ('created_at', 'datetime', ['created_at']),
+    ('updated_at', 'datetime', ['updated_at']),
+]
+
+DOCTOR_FIELDS = [
+    ('id', 'value', ['id']),
+    ('user', 'user', []),
+    ('license_number', 'value', ['license_number']),
+    ('specialization', 'value', ['specialization']),
+    ('clinic_name', 'value', ['clinic_name']),
+    ('clinic_address', 'value', ['clinic_address']),
+    ('phone_number', 'value', ['phone_number']),
+    ('experience_years', 'value', ['experience_years']),
+    ('bio', 'value', ['bio']),
+    ('is_verified', 'value', ['is_verified']),
+    ('created_at', 'datetime', ['created_at']),
+    ('updated_at', 'datetime', ['updated_at']),
+]
+
+
+class MediaURLs:
+    """Absolute URLs for stored files, as FileField/build_absolute_uri produce them"""
+
+    def __init__(self, storage, request=None):
+        self.storage = storage
+        self.request = request
+        self.prefix = None
+        # FileSystemStorage.url() is urljoin(base_url, quoted name); for
+        # names without empty or dot segments that is plain concatenation
+        if isinstance(storage, FileSystemStorage):
+            base = storage.base_url
+            self.prefix = request.build_absolute_uri(base) if request is not None else base
+
+    def url(self, name):
+        if self.prefix is not None:
+            path = filepath_to_uri(name).lstrip('/')
+            if '//' not in path and '/.' not in '/' + path:
+                return self.prefix + path
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+
+def _default_timezone():
+    # DRF's DateTimeField.default_timezone()
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+def _datetime_getter(index, tz):
+    def get(row):
+        value = row[index]
+        if not value:
+            return None
+        if isinstance(value, str):
+            return value
+        if tz is not None:
+            value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return get
+
+
+def _date_getter(index):
+    def get(row):
+        value = row[index]
+        if not value:
+            return None
+        return value if isinstance(value, str) else value.isoformat()
+    return get
+
+
+def _picture_url_getter(picture_index, variants_index, urls):
+    # Mirrors core.images.needs_processing: null until the upload is re-encoded
+    def get(row):
+        picture, variants = row[picture_index], row[variants_index]
+        if not picture or not variants or variants.get('picture') != picture:
+            return None
+        return urls.url(picture)
+    return get
+
+
+def _variants_getter(picture_index, variants_index, urls):
+    # Mirrors core.images.current_variants
+    def get(row):
+        picture, variants = row[picture_index], row[variants_index]
+        if not picture or not variants or variants.get('picture') != picture:
+            return None
+        return {
+            name: {fmt: urls.url(path) for fmt, path in paths.items()}
+            for name, paths in variants['sizes'].items()
+        }
+    return get
+
+
+def _empty(row):
+    return {}
+
+
+class RowSerializer:
+    """
+    Compiled, read-only twin of a ModelSerializer.
+
+    ``rows(queryset)`` selects the needed columns as named tuples (so
+    paginators can still read e.g. ``row.id``); ``many(rows, request)``
+    renders them as the serializer's ``.data`` would. ``narrow`` gives the
+    twin of a sparse fieldset (core.fieldsets).
+    """
+
+    def __init__(self, fields, user_prefix=None, user_serializer=None, extra=()):
+        self.fields = fields
+        self.user_prefix = user_prefix
+        self.user_serializer = user_serializer
+        self.columns = []
+        for name, kind, columns in fields:
+            if kind == 'user':
+                self.user_serializer = self.user_serializer or USER_SERIALIZER
+                self.columns += [f'{user_prefix}{column}' for column in self.user_serializer.lookups]
+            else:
+                self.columns += columns
+        # Selected without being rendered, for paginators and callers
+        self.columns += extra
+        self.lookups = list(dict.fromkeys(self.columns))
+
+    def narrow(self, fieldset, extra=()):
+        """
+        Twin rendering only ``fieldset``'s fields (None: all of them) and
+        selecting only the columns those read, plus ``id`` and ``extra``
+        """
+        if fieldset is None and not extra:
+            return self
+        fields = [field for field in self.fields if fieldset is None or field[0] in fieldset]
+        user_serializer = self.user_serializer
+        if user_serializer is not None and fieldset is not None and fieldset.get('user') is not None:
+            user_serializer = user_serializer.narrow(fieldset['user'])
+        return RowSerializer(fields, self.user_prefix, user_serializer, extra=('id',) + tuple(extra))
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.lookups, named=True)
+
+    def compile(self, request=None, offset=0):
+        """``row -> dict`` for this request; ``offset`` shifts column indexes (nested use)"""
+        picture_field = Users._meta.get_field('profile_picture')
+        urls = MediaURLs(picture_field.storage, request)
+        tz = _default_timezone()
+        index = {column: offset + i for i, column in enumerate(self.lookups)}
+        plan = []
+        for name, kind, columns in self.fields:
+            if kind == 'user':
+                if self.user_serializer.lookups:
+                    first = index[f'{self.user_prefix}{self.user_serializer.lookups[0]}']
+                    getter = self.user_serializer.compile(request, offset=first)
+                else:
+                    getter = _empty
+            elif kind == 'value':
+                getter = itemgetter(index[columns[0]])
+            elif kind == 'datetime':
+                getter = _datetime_getter(index[columns[0]], tz)
+            elif kind == 'date':
+                getter = _date_getter(index[columns[0]])
+            elif kind == 'picture_url':
+                getter = _picture_url_getter(index[columns[0]], index[columns[1]], urls)
+            elif kind == 'variants':
+                getter = _variants_getter(index[columns[0]], index[columns[1]], urls)
+            else:
+                raise ValueError(f'Unknown field kind {kind!r}')
+            plan.append((name, getter))
+
+        def to_representation(row):
+            return {name: getter(row) for name, getter in plan}
+        return to_representation
+
+    def many(self, rows, request=None):
+        to_representation = self.compile(request)
+        return [to_representation(row) for row in rows]
+
+
+USER_SERIALIZER = RowSerializer(USER_FIELDS)
+PATIENT_SERIALIZER = RowSerializer(PATIENT_FIELDS, user_prefix='user__')
+DOCTOR_SERIALIZER = RowSerializer(DOCTOR_FIELDS, user_prefix='user__')
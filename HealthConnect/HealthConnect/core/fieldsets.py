@@ -0,0 +1,128 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?exclude=`` on the core API's reads.
+
+Both take comma-separated field names, with nested user fields named like
+``user.first_name``. ``fields`` keeps only the fields listed (``user`` alone
+keeps the whole nested user), then ``exclude`` drops fields. The selection
+reaches the database: lists, batches and the doctor directory select only
+the columns the kept fields read (``RowSerializer.narrow``), and single
+records (``retrieve`` and ``my_profile``) are loaded with ``only()``. So
+unrequested columns such as ``medical_history`` or ``bio`` are never read.
+Two reads only trim their output: ``/users/me/`` renders the user that
+authentication already loaded, and profile updates load the whole row
+they validate and save.
+
+A fieldset is a dict of the kept field names, in the serializer's order,
+each mapped to None, or to the fieldset of a nested serializer.
+"""
+from rest_framework.exceptions import ParseError
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def available_fields(row_serializer):
+    """``{name: None or {nested name: None}}`` of every field ``row_serializer`` renders"""
+    fields = {}
+    for name, kind, columns in row_serializer.fields:
+        if kind == 'user':
+            fields[name] = available_fields(row_serializer.user_serializer)
+        else:
+            fields[name] = None
+    return fields
+
+
+def _paths(value, available):
+    paths = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, nested = part.partition('.')
+        if name not in available or (nested and (available[name] is None or nested not in available[name])):
+            raise ValueError(f'Unknown field: {part!r}.')
+        paths.append((name, nested or None))
+    return paths
+
+
+def parse_fieldset(query_params, row_serializer):
+    """The fieldset asked for, or None for whole records; raises ValueError with a message for the client"""
+    include = query_params.get(FIELDS_PARAM)
+    exclude = query_params.get(EXCLUDE_PARAM)
+    if include is None and exclude is None:
+        return None
+    available = available_fields(row_serializer)
+    if include is None:
+        kept = {name: None for name in available}
+    else:
+        kept = {}
+        for name, nested in _paths(include, available):
+            if nested is None:
+                kept[name] = None
+            elif name not in kept or kept[name] is not None:
+                kept.setdefault(name, set()).add(nested)
+        if not kept:
+            raise ValueError('fields must name at least one field.')
+    for name, nested in _paths(exclude or '', available):
+        if nested is None:
+            kept.pop(name, None)
+        elif name in kept:
+            if kept[name] is None:
+                kept[name] = set(available[name])
+            kept[name].discard(nested)
+    return {
+        name: None if kept[name] is None else {sub: None for sub in available[name] if sub in kept[name]}
+        for name in available if name in kept
+    }
+
+
+def load_only(queryset, row_serializer):
+    """``queryset`` loading only the columns ``row_serializer`` selects"""
+    columns = row_serializer.lookups
+    prefix = row_serializer.user_prefix
+    if prefix:
+        relation = prefix[:-2]
+        if any(column.startswith(prefix) for column in columns):
+            # A select_related relation can't be deferred itself
+            columns = columns + [relation]
+        else:
+            queryset = queryset.select_related(None)
+    return queryset.only(*columns)
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin for ``?fields=``/``?exclude=``. ``self.fieldset`` is the
+    parsed selection (None for whole records) and ``get_row_serializer()``
+    the matching RowSerializer of ``row_serializer``. ``retrieve`` loads only
+    the needed columns and renders only the selected fields.
+    """
+    row_serializer = None
+    fieldset = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        try:
+            self.fieldset = parse_fieldset(request.query_params, self.row_serializer)
+        except ValueError as e:
+            raise ParseError(str(e))
+
+    def get_row_serializer(self, extra=()):
+        return self.row_serializer.narrow(self.fieldset, extra)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve' and self.fieldset is not None:
+            queryset = load_only(queryset, self.get_row_serializer())
+        return queryset
+
+    def get_profile_queryset(self, queryset):
+        """``queryset`` of profiles loading only the selected columns, and the ETag's ``updated_at``s"""
+        if self.fieldset is None:
+            return queryset
+        return load_only(queryset, self.get_row_serializer(extra=['updated_at', 'user__updated_at']))
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'retrieve':
+            kwargs.setdefault('fieldset', self.fieldset)
+        return super().get_serializer(*args, **kwargs)
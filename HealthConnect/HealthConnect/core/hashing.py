@@ -0,0 +1,109 @@
+"""
+Bounded executor for password hashing.
+
+PBKDF2 holds a thread for tens of milliseconds. Under ASGI the synchronous
+views share one thread, so a login burst would stall every other endpoint.
+The async login/signup views hand hashing to this pool instead. hashlib
+releases the GIL while hashing, so a thread pool gives real parallelism.
+
+The pool admits at most ``WORKERS + MAX_QUEUE`` jobs at a time. Anything
+beyond that raises ``HashingPoolSaturated`` right away, and the views answer
+it with 503 and a ``Retry-After`` header instead of queueing without limit.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+DEFAULTS = {
+    'WORKERS': 4,
+    'MAX_QUEUE': 16,
+    'RETRY_AFTER': 1,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PASSWORD_HASHING_POOL', {}))
+    return config
+
+
+class HashingPoolSaturated(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Password hashing pool is saturated')
+        self.retry_after = retry_after
+
+
+class HashingPool:
+    def __init__(self, workers, max_queue, retry_after=1):
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+        self.rejected = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='password-hashing'
+                    )
+        return self._executor
+
+    def submit(self, func, *args):
+        """Schedule ``func(*args)``; raises HashingPoolSaturated when full."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingPoolSaturated(self.retry_after)
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    async def run(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = get_config()
+                _pool = HashingPool(config['WORKERS'], config['MAX_QUEUE'], config['RETRY_AFTER'])
+    return _pool
+
+
+def reset_hashing_pool():
+    """Drop the shared pool so the next call picks up new settings (tests)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
@@ -0,0 +1,283 @@
+"""
+Profile-picture processing off the request path.
+
+Uploads are saved as-is by the views. Once the transaction commits, the user
+is handed to a small local thread pool, ``ImageWorker``. The worker
+re-encodes the picture into fixed-size square variants. Each variant is
+written as WebP and as JPEG, and no EXIF, GPS or ICC metadata is carried over.
+Files are stored under the SHA-256 of the uploaded bytes, so identical
+uploads share one set of files and are only decoded once.
+``Users.profile_picture`` is then pointed at the largest JPEG. Until then
+the API renders the picture (``profile_picture``, ``profile_picture_url``
+and ``profile_picture_variants``) as null, because the upload still
+carries its metadata.
+
+The upload itself is kept as the ``original``, moved to a random name under
+``ORIGINALS_PREFIX`` that the API never links to (it still carries its
+metadata). Rebuilding variants (``process_profile_pictures --force``) always
+re-encodes from it, never from an earlier variant. Originals and variant
+files that no profile references any more are deleted.
+
+``Users.profile_picture_variants`` records which picture the variants were
+built from, so a newer upload is never overwritten by an older job.
+"""
+import hashlib
+import io
+import logging
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WORKERS': 1,
+    # Process inline when the transaction commits instead of in the pool
+    'EAGER': False,
+}
+
+# Variant name -> square edge in pixels, largest first
+VARIANTS = {
+    'large': 512,
+    'medium': 256,
+    'thumb': 96,
+}
+
+# Format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# The variant and format that Users.profile_picture points at once processed
+PRIMARY = ('large', 'jpeg')
+
+CONTENT_PREFIX = 'profile_pictures/sha256'
+ORIGINALS_PREFIX = 'profile_pictures/originals'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PROFILE_PICTURE_PIPELINE', {}))
+    return config
+
+
+def variant_path(digest, name, fmt):
+    extension = FORMATS[fmt][0]
+    return f'{CONTENT_PREFIX}/{digest[:2]}/{digest}/{name}-{VARIANTS[name]}.{extension}'
+
+
+def original_path(upload):
+    extension = os.path.splitext(upload)[1].lower()
+    return f'{ORIGINALS_PREFIX}/{secrets.token_hex(16)}{extension}'
+
+
+def variant_paths(variants):
+    """Every variant file recorded in a ``profile_picture_variants`` value"""
+    sizes = (variants or {}).get('sizes') or {}
+    return {path for formats in sizes.values() for path in formats.values()}
+
+
+def needs_processing(user):
+    name = user.profile_picture.name if user.profile_picture else ''
+    variants = user.profile_picture_variants or {}
+    return bool(name) and variants.get('picture') != name
+
+
+def current_variants(user):
+    """``{variant: {format: storage path}}`` for the current picture, or None while pending"""
+    if not user.profile_picture or needs_processing(user):
+        return None
+    return user.profile_picture_variants['sizes']
+
+
+def _flatten(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(data):
+    """Decode an upload and return ``{(variant, format): encoded bytes}``"""
+    image = Image.open(io.BytesIO(data))
+    largest = max(VARIANTS.values())
+    # Let the JPEG decoder downscale by a power of two while decoding;
+    # phone photos shrink by 4-8x before a single pixel is resampled
+    image.draft('RGB', (largest, largest))
+    image = _flatten(image)
+    rendered = {}
+    for name, edge in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        # Each variant is resampled from the previous, larger one
+        image = ImageOps.fit(image, (edge, edge), Image.Resampling.LANCZOS)
+        for fmt, (extension, options) in FORMATS.items():
+            out = io.BytesIO()
+            image.save(out, **options)
+            rendered[name, fmt] = out.getvalue()
+    return rendered
+
+
+def store_variants(data, storage=default_storage, replace=False):
+    """Write the variants for ``data`` unless this content was seen before (or ``replace``)"""
+    digest = hashlib.sha256(data).hexdigest()
+    paths = {(name, fmt): variant_path(digest, name, fmt) for name in VARIANTS for fmt in FORMATS}
+    if replace or not all(storage.exists(path) for path in paths.values()):
+        for key, content in render_variants(data).items():
+            if replace and storage.exists(paths[key]):
+                storage.delete(paths[key])
+            if not storage.exists(paths[key]):
+                storage.save(paths[key], ContentFile(content))
+    sizes = {}
+    for (name, fmt), path in paths.items():
+        sizes.setdefault(name, {})[fmt] = path
+    return digest, sizes
+
+
+def discard_unused(paths, storage=default_storage):
+    """Delete the variant files in ``paths`` that no user's variants reference"""
+    from .models import Users
+
+    digests = {path.split('/')[-2] for path in paths}
+    if not digests:
+        return
+    # Identical uploads share files: keep those another user still points at
+    referenced = set()
+    for variants in Users.objects.filter(profile_picture_variants__sha256__in=digests).values_list(
+            'profile_picture_variants', flat=True):
+        referenced |= variant_paths(variants)
+    for path in paths - referenced:
+        storage.delete(path)
+
+
+def discard_picture(variants, storage=default_storage):
+    """Delete a replaced or deleted profile's original and its unshared variants"""
+    if not variants:
+        return
+    if variants.get('original'):
+        storage.delete(variants['original'])
+    discard_unused(variant_paths(variants), storage)
+
+
+def process_profile_picture(user_id, picture, force=False):
+    """
+    Build the variants for ``picture`` and point the user at them. With
+    ``force``, rebuild the variants of an already processed picture from its
+    original. Returns False if the user has since uploaded something else
+    (or was deleted), or if there's nothing to do.
+    """
+    from .models import Users
+
+    user = Users.objects.filter(pk=user_id).first()
+    if user is None or user.profile_picture.name != picture:
+        return False
+    previous = user.profile_picture_variants or {}
+    if needs_processing(user):
+        source = picture
+    elif force and previous.get('original'):
+        source = previous['original']
+    else:
+        return False
+    storage = user.profile_picture.storage
+    with storage.open(source, 'rb') as handle:
+        data = handle.read()
+    digest, sizes = store_variants(data, storage, replace=force)
+    primary = sizes[PRIMARY[0]][PRIMARY[1]]
+    original = source
+    upload = source == picture and not picture.startswith(CONTENT_PREFIX)
+    if upload:
+        original = storage.save(original_path(picture), ContentFile(data))
+    elif source == picture:
+        # A variant (from before originals were kept): nothing better to keep
+        original = None
+    variants = {'picture': primary, 'original': original, 'sha256': digest, 'sizes': sizes}
+
+    with transaction.atomic():
+        # Re-check under the write: another upload may have landed meanwhile
+        current = Users.objects.filter(pk=user_id).values_list('profile_picture', flat=True).first()
+        if current == picture:
+            user.profile_picture = primary
+            user.profile_picture_variants = variants
+            user.save(update_fields=['profile_picture', 'profile_picture_variants', 'updated_at'])
+    if current != picture:
+        discard_picture(variants if upload else {'sizes': sizes}, storage)
+        return False
+
+    if upload:
+        storage.delete(picture)
+    if previous.get('original') and previous['original'] != original:
+        storage.delete(previous['original'])
+    discard_unused(variant_paths(previous) - variant_paths(variants), storage)
+    return True
+
+
+class ImageWorker:
+    """Lazily started thread pool running process_profile_picture jobs"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='profile-pictures'
+                    )
+        return self._executor
+
+    def submit(self, user_id, picture):
+        return self.executor.submit(self._run, user_id, picture)
+
+    def _run(self, user_id, picture):
+        try:
+            return process_profile_picture(user_id, picture)
+        except Exception:
+            logger.exception('Processing profile picture %r of user %s failed', picture, user_id)
+            return False
+        finally:
+            # Connections are per thread; don't leave this one open between jobs
+            connections.close_all()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_image_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = ImageWorker(get_config()['WORKERS'])
+    return _worker
+
+
+def schedule_processing(user, using=None):
+    """Process the user's picture once the surrounding transaction commits"""
+    user_id, picture = user.pk, user.profile_picture.name
+
+    def run():
+        if get_config()['EAGER']:
+            process_profile_picture(user_id, picture)
+        else:
+            get_image_worker().submit(user_id, picture)
+
+    transaction.on_commit(run, using=using)
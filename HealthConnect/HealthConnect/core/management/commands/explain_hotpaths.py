@@ -0,0 +1,113 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core.fast_serializers import DOCTOR_SERIALIZER, PATIENT_SERIALIZER, USER_SERIALIZER
+from core.models import Doctor, Patient, Pincode, Users
+from core.search import search_users
+
+# Plan lines that read a whole table, per vendor. SQLite reports index and
+# FTS5 walks as "SCAN x USING [COVERING] INDEX" / "VIRTUAL TABLE INDEX".
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\b(?:INDEX|CONSTANT ROW)\b)(\S+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\S+)'),
+}
+
+
+def user_page(**filters):
+    # UserViewSet.list, page mode (Meta.ordering)
+    return USER_SERIALIZER.rows(Users.objects.filter(**filters))[:10]
+
+
+def user_cursor_page(**filters):
+    # UserViewSet.list?cursor=: KeysetCursorPagination's seek on (-date_joined, -id)
+    now = timezone.now()
+    users = Users.objects.filter(**filters).filter(Q(date_joined__lt=now) | Q(date_joined=now, id__lt=1))
+    return USER_SERIALIZER.rows(users.order_by('-date_joined', '-id'))[:11]
+
+
+def verified_doctors(**filters):
+    # DoctorViewSet.verified_doctors
+    doctors = Doctor.objects.select_related('user').filter(is_verified=True, **filters).order_by('id')
+    return doctors.values_list(*DOCTOR_SERIALIZER.lookups, 'user__updated_at')[:10]
+
+
+def export_since(model):
+    # core.exports.stream_export(updated_since=...)
+    since = model.objects.filter(updated_at__gte=timezone.now()).values('pk')
+    return model.objects.order_by('id').filter(pk__in=since)
+
+
+# name -> (queryset factory, tables a full scan of is expected)
+HOTPATHS = {
+    'login': (lambda: Users.objects.filter(Q(email='a@example.com') | Q(username='a@example.com'))[:2], ()),
+    'token_auth': (lambda: Token.objects.select_related('user').filter(key='0' * 40), ()),
+    'users.list': (user_page, ()),
+    'users.list?user_type': (lambda: user_page(user_type='doctor'), ()),
+    'users.list?cursor': (user_cursor_page, ()),
+    'users.list?user_type&cursor': (lambda: user_cursor_page(user_type='doctor'), ()),
+    'users.list?search': (lambda: search_users(Users.objects.all(), 'sharma')[0], ()),
+    # Unordered page walks stop after one page
+    'patients.list': (lambda: PATIENT_SERIALIZER.rows(Patient.objects.select_related('user'))[:10],
+                      ('core_patient',)),
+    'doctors.list': (lambda: DOCTOR_SERIALIZER.rows(Doctor.objects.select_related('user'))[:10],
+                     ('core_doctor',)),
+    'patients.my_profile': (lambda: Patient.objects.select_related('user').filter(user=1), ()),
+    'doctors.my_profile': (lambda: Doctor.objects.select_related('user').filter(user=1), ()),
+    'doctors.verified': (verified_doctors, ()),
+    'doctors.verified?specialization': (lambda: verified_doctors(specialization='cardiology'), ()),
+    # DoctorViewSet.nearby: the grid picks the ids, these fetch the rest
+    'doctors.nearby': (lambda: Pincode.objects.filter(pincode='560001').values_list('latitude', 'longitude'), ()),
+    'doctors.nearby rows': (
+        lambda: DOCTOR_SERIALIZER.rows(Doctor.objects.filter(pk__in=[1, 2], is_verified=True)), ()),
+    'patients.export?updated_since': (lambda: export_since(Patient), ()),
+    'doctors.export?updated_since': (lambda: export_since(Doctor), ()),
+}
+
+
+def full_scans(plan, vendor):
+    pattern = FULL_SCAN_PATTERNS.get(vendor)
+    if pattern is None:
+        return []
+    return [match.group(1).strip('"') for match in pattern.finditer(plan)]
+
+
+class Command(BaseCommand):
+    help = ('Print the query plans of the API hot paths and fail if any of them '
+            'scans a whole table it is not expected to')
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name', help='Hot paths to explain (default: all)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--sql', action='store_true', help='Print each query as well')
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(HOTPATHS)
+        if unknown:
+            raise CommandError(f'Unknown hot paths: {", ".join(sorted(unknown))}')
+        vendor = connections[options['database']].vendor
+        if vendor not in FULL_SCAN_PATTERNS:
+            self.stderr.write(f'Full-scan detection is not implemented for {vendor}; printing plans only')
+
+        regressions = []
+        for name in options['names'] or HOTPATHS:
+            factory, expected = HOTPATHS[name]
+            queryset = factory().using(options['database'])
+            plan = queryset.explain()
+            scans = [table for table in full_scans(plan, vendor) if table not in expected]
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if options['sql']:
+                self.stdout.write(str(queryset.query))
+            for line in plan.splitlines():
+                self.stdout.write(f'  {line}')
+            if scans:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f'  full scan of {", ".join(scans)}'))
+
+        if regressions:
+            raise CommandError(f'Unexpected full table scans in: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('No unexpected full table scans'))
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORTS, FORMATS, parse_updated_since, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream patients or doctors (joined to their user) as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output on the fly')
+        parser.add_argument('--updated-since', help='ISO date or datetime; only rows updated at or after it')
+        parser.add_argument('--output', '-o', default='-', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options['updated_since']:
+            try:
+                updated_since = parse_updated_since(options['updated_since'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        chunks = stream_export(options['kind'], options['format'], gzip=options['gzip'],
+                               updated_since=updated_since)
+        if options['output'] == '-':
+            self.write_chunks(sys.stdout.buffer, chunks)
+            return
+        with open(options['output'], 'wb') as handle:
+            self.write_chunks(handle, chunks)
+
+    def write_chunks(self, handle, chunks):
+        for chunk in chunks:
+            handle.write(chunk)
+        handle.flush()
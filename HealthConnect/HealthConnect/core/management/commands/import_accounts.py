@@ -0,0 +1,244 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+
+from core.availability import account_names
+from core.counts import row_counts
+from core.models import Doctor, Patient, Users
+from core.serializers import DoctorCreateSerializer, PatientCreateSerializer, account_user_fields
+from core.views import prepare_signup_data
+
+SERIALIZERS = {
+    'patient': (PatientCreateSerializer, Patient),
+    'doctor': (DoctorCreateSerializer, Doctor),
+}
+
+# Never echoed into the reject file
+SECRET_FIELDS = ('password', 'confirm_password')
+
+
+def _init_worker():
+    # Needed when the pool spawns rather than forks; a no-op otherwise
+    django.setup()
+
+
+def read_records(path, fmt):
+    """Yield (line_number, record) pairs without loading the whole file"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(handle), start=1):
+                yield number, row
+            return
+        for number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = {'__error__': f'Invalid JSON: {e}'}
+            if not isinstance(record, dict):
+                record = {'__error__': 'Expected a JSON object'}
+            yield number, record
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create patient and doctor accounts from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSONL file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--user-type', choices=sorted(SERIALIZERS), default='patient',
+                            help='Used for records without a user_type column')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Records written per transaction')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Password hashing processes (0 hashes in this process)')
+        parser.add_argument('--reject-file', help='Defaults to <path>.rejects.jsonl')
+        parser.add_argument('--checkpoint', help='Defaults to <path>.checkpoint')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip records up to the line stored in the checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.default_user_type = options['user_type']
+        # One serializer per account type: building the field set is the
+        # expensive part of validation, so reuse it for every record
+        self.serializers = {user_type: cls() for user_type, (cls, model) in SERIALIZERS.items()}
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        reject_path = options['reject_file'] or f'{path}.rejects.jsonl'
+
+        state = {'line': 0, 'created': 0, 'rejected': 0}
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as handle:
+                state.update(json.load(handle))
+            self.stdout.write(f"Resuming after line {state['line']}")
+
+        self.workers = options['workers']
+        pool = None
+        if self.workers > 0:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        started = time.perf_counter()
+        processed = 0
+        try:
+            with open(reject_path, 'a' if options['resume'] else 'w', encoding='utf-8') as rejects:
+                self.rejects = rejects
+                records = ((n, r) for n, r in read_records(path, fmt) if n > state['line'])
+                for batch in batched(records, options['batch_size']):
+                    created, rejected = self.import_batch(batch, pool)
+                    state['line'] = batch[-1][0]
+                    state['created'] += created
+                    state['rejected'] += rejected
+                    processed += len(batch)
+                    rejects.flush()
+                    self.save_checkpoint(checkpoint_path, state)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"line {state['line']}: {state['created']} created, "
+                                          f"{state['rejected']} rejected")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['created']} accounts, rejected {state['rejected']} "
+            f"({processed} records in {elapsed:.1f}s, {rate:.0f} records/s)"
+        ))
+        if state['rejected']:
+            self.stdout.write(f'Rejected records: {reject_path}')
+
+    def save_checkpoint(self, path, state):
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as handle:
+            json.dump(state, handle)
+        os.replace(tmp, path)
+
+    def reject(self, line, record, errors):
+        safe = {k: v for k, v in record.items() if k not in SECRET_FIELDS and k != '__error__'}
+        self.rejects.write(json.dumps({'line': line, 'errors': errors, 'record': safe}, default=str) + '\n')
+
+    def validate(self, line, record):
+        if '__error__' in record:
+            self.reject(line, record, {'non_field_errors': [record['__error__']]})
+            return None
+        user_type = record.get('user_type') or self.default_user_type
+        if user_type not in SERIALIZERS:
+            self.reject(line, record, {'user_type': ['Must be "patient" or "doctor".']})
+            return None
+        data = prepare_signup_data(record)
+        # Empty CSV cells mean "not provided", not "blank"
+        data = {k: v for k, v in data.items() if v not in ('', None) and k != 'profile_picture'}
+        try:
+            validated_data = self.serializers[user_type].run_validation(data)
+        except ValidationError as e:
+            self.reject(line, record, e.detail)
+            return None
+        return line, record, user_type, validated_data
+
+    def drop_duplicates(self, rows):
+        """Reject records that clash with existing accounts or earlier records"""
+        usernames = {row[3]['username'] for row in rows}
+        emails = {Users.objects.normalize_email(row[3]['email']) for row in rows}
+        licenses = {row[3]['license_number'] for row in rows if row[2] == 'doctor'}
+        taken_usernames = set(Users.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(Users.objects.filter(email__in=emails).values_list('email', flat=True))
+        taken_licenses = set(
+            Doctor.objects.filter(license_number__in=licenses).values_list('license_number', flat=True)
+        )
+        unique = []
+        for line, record, user_type, data in rows:
+            email = Users.objects.normalize_email(data['email'])
+            errors = {}
+            if data['username'] in taken_usernames:
+                errors['username'] = ['A user with that username already exists.']
+            if email in taken_emails:
+                errors['email'] = ['A user with that email already exists.']
+            if user_type == 'doctor' and data['license_number'] in taken_licenses:
+                errors['license_number'] = ['A doctor with that license number already exists.']
+            if errors:
+                self.reject(line, record, errors)
+                continue
+            taken_usernames.add(data['username'])
+            taken_emails.add(email)
+            if user_type == 'doctor':
+                taken_licenses.add(data['license_number'])
+            unique.append((line, record, user_type, data))
+        return unique
+
+    def import_batch(self, batch, pool):
+        rows = [row for row in (self.validate(line, record) for line, record in batch) if row]
+        rows = self.drop_duplicates(rows)
+        rejected = len(batch) - len(rows)
+        if not rows:
+            return 0, rejected
+
+        passwords = [row[3]['password'] for row in rows]
+        if pool is not None:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+        else:
+            hashes = [make_password(p) for p in passwords]
+
+        try:
+            with transaction.atomic():
+                self.write(rows, hashes)
+            return len(rows), rejected
+        except IntegrityError:
+            pass
+        # Something raced us (or slipped past the pre-check): isolate the offenders
+        created = 0
+        for row, password_hash in zip(rows, hashes):
+            try:
+                with transaction.atomic():
+                    self.write([row], [password_hash])
+                created += 1
+            except IntegrityError as e:
+                self.reject(row[0], row[1], {'non_field_errors': [str(e)]})
+                rejected += 1
+        return created, rejected
+
+    def write(self, rows, hashes):
+        users = [
+            Users.objects.build_user(
+                password_hash=password_hash, user_type=user_type,
+                **account_user_fields(data)
+            )
+            for (line, record, user_type, data), password_hash in zip(rows, hashes)
+        ]
+        users = Users.objects.bulk_create(users)
+        # bulk_create sends no post_save
+        account_names.add_many(users)
+        profiles = {'patient': [], 'doctor': []}
+        for (line, record, user_type, data), user in zip(rows, users):
+            model = SERIALIZERS[user_type][1]
+            profiles[user_type].append(model(user=user, **self.serializers[user_type].profile_fields(data)))
+        for user_type, objs in profiles.items():
+            if objs:
+                SERIALIZERS[user_type][1].objects.bulk_create(objs)
+        Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in users])
+        for model in (Users, Patient, Doctor):
+            row_counts.invalidate(model)
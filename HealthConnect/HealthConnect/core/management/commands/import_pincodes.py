@@ -0,0 +1,80 @@
+import csv
+import math
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Pincode
+from core.proximity import doctor_locations, normalize_pincode
+
+# Accepted spellings of each column, lower-cased
+COLUMNS = {
+    'pincode': ('pincode', 'pin', 'postal_code'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon', 'lng', 'long'),
+}
+
+
+def find_columns(fieldnames):
+    names = {name.strip().lower(): name for name in fieldnames or ()}
+    columns = {}
+    for column, spellings in COLUMNS.items():
+        found = [names[spelling] for spelling in spellings if spelling in names]
+        if not found:
+            raise CommandError(f'No {column} column (tried {", ".join(spellings)})')
+        columns[column] = found[0]
+    return columns
+
+
+def parse_coordinate(value, bound):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number) or abs(number) > bound:
+        return None
+    return number
+
+
+class Command(BaseCommand):
+    help = ('Load pincode coordinates for the nearby-doctors lookup from a CSV with '
+            'pincode, latitude and longitude columns')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row')
+        parser.add_argument('--replace', action='store_true', help='Drop the existing table contents first')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Post office lists repeat a pincode once per office; use the centroid
+        points = defaultdict(list)
+        skipped = 0
+        with open(options['path'], newline='', encoding='utf-8') as handle:
+            reader = csv.DictReader(handle)
+            columns = find_columns(reader.fieldnames)
+            for row in reader:
+                pincode = normalize_pincode(row[columns['pincode']])
+                latitude = parse_coordinate(row[columns['latitude']], 90)
+                longitude = parse_coordinate(row[columns['longitude']], 180)
+                if not pincode or latitude is None or longitude is None:
+                    skipped += 1
+                    continue
+                points[pincode].append((latitude, longitude))
+
+        pincodes = [
+            Pincode(pincode=pincode,
+                    latitude=sum(p[0] for p in coordinates) / len(coordinates),
+                    longitude=sum(p[1] for p in coordinates) / len(coordinates))
+            for pincode, coordinates in points.items()
+        ]
+        with transaction.atomic():
+            if options['replace']:
+                Pincode.objects.all().delete()
+            Pincode.objects.bulk_create(
+                pincodes, batch_size=options['batch_size'], update_conflicts=True,
+                unique_fields=['pincode'], update_fields=['latitude', 'longitude'],
+            )
+        # Other processes pick the new table up at their next scheduled rebuild
+        doctor_locations.clear()
+        self.stdout.write(f'Imported {len(pincodes)} pincodes ({skipped} rows skipped)')
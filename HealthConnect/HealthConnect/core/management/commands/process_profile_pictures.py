@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.images import needs_processing, process_profile_picture
+from core.models import Users
+
+
+def process(user_id, picture, force=False):
+    try:
+        return process_profile_picture(user_id, picture, force), None
+    except Exception as e:
+        return False, e
+
+
+def process_in_thread(job):
+    try:
+        return process(*job)
+    finally:
+        # Connections are per thread; close this one before the thread exits
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Generate resized, metadata-free variants for existing profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Processing threads, 0 processes in this thread '
+                                 '(Pillow releases the GIL while resizing)')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild variants from the originals of pictures that were already processed')
+
+    def handle(self, *args, **options):
+        users = (
+            Users.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+            .only('id', 'profile_picture', 'profile_picture_variants').order_by('id')
+        )
+        force = options['force']
+        # Pictures processed before originals were kept can't be rebuilt
+        # without re-encoding a variant, so --force leaves them be
+        jobs = [
+            (user.pk, user.profile_picture.name, force)
+            for user in users.iterator(chunk_size=2000)
+            if needs_processing(user) or (force and user.profile_picture_variants.get('original'))
+        ]
+        if options['workers'] > 0:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(process_in_thread, jobs))
+        else:
+            results = [process(*job) for job in jobs]
+
+        processed = failed = 0
+        for (user_id, picture, _), (done, error) in zip(jobs, results):
+            if error is not None:
+                failed += 1
+                self.stderr.write(f'User {user_id}: {picture}: {error}')
+            elif done:
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} profile pictures, {failed} failed, '
+            f'{len(jobs) - processed - failed} skipped'
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.replicas import get_config, replicate
+
+
+class Command(BaseCommand):
+    help = ('Keep the SQLite read replicas in DATABASE_REPLICAS in sync with the primary '
+            'by copying it over periodically (a local stand-in for replication)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between copies; the replication lag to expect')
+        parser.add_argument('--once', action='store_true', help='Copy once and exit')
+
+    def handle(self, *args, **options):
+        aliases = get_config()['ALIASES']
+        if not aliases:
+            raise CommandError('No replicas configured in DATABASE_REPLICAS')
+        for alias in aliases:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'Replica {alias!r} is not an SQLite database')
+        while True:
+            started = time.monotonic()
+            for alias in aliases:
+                replicate(alias)
+            self.stdout.write(f'Replicated to {", ".join(aliases)} in {time.monotonic() - started:.2f}s')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
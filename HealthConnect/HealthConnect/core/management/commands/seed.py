@@ -0,0 +1,133 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.availability import account_names
+from core.cache import verified_doctors_cache
+from core.counts import row_counts
+from core.models import Doctor, Patient, Pincode, Users
+from core.proximity import doctor_locations
+from core.seeding import fake_bio, fake_clinic_name, fake_pincodes, fake_user_fields
+
+USER_FIELDS = ('id', 'password', 'username', 'email', 'first_name', 'last_name', 'user_type',
+               'city', 'state', 'pincode')
+PATIENT_FIELDS = ('user_id', 'allergies', 'medical_history', 'phone_number')
+DOCTOR_FIELDS = ('user_id', 'license_number', 'specialization', 'clinic_name', 'bio',
+                 'experience_years', 'is_verified')
+ALLERGIES = ['', 'Pollen', 'Peanuts', 'Penicillin', 'Dust', 'Lactose', 'Shellfish']
+CONDITIONS = ['', 'Hypertension', 'Type 2 diabetes', 'Asthma', 'Migraine', 'Hypothyroidism']
+
+
+def insert_rows(model, names, rows):
+    """
+    INSERT ``rows``, tuples of plain values for the fields ``names``, with
+    one executemany. Every other field gets its default, or the current time
+    for auto_now fields, prepared once. At this volume bulk_create spends
+    most of its time building instances and preparing each value.
+    """
+    connection = connections[router.db_for_write(model)]
+    now = timezone.now()
+    fields = [model._meta.get_field(name) for name in names]
+    defaults = [
+        field for field in model._meta.local_concrete_fields
+        if field not in fields and not field.primary_key
+    ]
+    constants = tuple(
+        field.get_db_prep_save(
+            now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+            else field.get_default(),
+            connection,
+        )
+        for field in defaults
+    )
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields + defaults)
+    placeholders = ', '.join(['%s'] * (len(fields) + len(defaults)))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})',
+            [row + constants for row in rows],
+        )
+
+
+def seed_pincodes(rng):
+    """Pincodes scattered around each city; returns them grouped by city"""
+    by_city = fake_pincodes(rng)
+    Pincode.objects.bulk_create(
+        [Pincode(pincode=code, latitude=latitude, longitude=longitude)
+         for rows in by_city.values() for code, latitude, longitude in rows],
+        ignore_conflicts=True,
+    )
+    return {city: [code for code, latitude, longitude in rows] for city, rows in by_city.items()}
+
+
+class Command(BaseCommand):
+    help = ('Bulk-create synthetic patients and doctors for load testing. Every account '
+            'shares one password, hashed once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Accounts to add (one in ten a doctor)')
+        parser.add_argument('--password', default='healthconnect', help='Password of every seeded account')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Accounts written per transaction')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        total, batch_size = options['users'], options['batch_size']
+        if total < 1 or batch_size < 1:
+            raise CommandError('--users and --batch-size must be positive')
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        password = make_password(options['password'])
+        by_city = seed_pincodes(rng)
+        specializations = [value for value, label in Doctor.SPECIALIZATION_CHOICES]
+        # Ids are assigned here so profiles can point at their users without
+        # reading them back. Names are numbered by id, so they stay unique
+        # across runs.
+        first_id = (Users.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        counts = {'patient': 0, 'doctor': 0}
+        for offset in range(0, total, batch_size):
+            start = first_id + offset
+            users, patients, doctors = [], [], []
+            for user_id, fields in enumerate(fake_user_fields(min(batch_size, total - offset), start=start,
+                                                              seed=options['seed']), start=start):
+                fields.update(id=user_id, password=password, pincode=rng.choice(by_city[fields['city']]))
+                users.append(tuple(fields[name] for name in USER_FIELDS))
+                if fields['user_type'] == 'patient':
+                    patients.append((user_id, rng.choice(ALLERGIES), rng.choice(CONDITIONS),
+                                     f'9{rng.randrange(10 ** 9):09d}'))
+                else:
+                    doctors.append((user_id, f'SEED-{user_id}', rng.choice(specializations),
+                                    fake_clinic_name(rng), fake_bio(rng),
+                                    rng.randint(0, 40), rng.random() < 0.9))
+            with transaction.atomic():
+                insert_rows(Users, USER_FIELDS, users)
+                insert_rows(Patient, PATIENT_FIELDS, patients)
+                insert_rows(Doctor, DOCTOR_FIELDS, doctors)
+            counts['patient'] += len(patients)
+            counts['doctor'] += len(doctors)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{offset + len(users)}/{total} accounts')
+
+        # Explicit ids leave sequences behind on backends that have them
+        connection = connections[router.db_for_write(Users)]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Users]):
+                cursor.execute(sql)
+        # No signals were sent. Other processes pick the rows up at their next
+        # scheduled rebuild.
+        verified_doctors_cache.invalidate()
+        for model in (Users, Patient, Doctor):
+            row_counts.invalidate(model)
+        account_names.clear()
+        doctor_locations.clear()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['patient']} patients and {counts['doctor']} doctors "
+            f"in {elapsed:.1f}s ({total / elapsed:.0f} accounts/s)"
+        ))
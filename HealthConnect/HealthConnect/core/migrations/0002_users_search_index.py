@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from core.search import install_search_index, uninstall_search_index
+
+
+def create_index(apps, schema_editor):
+    install_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
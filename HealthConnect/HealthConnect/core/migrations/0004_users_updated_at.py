@@ -0,0 +1,26 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+from core.search import ensure_search_triggers
+
+
+def restore_search_triggers(apps, schema_editor):
+    # Adding a NOT NULL column rebuilds core_users on SQLite, dropping its triggers
+    ensure_search_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_users_profile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='users',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
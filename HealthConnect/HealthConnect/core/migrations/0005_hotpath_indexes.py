@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_users_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(condition=models.Q(('is_verified', True)), fields=['id'], name='doctor_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(condition=models.Q(('is_verified', True)), fields=['specialization'], name='doctor_verified_spec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['updated_at'], name='doctor_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['updated_at'], name='patient_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='users',
+            index=models.Index(fields=['date_joined'], name='users_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='users',
+            index=models.Index(fields=['user_type', 'date_joined'], name='users_type_joined_idx'),
+        ),
+    ]
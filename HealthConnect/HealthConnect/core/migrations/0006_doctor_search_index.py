@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from core.search import DOCTOR_INDEX
+
+
+def create_index(apps, schema_editor):
+    DOCTOR_INDEX.install(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    DOCTOR_INDEX.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_hotpath_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_doctor_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pincode',
+            fields=[
+                ('pincode', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+        ),
+    ]
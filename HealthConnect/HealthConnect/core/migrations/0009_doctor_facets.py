@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from core.doctor_search import DOCTOR_FACETS
+
+
+def create_table(apps, schema_editor):
+    DOCTOR_FACETS.install(schema_editor.connection)
+
+
+def drop_table(apps, schema_editor):
+    DOCTOR_FACETS.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_table, drop_table),
+    ]
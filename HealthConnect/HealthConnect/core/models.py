@@ -13,6 +13,19 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def build_user(self, email, username, password_hash, **extra_fields):
+        """Unsaved user with a password already hashed by make_password (for bulk_create)"""
+        if not email:
+            raise ValueError('Email is required')
+        email = self.normalize_email(email)
+        return self.model(email=email, username=username, password=password_hash, **extra_fields)
+
+    def create_user_with_hash(self, email, username, password_hash, **extra_fields):
+        """Create a user whose password was already hashed with make_password"""
+        user = self.build_user(email, username, password_hash, **extra_fields)
+        user.save(using=self._db)
+        return user
+
     def create_superuser(self, email, username, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -38,7 +51,11 @@ class Users(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=30)
     last_name = models.CharField(max_length=30)
     profile_picture = models.ImageField(upload_to=profile_picture_upload_path, blank=True, null=True)
+    # Resized copies of profile_picture, filled in by core.images
+    profile_picture_variants = models.JSONField(blank=True, null=True, editable=False)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # Version marker for ETag/Last-Modified (core.conditional)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES)
@@ -56,6 +73,12 @@ class Users(AbstractBaseUser, PermissionsMixin):
     
     class Meta:
         ordering = ['-date_joined']
+        indexes = [
+            # UserViewSet.list: newest first, optionally ?user_type=, both
+            # page and cursor modes (SQLite appends the id to every index)
+            models.Index(fields=['date_joined'], name='users_joined_idx'),
+            models.Index(fields=['user_type', 'date_joined'], name='users_type_joined_idx'),
+        ]
 
 
 class Patient(models.Model):
@@ -73,6 +96,14 @@ class Patient(models.Model):
     
     class Meta:
         verbose_name_plural = "Patients"
+        indexes = [
+            # Incremental exports (?updated_since=)
+            models.Index(fields=['updated_at'], name='patient_updated_idx'),
+            # Admin date_hierarchy: first/last date and year ranges
+            models.Index(fields=['created_at'], name='patient_created_idx'),
+            # Admin search by phone number
+            models.Index(fields=['phone_number'], name='patient_phone_idx'),
+        ]
 
 
 class Doctor(models.Model):
@@ -101,3 +132,24 @@ class Doctor(models.Model):
     
     class Meta:
         verbose_name_plural = "Doctors"
+        indexes = [
+            # verified_doctors, with and without ?specialization=, by id.
+            # Partial: SQLite compiles is_verified=True to a bare
+            # "WHERE is_verified", which can't seek an index on the column
+            models.Index(fields=['id'], condition=models.Q(is_verified=True), name='doctor_verified_idx'),
+            models.Index(fields=['specialization'], condition=models.Q(is_verified=True),
+                         name='doctor_verified_spec_idx'),
+            # Incremental exports (?updated_since=)
+            models.Index(fields=['updated_at'], name='doctor_updated_idx'),
+            models.Index(fields=['created_at'], name='doctor_created_idx'),
+        ]
+
+
+class Pincode(models.Model):
+    """Coordinates of a postal code, loaded with ``manage.py import_pincodes``"""
+    pincode = models.CharField(max_length=10, primary_key=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return self.pincode
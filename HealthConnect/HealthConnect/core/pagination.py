@@ -0,0 +1,304 @@
+import base64
+import json
+from functools import partial
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import fast_count, is_filtered, row_counts
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a fixed, unique ordering.
+
+    Each page is fetched with a WHERE clause on the ordering columns instead
+    of OFFSET, so page N costs the same as page 1. The total count is only
+    computed when the client asks for it with ``?with_count=1``.
+    The ordering fields must be non-null and the last one must be unique.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'with_count'
+    page_size = api_settings.PAGE_SIZE or 10
+    max_page_size = 100
+    ordering = ('-date_joined', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.with_count = request.query_params.get(self.count_query_param) in ('1', 'true', 'True')
+        position, reverse = self.decode_cursor(request)
+
+        self.count = queryset.count() if self.with_count else None
+
+        ordering = self._reverse_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._seek_filter(position, reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_previous = has_more
+            self.has_next = position is not None
+        else:
+            self.has_previous = position is not None
+            self.has_next = has_more
+
+        self.first_position = self._position(results[0]) if results else None
+        self.last_position = self._position(results[-1]) if results else None
+        if not results and position is not None:
+            # Empty page reached through a cursor: keep the client able to step back.
+            self.first_position = self.last_position = position
+        return results
+
+    def get_paginated_response(self, data):
+        payload = {
+            'results': data,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.with_count:
+            payload['count'] = self.count
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self._link(self.encode_cursor(self.last_position, reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_position is None:
+            return None
+        return self._link(self.encode_cursor(self.first_position, reverse=True))
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            position = payload['p']
+            reverse = bool(payload.get('r', 0))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def _link(self, cursor):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def _reverse_ordering(self):
+        return tuple(f[1:] if f.startswith('-') else '-' + f for f in self.ordering)
+
+    def _position(self, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _seek_filter(self, position, reverse):
+        # (a, b) after (x, y)  ==>  a > x OR (a = x AND b > y), per column direction
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = '%s__%s' % (name, 'lt' if descending else 'gt')
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+class DoctorSearchPagination(KeysetCursorPagination):
+    """Keyset pagination for DoctorViewSet.search: best match first when ranked"""
+    ordering = ('id',)
+    ranked_ordering = ('search_rank', 'id')
+    # The total comes with the facets, so ?with_count= is never needed
+    count_query_param = None
+
+
+class DirectoryPagination(PageNumberPagination):
+    """
+    Page-number pagination with a client-selectable, capped page size.
+
+    Links carry only the page, the page size and the ``link_params`` the
+    request set, so a cached page holds the same links whatever other
+    params the request that rendered it had. ``link_query`` is that
+    normalized query, for cache keys.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    link_params = ()
+
+    def link_query(self, request):
+        names = (self.page_query_param, self.page_size_query_param) + tuple(self.link_params)
+        return tuple((name, request.query_params[name]) for name in names if name in request.query_params)
+
+    def get_next_link(self):
+        if not self.page.has_next():
+            return None
+        return replace_query_param(self._base_url(), self.page_query_param, self.page.next_page_number())
+
+    def get_previous_link(self):
+        if not self.page.has_previous():
+            return None
+        page_number = self.page.previous_page_number()
+        if page_number == 1:
+            return remove_query_param(self._base_url(), self.page_query_param)
+        return replace_query_param(self._base_url(), self.page_query_param, page_number)
+
+    def _base_url(self):
+        url = self.request.build_absolute_uri(self.request.path)
+        query = urlencode(self.link_query(self.request))
+        return f'{url}?{query}' if query else url
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Django paginator (for admin changelists) that never counts a big table
+    row by row: see ``core.counts.fast_count``. ``count_qualifier`` is
+    "about" for an estimate and "more than" for a count that hit the limit.
+    """
+    count_qualifier = None
+
+    @cached_property
+    def count(self):
+        count, exact = fast_count(self.object_list)
+        if not exact:
+            self.count_qualifier = _('more than') if is_filtered(self.object_list) else _('about')
+        return count
+
+
+class LookaheadPage(Page):
+    """A page that knows whether another follows without a total to compare against"""
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Django paginator whose count comes from ``core.counts.row_counts``.
+    Counts are cached until a table they read is written, and estimated
+    where an exact count would be expensive. An estimated count doesn't bound
+    the pages: a page exists if it has rows, found by reading one row past it.
+    With ``empty_past_end`` a page past the last one is empty instead of
+    raising EmptyPage.
+    """
+
+    def __init__(self, *args, empty_past_end=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.empty_past_end = empty_past_end
+
+    @cached_property
+    def counted(self):
+        return row_counts.count(self.object_list)
+
+    @property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def count_exact(self):
+        return self.counted[1]
+
+    def validate_number(self, number):
+        if self.count_exact:
+            try:
+                return super().validate_number(number)
+            except EmptyPage:
+                if self.empty_past_end and int(number) > 1:
+                    return int(number)
+                raise
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1 and not self.empty_past_end:
+            raise EmptyPage(self.error_messages['no_results'])
+        return LookaheadPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+
+class CachedCountPagination(PageNumberPagination):
+    """
+    The API's default pagination: ``PageNumberPagination`` counted by
+    CachedCountPaginator. ``count_exact`` is false when ``count`` is an
+    estimate, or a lower bound for a filtered list. ``empty_past_end`` makes
+    a page past the last one an empty page instead of a 404.
+    """
+    empty_past_end = False
+
+    @property
+    def django_paginator_class(self):
+        return partial(CachedCountPaginator, empty_past_end=self.empty_past_end)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_exact': self.page.paginator.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['required'].append('count_exact')
+        response_schema['properties']['count_exact'] = {
+            'type': 'boolean',
+            'description': 'False when count is an estimate or a lower bound',
+        }
+        return response_schema
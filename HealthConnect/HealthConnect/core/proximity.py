@@ -0,0 +1,267 @@
+"""
+"Doctors near me": verified doctors by distance from a pincode.
+
+Coordinates come from the ``Pincode`` table, loaded from a CSV with
+``manage.py import_pincodes``; nothing is geocoded over the network. Users
+type their pincode as free text, so lookups ignore whitespace.
+
+``doctor_locations`` holds every verified doctor with a known pincode in an
+in-process grid of ``CELL_DEGREES`` cells. A query only visits the cells
+overlapping the search circle and measures each pincode once, however many
+doctors share it. The grid is built on
+first use. Signals (core.signals) re-place a doctor once a save of the
+doctor or its user commits. Signals only reach the process that made the
+write and ``bulk_create`` sends none, so each process also rebuilds its grid
+after ``REBUILD_SECONDS``, in a background thread while requests keep using
+the old one. ``import_pincodes`` clears it.
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .models import Doctor, Pincode
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+DEFAULTS = {
+    'CELL_DEGREES': 0.1,  # about 11 km north-south
+    'REBUILD_SECONDS': 300,
+    'DEFAULT_RADIUS_KM': 10,
+    'MAX_RADIUS_KM': 100,
+    'DEFAULT_LIMIT': 10,
+    'MAX_LIMIT': 50,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'DOCTOR_PROXIMITY', {}))
+    return config
+
+
+def normalize_pincode(value):
+    return ''.join((value or '').split())
+
+
+def pincode_location(pincode):
+    """``(latitude, longitude)`` of ``pincode``, or None if it isn't in the table"""
+    return Pincode.objects.filter(pincode=normalize_pincode(pincode)).values_list(
+        'latitude', 'longitude').first()
+
+
+def parse_nearby_params(query_params):
+    """``(pincode, radius_km, limit)`` from the query string; raises ValueError with a message for the client"""
+    config = get_config()
+    pincode = normalize_pincode(query_params.get('pincode'))
+    if not pincode:
+        raise ValueError('pincode is required.')
+    try:
+        radius_km = float(query_params.get('radius', config['DEFAULT_RADIUS_KM']))
+        limit = int(query_params.get('limit', config['DEFAULT_LIMIT']))
+    except ValueError:
+        raise ValueError('radius and limit must be numbers.')
+    if not 0 < radius_km <= config['MAX_RADIUS_KM']:
+        raise ValueError(f'radius must be between 0 and {config["MAX_RADIUS_KM"]} km.')
+    if not 0 < limit <= config['MAX_LIMIT']:
+        raise ValueError(f'limit must be between 1 and {config["MAX_LIMIT"]}.')
+    return pincode, radius_km, limit
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class _Grid:
+    """cell -> (latitude, longitude) -> ids of the verified doctors there"""
+
+    def __init__(self, cell_degrees):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.doctors = {}
+
+    def cell(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def place(self, doctor_id, location):
+        self.remove(doctor_id)
+        if location is None:
+            return
+        self.cells.setdefault(self.cell(*location), {}).setdefault(location, set()).add(doctor_id)
+        self.doctors[doctor_id] = location
+
+    def remove(self, doctor_id):
+        location = self.doctors.pop(doctor_id, None)
+        if location is None:
+            return
+        cell = self.cell(*location)
+        doctors = self.cells[cell][location]
+        doctors.discard(doctor_id)
+        if not doctors:
+            del self.cells[cell][location]
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+
+class DoctorLocationIndex:
+    """
+    Thread-safe grid of verified doctors. Builds read the database into a new
+    grid and swap it in, one at a time; saves made meanwhile are replayed onto
+    it so the snapshot can't undo them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._grid = _Grid(get_config()['CELL_DEGREES'])
+        self._built_at = None
+        # Bumped by clear(), so a build that started before it is thrown away
+        self._generation = 0
+        # doctor id -> location (None: not listed) of the saves made during a build
+        self._pending = None
+
+    @property
+    def built(self):
+        return self._built_at is not None
+
+    @property
+    def tracking(self):
+        """Whether saves must be reported: the grid is built or being built"""
+        return self._built_at is not None or self._pending is not None
+
+    def _read(self):
+        """Every verified doctor whose pincode is in the table (two queries), as doctor id -> location"""
+        locations = {
+            pincode: (latitude, longitude)
+            for pincode, latitude, longitude in Pincode.objects.values_list(
+                'pincode', 'latitude', 'longitude').iterator()
+        }
+        doctors = Doctor.objects.filter(is_verified=True).values_list('pk', 'user__pincode')
+        placed = {}
+        for doctor_id, pincode in doctors.iterator():
+            location = locations.get(normalize_pincode(pincode))
+            if location is not None:
+                placed[doctor_id] = location
+        return placed
+
+    def _build(self):
+        with self._lock:
+            generation = self._generation
+            self._pending = {}
+        try:
+            grid = _Grid(get_config()['CELL_DEGREES'])
+            for doctor_id, location in self._read().items():
+                grid.place(doctor_id, location)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                for doctor_id, location in self._pending.items():
+                    grid.place(doctor_id, location)
+                self._grid = grid
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def build(self):
+        with self._build_lock:
+            self._build()
+
+    def _stale(self):
+        return not self.built or time.monotonic() - self._built_at > get_config()['REBUILD_SECONDS']
+
+    def _rebuild(self):
+        try:
+            if self._stale():
+                self._build()
+        except Exception:
+            logger.exception('Rebuilding the doctor location grid failed')
+        finally:
+            self._build_lock.release()
+            # Connections are per thread; don't leave this one open
+            connections.close_all()
+
+    def ensure_built(self):
+        """
+        Build the grid on first use; callers wait for that one build. A stale
+        grid keeps serving while a background thread rebuilds it.
+        """
+        if not self.built:
+            with self._build_lock:
+                if not self.built:
+                    self._build()
+        elif self._stale() and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, name='doctor-locations', daemon=True).start()
+
+    def _update(self, doctor_id, location):
+        with self._lock:
+            if self._built_at is not None:
+                self._grid.place(doctor_id, location)
+            if self._pending is not None:
+                self._pending[doctor_id] = location
+
+    def refresh(self, **lookup):
+        """
+        Re-place the doctor matching ``lookup`` (``pk=`` or ``user_id=``) after
+        a save. A grid that isn't built or being built will read it when it is.
+        """
+        if not self.tracking:
+            return
+        row = Doctor.objects.filter(**lookup).values_list('pk', 'is_verified', 'user__pincode').first()
+        if row is None:
+            return
+        doctor_id, is_verified, pincode = row
+        self._update(doctor_id, pincode_location(pincode) if is_verified else None)
+
+    def remove(self, doctor_id):
+        self._update(doctor_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._grid = _Grid(get_config()['CELL_DEGREES'])
+            self._built_at = None
+            self._generation += 1
+
+    def nearest(self, latitude, longitude, radius_km, limit):
+        """Up to ``limit`` ``(distance_km, doctor_id)`` pairs within ``radius_km``, nearest first"""
+        self.ensure_built()
+        # Bounding box of the circle; longitude degrees shrink towards the poles
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        low_lat, high_lat = latitude - lat_span, latitude + lat_span
+        low_lon, high_lon = longitude - lon_span, longitude + lon_span
+        with self._lock:
+            grid = self._grid
+            low_row, low_col = grid.cell(low_lat, low_lon)
+            high_row, high_col = grid.cell(high_lat, high_lon)
+            within = []
+            for row in range(low_row, high_row + 1):
+                for col in range(low_col, high_col + 1):
+                    for (lat, lon), doctors in grid.cells.get((row, col), {}).items():
+                        # The box test is cheap and rejects the cells' corners
+                        if low_lat <= lat <= high_lat and low_lon <= lon <= high_lon:
+                            distance = haversine_km(latitude, longitude, lat, lon)
+                            if distance <= radius_km:
+                                within.append((distance, doctors))
+            within.sort(key=lambda item: item[0])
+            nearest = []
+            for distance, doctors in within:
+                if len(nearest) >= limit:
+                    break
+                nearest.extend((distance, doctor_id) for doctor_id in sorted(doctors)[:limit - len(nearest)])
+        return nearest
+
+    def __len__(self):
+        return len(self._grid.doctors)
+
+
+doctor_locations = DoctorLocationIndex()
@@ -0,0 +1,55 @@
+"""
+JSON renderer backed by orjson, with DRF's JSONRenderer as the fallback.
+
+The output matches ``rest_framework.renderers.JSONRenderer``:
+- compact separators and UTF-8;
+- ``\\u2028``/``\\u2029`` escaped;
+- datetimes, Decimals, lazy strings and other non-JSON types converted by
+  DRF's own encoder, via orjson's ``default`` hook.
+
+The one difference is float spelling: orjson writes ``1e-5`` where the
+stdlib writes ``1e-05``. The number is the same, and no model here has
+float fields.
+
+The stdlib renderer is used instead when orjson isn't installed, when
+indented output is requested (the browsable API), when the settings ask for
+ASCII or non-compact JSON, and for anything orjson can't encode, such as
+integers wider than 64 bits.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    def __init__(self):
+        super().__init__()
+        # DRF's encoder does the type conversions, so they stay identical;
+        # datetimes go through it too (orjson would keep "+00:00" for UTC)
+        self._default = self.encoder_class().default
+        if orjson is not None:
+            self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self._default, option=self._options)
+        except TypeError:
+            # orjson.JSONEncodeError; let the stdlib produce the result or error
+            return super().render(data, accepted_media_type, renderer_context)
+        if LINE_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028')
+        if PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
@@ -0,0 +1,219 @@
+"""
+Read replicas with read-your-writes.
+
+``settings.DATABASE_REPLICAS['ALIASES']`` names the ``DATABASES`` aliases
+that follow ``default``. ``ReplicaRouter`` sends everything to ``default``
+unless the current request opted in to replica reads:
+
+- ``ReplicaReadsMixin`` (API views) and ``ReplicaReadsAdminMixin`` (admin
+  changelists) opt in for safe methods, after authentication and
+  permission checks have run on the primary;
+- writes, and reads inside ``transaction.atomic()``, go to the primary.
+  Once a request has written (``track_writes`` watches the statements run
+  on the primary), its remaining reads stay there too;
+- ``ReplicaRoutingMiddleware`` pins users who wrote to the primary for
+  ``STICKY_SECONDS``. So ``update_profile`` followed by ``my_profile`` sees
+  the update even while the replica lags.
+
+Pins are stored in the ``CACHE_ALIAS`` cache. Like the directory cache, it
+must be a shared backend when there are several worker processes. Outside
+a request (management commands, shell, worker threads) and with no
+aliases configured, the router leaves routing to Django.
+
+``replicate()`` is a stand-in for real replication when testing locally
+with a second SQLite file (``manage.py replicate_sqlite``).
+"""
+import contextlib
+import contextvars
+import random
+import sqlite3
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+DEFAULTS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'DATABASE_REPLICAS', {}))
+    return config
+
+
+class RoutingState:
+    """What the current request has done so far"""
+
+    def __init__(self):
+        self.replica = None  # alias serving this request's reads, if any
+        self.wrote = False
+        self.written_users = []
+
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+@contextlib.contextmanager
+def routing_scope():
+    token = _state.set(RoutingState())
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+def use_replica():
+    """Send the current scope's reads to a replica; returns its alias or None"""
+    state = _state.get()
+    aliases = get_config()['ALIASES']
+    if state is None or state.wrote or not aliases:
+        return None
+    state.replica = random.choice(aliases)
+    return state.replica
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Read from the primary inside the block, whatever the scope chose"""
+    state = _state.get()
+    replica = state.replica if state is not None else None
+    if state is not None:
+        state.replica = None
+    try:
+        yield
+    finally:
+        if state is not None:
+            state.replica = replica
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def is_pinned(user):
+    if not getattr(user, 'is_authenticated', False):
+        return False
+    return caches[get_config()['CACHE_ALIAS']].get(pin_key(user.pk)) is not None
+
+
+def pin(user_ids):
+    config = get_config()
+    if user_ids and config['ALIASES']:
+        caches[config['CACHE_ALIAS']].set_many(
+            {pin_key(user_id): 1 for user_id in user_ids}, timeout=config['STICKY_SECONDS']
+        )
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        if state.replica is None or state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        # Also called when related objects are merely assigned, so this only
+        # notes users who may get saved: a signup pins the new account
+        state = _state.get()
+        if state is not None and model._meta.label == settings.AUTH_USER_MODEL and 'instance' in hints:
+            state.written_users.append(hints['instance'])
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_config()['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return False if db in get_config()['ALIASES'] else None
+
+
+def track_writes(execute, sql, params, many, context):
+    """Execute wrapper for the primary: notes that the current scope wrote"""
+    state = _state.get()
+    if state is not None and not state.wrote and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        state.wrote = True
+    return execute(sql, params, many, context)
+
+
+def install_write_tracking(sender, connection, **kwargs):
+    """connection_created receiver"""
+    if connection.alias == DEFAULT_DB_ALIAS and track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+class ReplicaRoutingMiddleware:
+    """Gives each request a routing scope and pins users who wrote"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_scope() as state:
+            response = self.get_response(request)
+            self.pin_writers(request, state)
+        return response
+
+    async def __acall__(self, request):
+        with routing_scope() as state:
+            response = await self.get_response(request)
+            self.pin_writers(request, state)
+        return response
+
+    def pin_writers(self, request, state):
+        if not state.wrote:
+            return
+        user_ids = {user.pk for user in state.written_users if not user._state.adding}
+        # DRF stores the user it authenticated on the underlying request
+        user = getattr(request, 'user', None)
+        if getattr(user, 'is_authenticated', False):
+            user_ids.add(user.pk)
+        pin(user_ids)
+
+
+class ReplicaReadsMixin:
+    """APIView mixin: safe requests read from a replica once access checks pass"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned(request.user):
+            use_replica()
+
+
+class ReplicaReadsAdminMixin:
+    """ModelAdmin mixin: the changelist reads from a replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method in SAFE_METHODS and not is_pinned(request.user):
+            use_replica()
+        return super().changelist_view(request, extra_context)
+
+
+def replicate(alias):
+    """Copy the primary SQLite database into replica ``alias``'s file"""
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'], timeout=30)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,229 @@
+"""
+Full-text search over the user and doctor directories.
+
+On SQLite each directory is indexed by an FTS5 table: an external-content
+table over the model's table, kept in sync by triggers, which also covers
+``bulk_create`` and ``QuerySet.update``.
+
+- Users are indexed with the trigram tokenizer, so substring searches ("mit"
+  finds "Smith") are served from the index instead of four ``LIKE '%x%'``
+  scans.
+- Doctors' clinic name and bio are indexed by word (Porter stemming,
+  diacritics folded) and matched by prefix, then ranked with bm25.
+
+Other backends, and terms the index can't serve, fall back to ``icontains``
+filters.
+"""
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+MIN_TOKEN_LENGTH = 3
+
+
+class FTSIndex:
+    def __init__(self, fts_table, table, columns, tokenize):
+        self.fts_table = fts_table
+        self.table = table
+        self.columns = columns
+        self.tokenize = tokenize
+        self._available = {}
+
+    def statements(self):
+        fts, table = self.fts_table, self.table
+        columns = ', '.join(self.columns)
+        new_values = ', '.join(f'new.{c}' for c in self.columns)
+        old_values = ', '.join(f'old.{c}' for c in self.columns)
+        delete = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+        insert = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{columns}, content='{table}', content_rowid='id', tokenize='{self.tokenize}')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} "
+            f"BEGIN {delete} {insert} END",
+        ]
+
+    def supported(self, connection):
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(f"CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='{self.tokenize}')")
+                cursor.execute('DROP TABLE temp.fts_probe')
+            except DatabaseError:
+                return False
+        return True
+
+    def install(self, connection, rebuild=True):
+        """Create the FTS index and its sync triggers if missing. Idempotent."""
+        if not self.supported(connection):
+            return False
+        with connection.cursor() as cursor:
+            for statement in self.statements():
+                cursor.execute(statement)
+            if rebuild:
+                cursor.execute(f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('rebuild')")
+        self._available[connection.alias] = True
+        return True
+
+    def uninstall(self, connection):
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {self.fts_table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {self.fts_table}')
+        self._available.pop(connection.alias, None)
+
+    def available(self, alias='default'):
+        if alias not in self._available:
+            connection = connections[alias]
+            self._available[alias] = (
+                connection.vendor == 'sqlite'
+                and self.fts_table in connection.introspection.table_names()
+            )
+        return self._available[alias]
+
+    def ensure_triggers(self, connection):
+        """
+        Reinstall the sync triggers if a migration dropped them.
+
+        SQLite's schema editor rebuilds a table when a column is added or
+        altered, and dropping the old table drops its triggers with it.
+        """
+        if connection.vendor != 'sqlite':
+            return
+        if self.fts_table not in connection.introspection.table_names():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{self.fts_table}_%'],
+            )
+            complete = cursor.fetchone()[0] == 3
+        if not complete:
+            self.install(connection)
+
+    def matching_ids(self, match):
+        """Subquery of the rowids matching ``match``, for ``__in`` lookups"""
+        return RawSQL(f'SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s', (match,))
+
+    def join(self, queryset, match):
+        """``queryset`` restricted to rows matching ``match``, joined to the index on rowid"""
+        return queryset.extra(
+            tables=[self.fts_table],
+            where=[f'{self.fts_table}.rowid = "{self.table}"."id"', f'{self.fts_table} MATCH %s'],
+            params=[match],
+        )
+
+
+USER_INDEX = FTSIndex('core_users_fts', 'core_users', ('username', 'email', 'first_name', 'last_name'),
+                      'trigram')
+DOCTOR_INDEX = FTSIndex('core_doctor_fts', 'core_doctor', ('clinic_name', 'bio'),
+                        'porter unicode61 remove_diacritics 2')
+# Relative weight of a hit in each DOCTOR_INDEX column
+DOCTOR_WEIGHTS = (2.0, 1.0)
+
+FTS_TABLE = USER_INDEX.fts_table
+FTS_COLUMNS = USER_INDEX.columns
+
+
+def install_search_index(connection, rebuild=True):
+    return USER_INDEX.install(connection, rebuild=rebuild)
+
+
+def uninstall_search_index(connection):
+    USER_INDEX.uninstall(connection)
+
+
+def search_index_available(alias='default'):
+    return USER_INDEX.available(alias)
+
+
+def ensure_search_triggers(connection):
+    """Reinstall the sync triggers of every search index a migration dropped"""
+    for index in (USER_INDEX, DOCTOR_INDEX):
+        index.ensure_triggers(connection)
+
+
+def build_match_query(term):
+    """
+    Turn free text into an FTS5 query: every whitespace-separated token must
+    appear (as a substring) in one of the indexed columns. Returns None when a
+    token is too short for the trigram index.
+    """
+    tokens = term.split()
+    if not tokens or any(len(token) < MIN_TOKEN_LENGTH for token in tokens):
+        return None
+    return ' AND '.join('"%s"' % token.replace('"', '""') for token in tokens)
+
+
+def build_prefix_query(term):
+    """
+    FTS5 query for the word-tokenized indexes: every token must start a word
+    ("cardio" finds "cardiology"). None when there is nothing to search for.
+    """
+    tokens = [token.replace('"', '""') for token in term.split()]
+    if not tokens:
+        return None
+    return ' AND '.join('"%s"*' % token for token in tokens)
+
+
+def icontains_filter(term, prefix=''):
+    return (
+        Q(**{f'{prefix}username__icontains': term}) |
+        Q(**{f'{prefix}email__icontains': term}) |
+        Q(**{f'{prefix}first_name__icontains': term}) |
+        Q(**{f'{prefix}last_name__icontains': term})
+    )
+
+
+def search_users(queryset, term):
+    """
+    Filter a ``Users`` queryset by ``term``.
+
+    Returns ``(queryset, ranked)``; when ``ranked`` is true the queryset carries
+    a ``search_rank`` annotation (bm25, lower is better).
+    """
+    match = build_match_query(term)
+    if match is None or not USER_INDEX.available(queryset.db):
+        return queryset.filter(icontains_filter(term)), False
+
+    # Join the index on rowid so FTS5 evaluates MATCH and bm25 once per hit
+    queryset = USER_INDEX.join(queryset, match).extra(select={'search_rank': f'{FTS_TABLE}.rank'})
+    return queryset, True
+
+
+def user_search_filter(term, prefix='', alias='default'):
+    """
+    ``Q`` matching users (reached through ``prefix``, e.g. ``'user__'``) by
+    ``term`` as ``search_users`` does, unranked, so it can be combined with
+    other conditions.
+    """
+    match = build_match_query(term)
+    if match is None or not USER_INDEX.available(alias):
+        return icontains_filter(term, prefix)
+    return Q(**{f'{prefix}pk__in': USER_INDEX.matching_ids(match)})
+
+
+def search_doctors(queryset, term):
+    """
+    Filter a ``Doctor`` queryset by ``term`` in clinic names and bios.
+
+    Returns ``(queryset, ranked)`` like ``search_users``. The ``search_rank``
+    annotation can also be filtered on, which keyset pagination needs.
+    """
+    match = build_prefix_query(term)
+    if match is None:
+        return queryset, False
+    if not DOCTOR_INDEX.available(queryset.db):
+        words = term.split()
+        for word in words:
+            queryset = queryset.filter(Q(clinic_name__icontains=word) | Q(bio__icontains=word))
+        return queryset, False
+
+    weights = ', '.join(str(weight) for weight in DOCTOR_WEIGHTS)
+    rank = RawSQL(f'bm25({DOCTOR_INDEX.fts_table}, {weights})', ())
+    return DOCTOR_INDEX.join(queryset, match).annotate(search_rank=rank), True
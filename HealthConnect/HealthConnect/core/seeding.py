@@ -0,0 +1,63 @@
+"""
+Synthetic accounts for ``manage.py seed`` and the benchmarks.
+
+Plain data and generators, with no model imports, so the benchmarks can use
+them before Django is set up.
+"""
+import random
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya',
+               'John', 'Maria', 'Wei', 'Fatima', 'Liam', 'Olivia', 'Noah', 'Emma']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Reddy', 'Khan', 'Gupta', 'Nair', 'Das',
+              'Smith', 'Garcia', 'Chen', 'Ali', 'Brown', 'Jones', 'Miller', 'Wilson']
+CITIES = [('Mumbai', 'Maharashtra', '400001'), ('Pune', 'Maharashtra', '411001'),
+          ('Delhi', 'Delhi', '110001'), ('Bengaluru', 'Karnataka', '560001'),
+          ('Chennai', 'Tamil Nadu', '600001'), ('Kolkata', 'West Bengal', '700001'),
+          ('Hyderabad', 'Telangana', '500001'), ('Jaipur', 'Rajasthan', '302001')]
+CENTRES = {
+    'Mumbai': (19.0760, 72.8777), 'Pune': (18.5204, 73.8567), 'Delhi': (28.6139, 77.2090),
+    'Bengaluru': (12.9716, 77.5946), 'Chennai': (13.0827, 80.2707), 'Kolkata': (22.5726, 88.3639),
+    'Hyderabad': (17.3850, 78.4867), 'Jaipur': (26.9124, 75.7873),
+}
+PINCODES_PER_CITY = 200
+# Clinic names and doctor bios are made of these
+WORDS = ['heart', 'skin', 'child', 'sports', 'injury', 'diabetes', 'allergy', 'migraine', 'spine',
+         'surgery', 'care', 'family', 'women', 'elderly', 'clinic', 'hospital', 'consultation',
+         'therapy', 'rehabilitation', 'screening', 'vaccination', 'nutrition', 'sleep', 'stroke']
+CLINICS = ['City', 'Sunrise', 'Lotus', 'Apollo', 'Green Valley', 'Metro', 'Care Plus', 'Lifeline']
+
+
+def fake_user_fields(count, start=0, seed=0):
+    """Yield field dicts (no password) of users with plausible names, unique by number."""
+    rng = random.Random(seed + start)
+    for i in range(start, start + count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        city, state, pincode = rng.choice(CITIES)
+        yield {
+            'username': f'{first.lower()}.{last.lower()}{i}',
+            'email': f'{first.lower()}.{last.lower()}{i}@example.com',
+            'first_name': first, 'last_name': last,
+            'user_type': 'doctor' if i % 10 == 0 else 'patient',
+            'city': city, 'state': state, 'pincode': pincode,
+        }
+
+
+def fake_pincodes(rng):
+    """``{city: [(pincode, latitude, longitude), ...]}``, scattered within ~30 km of each city centre"""
+    by_city = {}
+    for city, state, pincode in CITIES:
+        latitude, longitude = CENTRES[city]
+        by_city[city] = [
+            (f'{pincode[:3]}{i:03d}', latitude + rng.uniform(-0.3, 0.3), longitude + rng.uniform(-0.3, 0.3))
+            for i in range(1, PINCODES_PER_CITY + 1)
+        ]
+    return by_city
+
+
+def fake_clinic_name(rng):
+    return f'{rng.choice(CLINICS)} {rng.choice(WORDS).title()} Clinic'
+
+
+def fake_bio(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
@@ -1,31 +1,106 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .images import current_variants, needs_processing
 from .models import Patient, Doctor
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def account_user_fields(validated_data):
+    """Users model fields taken from a validated signup payload"""
+    return dict(
+        username=validated_data['username'],
+        email=validated_data['email'],
+        first_name=validated_data['first_name'],
+        last_name=validated_data['last_name'],
+        profile_picture=validated_data.get('profile_picture'),
+        address_line1=validated_data.get('address_line1'),
+        city=validated_data.get('city'),
+        state=validated_data.get('state'),
+        pincode=validated_data.get('pincode'),
+    )
+
+
+def create_account_user(validated_data, **extra_fields):
+    """
+    Create the Users row for a signup. If the caller already hashed the
+    password (``save(password_hash=...)``), that hash is stored as-is.
+    """
+    password_hash = validated_data.pop('password_hash', None)
+    fields = dict(account_user_fields(validated_data), **extra_fields)
+    if password_hash is not None:
+        return User.objects.create_user_with_hash(password_hash=password_hash, **fields)
+    return User.objects.create_user(password=validated_data['password'], **fields)
+
+
+def trim_fields(serializer, fieldset):
+    for name in list(serializer.fields):
+        if name not in fieldset:
+            serializer.fields.pop(name)
+        elif fieldset[name] is not None:
+            trim_fields(serializer.fields[name], fieldset[name])
+
+
+class SparseFieldsMixin:
+    """
+    ``fieldset=`` (see core.fieldsets) keeps only the selected fields, nested
+    ones included. For rendering only: a trimmed serializer would ignore
+    input for the fields it dropped.
+    """
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fieldset is not None:
+            trim_fields(self, fieldset)
+
+
+class ProfilePictureField(serializers.ImageField):
+    """Takes uploads; renders null until core.images has re-encoded the upload"""
+
+    def to_representation(self, value):
+        if value and needs_processing(value.instance):
+            return None
+        return super().to_representation(value)
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    profile_picture = ProfilePictureField(required=False, allow_null=True)
     profile_picture_url = serializers.SerializerMethodField()
+    profile_picture_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile_picture', 
-                  'profile_picture_url', 'user_type', 'address_line1', 'city', 'state', 
-                  'pincode', 'date_joined']
-        read_only_fields = ['date_joined', 'profile_picture_url']
-        extra_kwargs = {'profile_picture': {'required': False, 'allow_null': True}}
+                  'profile_picture_url', 'profile_picture_variants', 'user_type', 'address_line1',
+                  'city', 'state', 'pincode', 'date_joined']
+        read_only_fields = ['date_joined', 'profile_picture_url', 'profile_picture_variants']
     
     def get_profile_picture_url(self, obj):
-        if obj.profile_picture:
+        """The largest JPEG variant; null while the upload is being processed"""
+        if obj.profile_picture and not needs_processing(obj):
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(obj.profile_picture.url)
             return obj.profile_picture.url
         return None
 
+    def get_profile_picture_variants(self, obj):
+        """``{variant: {'webp': url, 'jpeg': url}}``; null until processing has finished"""
+        sizes = current_variants(obj)
+        if sizes is None:
+            return None
+        storage = obj.profile_picture.storage
+        request = self.context.get('request')
+        urls = {}
+        for name, paths in sizes.items():
+            urls[name] = {}
+            for fmt, path in paths.items():
+                url = storage.url(path)
+                urls[name][fmt] = request.build_absolute_uri(url) if request else url
+        return urls
 
-class PatientSerializer(serializers.ModelSerializer):
+
+class PatientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
@@ -58,40 +133,25 @@ class PatientCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError({"confirm_password": "Passwords do not match."})
         return attrs
     
-    def create(self, validated_data):
-        # Remove confirm_password from validated_data as it's not stored
-        validated_data.pop('confirm_password', None)
-        profile_picture = validated_data.pop('profile_picture', None)
-        address_line1 = validated_data.pop('address_line1', None)
-        city = validated_data.pop('city', None)
-        state = validated_data.pop('state', None)
-        pincode = validated_data.pop('pincode', None)
-        
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
-            first_name=validated_data['first_name'],
-            last_name=validated_data['last_name'],
-            user_type='patient',
-            profile_picture=profile_picture,
-            address_line1=address_line1,
-            city=city,
-            state=state,
-            pincode=pincode
-        )
-        patient = Patient.objects.create(
-            user=user,
+    def profile_fields(self, validated_data):
+        """Patient model fields taken from the validated payload"""
+        return dict(
             phone_number=validated_data.get('phone_number', ''),
             date_of_birth=validated_data.get('date_of_birth'),
             medical_history=validated_data.get('medical_history', ''),
             allergies=validated_data.get('allergies', ''),
             emergency_contact=validated_data.get('emergency_contact', '')
         )
+    
+    def create(self, validated_data):
+        # Remove confirm_password from validated_data as it's not stored
+        validated_data.pop('confirm_password', None)
+        user = create_account_user(validated_data, user_type='patient')
+        patient = Patient.objects.create(user=user, **self.profile_fields(validated_data))
         return patient
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
@@ -127,30 +187,9 @@ class DoctorCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError({"confirm_password": "Passwords do not match."})
         return attrs
     
-    def create(self, validated_data):
-        # Remove confirm_password from validated_data as it's not stored
-        validated_data.pop('confirm_password', None)
-        profile_picture = validated_data.pop('profile_picture', None)
-        address_line1 = validated_data.pop('address_line1', None)
-        city = validated_data.pop('city', None)
-        state = validated_data.pop('state', None)
-        pincode = validated_data.pop('pincode', None)
-        
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
-            first_name=validated_data['first_name'],
-            last_name=validated_data['last_name'],
-            user_type='doctor',
-            profile_picture=profile_picture,
-            address_line1=address_line1,
-            city=city,
-            state=state,
-            pincode=pincode
-        )
-        doctor = Doctor.objects.create(
-            user=user,
+    def profile_fields(self, validated_data):
+        """Doctor model fields taken from the validated payload"""
+        return dict(
             license_number=validated_data['license_number'],
             specialization=validated_data['specialization'],
             phone_number=validated_data.get('phone_number', ''),
@@ -159,4 +198,10 @@ class DoctorCreateSerializer(serializers.Serializer):
             experience_years=validated_data.get('experience_years', 0),
             bio=validated_data.get('bio', '')
         )
+    
+    def create(self, validated_data):
+        # Remove confirm_password from validated_data as it's not stored
+        validated_data.pop('confirm_password', None)
+        user = create_account_user(validated_data, user_type='doctor')
+        doctor = Doctor.objects.create(user=user, **self.profile_fields(validated_data))
         return doctor
\ No newline at end of file
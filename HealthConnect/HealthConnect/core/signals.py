@@ -0,0 +1,129 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .availability import account_names
+from .cache import verified_doctors_cache
+from .counts import row_counts
+from .doctor_search import DOCTOR_FACETS
+from .images import discard_picture, needs_processing, schedule_processing
+from .models import Doctor, Patient, Users
+from .proximity import doctor_locations
+from .search import ensure_search_triggers
+
+# Users fields written on every login; they never show up in the directory
+AUTH_ONLY_FIELDS = {'last_login', 'password'}
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    """Restore the search and facet triggers after migrations that rebuild their tables"""
+    ensure_search_triggers(connections[using])
+    DOCTOR_FACETS.ensure_triggers(connections[using])
+
+
+def invalidate_directory(using):
+    verified_doctors_cache.invalidate()
+    # Again once committed: requests rendering before then saw the old rows
+    transaction.on_commit(verified_doctors_cache.invalidate, using=using)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def invalidate_directory_for_doctor(sender, instance, using=None, **kwargs):
+    invalidate_directory(using)
+
+
+@receiver(post_save, sender=Users)
+@receiver(post_delete, sender=Users)
+def invalidate_directory_for_user(sender, instance, using=None, update_fields=None, **kwargs):
+    if instance.user_type != 'doctor':
+        return
+    if update_fields and set(update_fields) <= AUTH_ONLY_FIELDS:
+        return
+    invalidate_directory(using)
+
+
+@receiver(post_save, sender=Users)
+@receiver(post_delete, sender=Users)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def invalidate_row_counts(sender, instance, using=None, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= AUTH_ONLY_FIELDS:
+        return
+    row_counts.invalidate(sender)
+    # Again once committed: other connections counting before then saw the old rows
+    transaction.on_commit(lambda: row_counts.invalidate(sender), using=using)
+
+
+@receiver(post_save, sender=Doctor)
+def relocate_doctor(sender, instance, raw=False, using=None, **kwargs):
+    if not raw and doctor_locations.tracking:
+        doctor_id = instance.pk
+        transaction.on_commit(lambda: doctor_locations.refresh(pk=doctor_id), using=using)
+
+
+@receiver(post_delete, sender=Doctor)
+def unlocate_doctor(sender, instance, using=None, **kwargs):
+    if doctor_locations.tracking:
+        doctor_id = instance.pk
+        transaction.on_commit(lambda: doctor_locations.remove(doctor_id), using=using)
+
+
+@receiver(post_save, sender=Users)
+def relocate_doctor_user(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # A doctor's pincode lives on the user row
+    if raw or instance.user_type != 'doctor' or not doctor_locations.tracking:
+        return
+    if update_fields and set(update_fields) <= AUTH_ONLY_FIELDS:
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: doctor_locations.refresh(user_id=user_id), using=using)
+
+
+@receiver(post_save, sender=Users)
+def record_account_names(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= AUTH_ONLY_FIELDS):
+        return
+    # Added right away: a rolled-back signup only leaves a false positive
+    account_names.add(instance, created=created)
+
+
+@receiver(post_delete, sender=Users)
+def forget_account_names(sender, instance, using=None, **kwargs):
+    username, email = instance.username, instance.email
+    # Only once committed: removing early would wrongly free a name
+    transaction.on_commit(lambda: account_names.remove(username, email), using=using)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, using=None, **kwargs):
+    key = instance.key
+    token_cache.evict_key(key)
+    # Again once committed: a load before then read the token as it was
+    transaction.on_commit(lambda: token_cache.evict_key(key), using=using)
+
+
+@receiver(post_save, sender=Users)
+@receiver(post_delete, sender=Users)
+def evict_user_tokens(sender, instance, using=None, **kwargs):
+    user_id = instance.pk
+    token_cache.evict_user(user_id)
+    # Again once committed: a load before then read the old row
+    transaction.on_commit(lambda: token_cache.evict_user(user_id), using=using)
+
+
+@receiver(post_save, sender=Users)
+def process_profile_picture(sender, instance, raw=False, using=None, **kwargs):
+    if not raw and needs_processing(instance):
+        schedule_processing(instance, using=using)
+
+
+@receiver(post_delete, sender=Users)
+def discard_profile_picture(sender, instance, using=None, **kwargs):
+    variants = instance.profile_picture_variants
+    if variants:
+        transaction.on_commit(lambda: discard_picture(variants), using=using)
@@ -0,0 +1,142 @@
+"""
+Property-based tests: the fast serializer, renderer and parser paths must
+match DRF's output for any input. They need hypothesis, a test-only
+dependency; without it this module is skipped.
+"""
+import datetime
+import io
+import json
+import unittest
+from unittest import mock
+
+from django.utils.translation import gettext_lazy
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+try:
+    from hypothesis import given, settings as hypothesis_settings, strategies as st
+    from hypothesis.extra.django import TestCase as HypothesisTestCase
+except ImportError:
+    raise unittest.SkipTest('hypothesis is not installed')
+
+from .fast_serializers import DOCTOR_SERIALIZER, PATIENT_SERIALIZER, USER_SERIALIZER
+from .models import Doctor, Patient, Users
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .serializers import DoctorSerializer, PatientSerializer, UserSerializer
+
+
+text = st.text(st.characters(blacklist_categories=('Cs',), blacklist_characters='\x00'), max_size=12)
+file_names = st.text('abcXYZ09 _-.%#?&+:;~\\/é', min_size=1, max_size=16).map(lambda n: f'profile_pictures/{n}')
+aware_datetimes = st.datetimes(
+    min_value=datetime.datetime(1970, 1, 2), max_value=datetime.datetime(2100, 1, 1),
+    timezones=st.just(datetime.timezone.utc),
+)
+
+
+@st.composite
+def pictures(draw):
+    """(profile_picture, profile_picture_variants) in every processing state"""
+    picture = draw(st.none() | st.just('') | file_names)
+    sizes = draw(st.dictionaries(st.sampled_from(['large', 'thumb']),
+                                 st.dictionaries(st.sampled_from(['webp', 'jpeg']), file_names, min_size=1),
+                                 min_size=1))
+    owner = draw(st.sampled_from([picture, 'profile_pictures/other.jpg']))
+    variants = draw(st.none() | st.just({'picture': owner, 'sha256': 'ab', 'sizes': sizes}))
+    return picture, variants
+
+
+account = st.fixed_dictionaries({
+    'first_name': text, 'last_name': text, 'user_type': st.sampled_from(['patient', 'doctor']),
+    'address_line1': st.none() | text, 'city': st.none() | text, 'state': st.none() | text,
+    'pincode': st.none() | text, 'picture': pictures(), 'date_joined': aware_datetimes,
+    'medical_history': st.none() | text, 'allergies': st.none() | text, 'emergency_contact': text,
+    'phone_number': text, 'date_of_birth': st.none() | st.dates(),
+    'specialization': st.sampled_from([c[0] for c in Doctor.SPECIALIZATION_CHOICES]),
+    'clinic_address': text, 'bio': text, 'experience_years': st.integers(-2 ** 31, 2 ** 31 - 1),
+    'is_verified': st.booleans(), 'updated_at': aware_datetimes,
+})
+
+
+class FastSerializerTests(HypothesisTestCase):
+    """The values_list() fast path must render the same bytes as the DRF serializers"""
+
+    def create(self, index, data):
+        picture, variants = data['picture']
+        user = Users.objects.create(
+            username=f'fast{index}', email=f'fast{index}@example.com', first_name=data['first_name'],
+            last_name=data['last_name'], user_type=data['user_type'], address_line1=data['address_line1'],
+            city=data['city'], state=data['state'], pincode=data['pincode'],
+            profile_picture=picture, profile_picture_variants=variants,
+        )
+        Users.objects.filter(pk=user.pk).update(date_joined=data['date_joined'])
+        if data['user_type'] == 'doctor':
+            profile = Doctor.objects.create(
+                user=user, license_number=f'LIC-{index}', specialization=data['specialization'],
+                phone_number=data['phone_number'], clinic_address=data['clinic_address'], bio=data['bio'],
+                experience_years=data['experience_years'], is_verified=data['is_verified'],
+            )
+        else:
+            profile = Patient.objects.create(
+                user=user, medical_history=data['medical_history'], allergies=data['allergies'],
+                emergency_contact=data['emergency_contact'], phone_number=data['phone_number'],
+                date_of_birth=data['date_of_birth'],
+            )
+        type(profile).objects.filter(pk=profile.pk).update(updated_at=data['updated_at'])
+
+    def assertSameBytes(self, serializer_class, fast, queryset):
+        renderer = JSONRenderer()
+        for request in (None, Request(APIRequestFactory().get('/', HTTP_HOST='testserver:8443'))):
+            context = {'request': request} if request is not None else {}
+            expected = renderer.render(serializer_class(queryset, many=True, context=context).data)
+            self.assertEqual(renderer.render(fast.many(fast.rows(queryset), request)), expected)
+
+    @hypothesis_settings(max_examples=40, deadline=None)
+    @given(st.lists(account, min_size=1, max_size=4))
+    def test_matches_drf_serializers(self, accounts):
+        with mock.patch('core.signals.schedule_processing'):
+            for index, data in enumerate(accounts):
+                self.create(index, data)
+        self.assertSameBytes(UserSerializer, USER_SERIALIZER, Users.objects.order_by('id'))
+        self.assertSameBytes(PatientSerializer, PATIENT_SERIALIZER,
+                             Patient.objects.select_related('user').order_by('id'))
+        self.assertSameBytes(DoctorSerializer, DOCTOR_SERIALIZER,
+                             Doctor.objects.select_related('user').order_by('id'))
+
+
+# Everything the API hands to the renderer. Floats are limited to the range
+# where the stdlib and orjson spell them the same way (no exponent).
+json_scalars = (
+    st.none() | st.booleans() | st.integers(-2 ** 63, 2 ** 64 - 1) | text
+    | st.sampled_from(['\u2028', 'line\u2029break', '\x1f\x7f', 'é😀'])
+    | st.floats(min_value=1e-4, max_value=1e15) | st.just(0.0)
+    | st.decimals(min_value=-10 ** 6, max_value=10 ** 6, places=2)
+    | st.datetimes(timezones=st.none() | st.just(datetime.timezone.utc)) | st.dates()
+    | st.uuids() | st.just(gettext_lazy('Patients'))
+)
+json_values = st.recursive(
+    json_scalars,
+    lambda children: st.lists(children, max_size=4) | st.tuples(children, children)
+    | st.dictionaries(st.text(max_size=5), children, max_size=4),
+    max_leaves=20,
+)
+json_documents = st.recursive(
+    st.none() | st.booleans() | st.integers() | text,
+    lambda children: st.lists(children, max_size=4) | st.dictionaries(text, children, max_size=4),
+    max_leaves=20,
+)
+
+
+class FastJSONPropertyTests(HypothesisTestCase):
+    @hypothesis_settings(max_examples=300, deadline=None)
+    @given(json_values)
+    def test_renderer_matches_drf(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    @hypothesis_settings(max_examples=300, deadline=None)
+    @given(json_documents)
+    def test_parser_matches_drf(self, data):
+        body = json.dumps(data).encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
@@ -1,3 +1,1732 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import urls as core_urls
+from .authentication import token_cache
+from .availability import CountingBloomFilter, account_names
+from .cache import verified_doctors_cache
+from .doctor_search import DOCTOR_FACETS, _grouped_matches
+from .fast_serializers import PATIENT_SERIALIZER
+from .fieldsets import parse_fieldset
+from .hashing import get_hashing_pool, reset_hashing_pool
+from .images import (
+    CONTENT_PREFIX, ORIGINALS_PREFIX, VARIANTS, process_profile_picture, render_variants, variant_paths
+)
+from .models import Doctor, Patient, Pincode, Users
+from .parsers import FastJSONParser
+from .proximity import doctor_locations, haversine_km
+from .renderers import FastJSONRenderer
+from .replicas import replicate
+from .search import search_users
+from .throttling import throttle_buckets
+
+
+def make_user(username, user_type='patient', **extra):
+    return Users.objects.create_user(
+        email=extra.pop('email', f'{username}@example.com'), username=username,
+        first_name=extra.pop('first_name', username.title()),
+        last_name=extra.pop('last_name', 'Tester'),
+        user_type=user_type, **extra
+    )
+
+
+def make_patient(username, **extra):
+    return Patient.objects.create(user=make_user(username), **extra)
+
+
+def make_doctor(username, is_verified=True, **extra):
+    extra.setdefault('license_number', f'LIC-{username}')
+    extra.setdefault('specialization', 'general')
+    return Doctor.objects.create(
+        user=make_user(username, user_type='doctor'), is_verified=is_verified, **extra
+    )
+
+
+def route_names(patterns):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class QueryBudgetMixin:
+    """
+    Assert that an endpoint stays within a fixed number of SQL statements.
+
+    ``assertQueryBudget`` runs the request, lets ``grow`` add more rows, then
+    runs it again: both runs must fit the budget and issue the same number of
+    queries, so per-row (N+1) queries fail even when the budget is generous.
+    """
+
+    def count_queries(self, request):
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+        return len(ctx.captured_queries), ctx.captured_queries
+
+    def assertQueryBudget(self, request, budget, grow=None):
+        before, queries = self.count_queries(request)
+        self.assertLessEqual(
+            before, budget,
+            'Query budget exceeded:\n' + '\n'.join(q['sql'] for q in queries)
+        )
+        if grow is None:
+            return
+        grow()
+        after, queries = self.count_queries(request)
+        self.assertEqual(
+            before, after,
+            'Query count grows with data:\n' + '\n'.join(q['sql'] for q in queries)
+        )
+
+
+class UserCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc', user_type='doctor')
+        for i in range(24):
+            make_user(f'patient{i:02d}')
+        # Force timestamp ties so the id tiebreaker is exercised
+        Users.objects.filter(username__startswith='patient1').update(date_joined=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['username'] for row in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_walks_every_row_once_in_order(self):
+        seen = self.walk('/api/users/?cursor=&page_size=5')
+        expected = list(Users.objects.order_by('-date_joined', '-id').values_list('username', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_prior_page(self):
+        first = self.client.get('/api/users/?cursor=&page_size=7').data
+        second = self.client.get(first['next']).data
+        self.assertNotIn('count', second)
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_filters_count_and_page_size_cap(self):
+        response = self.client.get('/api/users/?cursor=&user_type=patient&search=patient0&with_count=1&page_size=1000')
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/users/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class CachedCountPaginationTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor('doc')
+        for i in range(12):
+            make_patient(f'patient{i:02d}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_count_is_cached_until_a_write(self):
+        data, queries = self.get('/api/patients/')
+        self.assertEqual((data['count'], data['count_exact'], queries), (12, True, 2))
+        data, queries = self.get('/api/patients/?page=2')
+        self.assertEqual((data['count'], len(data['results']), queries), (12, 2, 1))
+        make_patient('patient12')
+        data, queries = self.get('/api/patients/?page=2')
+        self.assertEqual((data['count'], len(data['results']), queries), (13, 3, 2))
+        # Logins leave counts alone; a profile update can change a filtered one
+        self.get('/api/doctors/')
+        self.doctor.user.save(update_fields=['last_login'])
+        self.assertEqual(self.get('/api/doctors/')[1], 1)
+        self.doctor.save()
+        self.assertEqual(self.get('/api/doctors/')[1], 2)
+
+    def test_filters_are_counted_separately(self):
+        self.assertEqual(self.get('/api/users/?user_type=patient')[0]['count'], 12)
+        self.assertEqual(self.get('/api/users/?user_type=doctor')[0]['count'], 1)
+        data, queries = self.get('/api/users/?user_type=doctor')
+        self.assertEqual((data['count'], queries), (1, 1))
+        self.assertEqual(self.get('/api/users/')[0]['count'], 13)
+
+    @override_settings(ROW_COUNTS={'EXACT_LIMIT': 5})
+    def test_expensive_counts_are_approximate(self):
+        data, _ = self.get('/api/users/?user_type=patient')
+        self.assertEqual((data['count'], data['count_exact']), (5, False))
+        # Pages aren't bounded by the count: the last one is found by looking ahead
+        data, _ = self.get(data['next'])
+        self.assertEqual((len(data['results']), data['next']), (2, None))
+        data, _ = self.get('/api/users/?user_type=patient&page=3')
+        self.assertEqual((data['results'], data['next']), ([], None))
+        self.assertIn('page=2', data['previous'])
+        data, _ = self.get('/api/patients/')
+        self.assertEqual((data['count'], data['count_exact']), (12, False))
+        self.assertEqual(self.client.get('/api/patients/?page=3').status_code, 404)
+
+    def test_user_list_is_empty_past_the_last_page(self):
+        data, _ = self.get('/api/users/?user_type=doctor&page=5')
+        self.assertEqual((data['count'], data['results'], data['next']), (1, [], None))
+        self.assertIn('page=4', data['previous'])
+        self.assertEqual(self.client.get('/api/users/?page=0').status_code, 404)
+        self.assertEqual(self.client.get('/api/patients/?page=5').status_code, 404)
+
+
+class UserSearchIndexTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc', user_type='doctor')
+        self.smith = make_user('jsmith', first_name='John', last_name='Smith')
+        self.smythe = make_user('asmythe', first_name='Anna', last_name='Smythe')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def search(self, term):
+        response = self.client.get('/api/users/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [row['username'] for row in response.data['results']]
+
+    def test_substring_match_across_columns(self):
+        self.assertEqual(self.search('mit'), ['jsmith'])
+        self.assertEqual(self.search('john smi'), ['jsmith'])
+        self.assertCountEqual(self.search('EXAMPLE.COM'), ['asmythe', 'jsmith', 'doc'])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.smith.last_name = 'Jones'
+        self.smith.save()
+        self.assertEqual(self.search('smith'), ['jsmith'])  # username still matches
+        self.assertEqual(self.search('jones'), ['jsmith'])
+        Users.objects.filter(pk=self.smythe.pk).update(first_name='Zelda')
+        self.assertEqual(self.search('zelda'), ['asmythe'])
+        self.smythe.delete()
+        self.assertEqual(self.search('zelda'), [])
+
+    def test_short_terms_fall_back_to_icontains(self):
+        self.assertEqual(self.search('sm'), ['asmythe', 'jsmith'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every route in core/urls.py must declare a query budget here."""
+
+    # route name -> maximum number of queries
+    BUDGETS = {
+        'api-root': 0,
+        'user-list': 3,
+        'user-current-user': 1,
+        'user-me': 1,
+        'user-batch': 2,
+        'patient-list': 3,
+        'patient-detail': 2,
+        'patient-my-profile': 2,
+        # Token, locked read, update, and the savepoint pair the test's transaction turns atomic() into
+        'patient-update-profile': 5,
+        'patient-batch': 2,
+        'doctor-list': 3,
+        'doctor-detail': 2,
+        'doctor-my-profile': 2,
+        'doctor-update-profile': 5,
+        'doctor-batch': 2,
+        'doctor-verified-doctors': 3,
+        'doctor-search': 3,
+        'doctor-nearby': 3,
+        'doctor-directory-cache-stats': 1,
+        'patient-export': 2,
+        'doctor-export': 2,
+        'signup': 6,
+        'signup-availability': 1,
+        'login': 2,
+        'async-signup': 8,
+        'async-login': 2,
+        'throttle-stats': 1,
+    }
+
+    def setUp(self):
+        self.patient = make_patient('patient0')
+        self.doctor = make_doctor('doctor0')
+        self.doctor.user.set_password('secret-pass')
+        self.doctor.user.save()
+        self.staff = make_user('staff0', is_staff=True)
+        self.tokens = {
+            user.pk: Token.objects.create(user=user).key
+            for user in (self.patient.user, self.doctor.user, self.staff)
+        }
+        self.client = APIClient()
+        self.counter = 1
+        # Built at startup in a server process
+        account_names.build()
+        self.addCleanup(account_names.clear)
+        throttle_buckets.clear()
+
+    def grow(self, rows=15):
+        for _ in range(rows):
+            make_patient(f'patient{self.counter}')
+            make_doctor(f'doctor{self.counter}')
+            self.counter += 1
+
+    def authenticate(self, user):
+        # A real token, so the budget includes the authentication query
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[user.pk]}')
+
+    def as_doctor(self):
+        self.authenticate(self.doctor.user)
+
+    def as_patient(self):
+        self.authenticate(self.patient.user)
+
+    def as_staff(self):
+        self.authenticate(self.staff)
+
+    def requests(self):
+        get = self.client.get
+        # Ids that grow() fills in, so the second run returns more rows
+        ids = ','.join(map(str, range(1, 41)))
+        return {
+            'api-root': (None, lambda: get('/api/')),
+            'user-list': (self.as_doctor, lambda: get('/api/users/')),
+            'user-current-user': (self.as_patient, lambda: get('/api/users/current_user/')),
+            'user-me': (self.as_patient, lambda: get('/api/users/me/')),
+            'user-batch': (self.as_doctor, lambda: get(f'/api/users/batch/?ids={ids}')),
+            'patient-list': (self.as_doctor, lambda: get('/api/patients/')),
+            'patient-detail': (self.as_doctor, lambda: get(f'/api/patients/{self.patient.pk}/')),
+            'patient-my-profile': (self.as_patient, lambda: get('/api/patients/my_profile/')),
+            'patient-update-profile': (self.as_patient, lambda: self.client.patch(
+                '/api/patients/update_profile/', {'allergies': 'Pollen'}, format='json')),
+            'patient-batch': (self.as_doctor, lambda: get(f'/api/patients/batch/?ids={ids}')),
+            'doctor-list': (self.as_patient, lambda: get('/api/doctors/')),
+            'doctor-detail': (self.as_patient, lambda: get(f'/api/doctors/{self.doctor.pk}/')),
+            'doctor-my-profile': (self.as_doctor, lambda: get('/api/doctors/my_profile/')),
+            'doctor-update-profile': (self.as_doctor, lambda: self.client.patch(
+                '/api/doctors/update_profile/', {'bio': 'Updated'}, format='json')),
+            'doctor-batch': (self.as_patient, lambda: get(f'/api/doctors/batch/?ids={ids}')),
+            'doctor-verified-doctors': (self.as_patient, lambda: get('/api/doctors/verified_doctors/')),
+            'doctor-search': (self.as_patient, lambda: get('/api/doctors/search/?q=clinic&city=pune')),
+            'doctor-nearby': (self.nearby_patient, lambda: get('/api/doctors/nearby/?pincode=411001')),
+            'doctor-directory-cache-stats': (self.as_staff, lambda: get('/api/doctors/directory_cache_stats/')),
+            'patient-export': (self.as_staff, lambda: self.consume(get('/api/patients/export/'))),
+            'doctor-export': (self.as_staff, lambda: self.consume(get('/api/doctors/export/?export_format=csv'))),
+            'signup': (None, lambda: self.signup('/api/signup/')),
+            'signup-availability': (None, lambda: get('/api/signup/availability/?username=doctor0&email=a@b.co')),
+            'login': (None, lambda: self.client.post(
+                '/api/login/', {'username': 'doctor0', 'password': 'secret-pass'}, format='json')),
+            'async-signup': (None, lambda: self.signup('/api/async/signup/')),
+            'async-login': (None, lambda: self.client.post(
+                '/api/async/login/', {'username': 'doctor0', 'password': 'secret-pass'}, format='json')),
+            'throttle-stats': (self.as_staff, lambda: get('/api/throttle/stats/')),
+        }
+
+    def nearby_patient(self):
+        # Steady state: the grid is built once per process, then kept current
+        Pincode.objects.get_or_create(pincode='411001', defaults={'latitude': 18.52, 'longitude': 73.86})
+        Users.objects.filter(pk=self.doctor.user_id).update(pincode='411001')
+        doctor_locations.build()
+        self.addCleanup(doctor_locations.clear)
+        self.as_patient()
+
+    def consume(self, response):
+        # Streaming responses only query the database while being read
+        b''.join(response.streaming_content)
+        return response
+
+    def signup(self, url):
+        self.counter += 1
+        return self.client.post(url, {
+            'username': f'new{self.counter}', 'email': f'new{self.counter}@example.com',
+            'password': 'secret-pass', 'first_name': 'New', 'last_name': 'Patient',
+            'user_type': 'patient',
+        }, format='json')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(set(self.BUDGETS), route_names(core_urls.urlpatterns))
+
+    def test_every_budget_is_exercised(self):
+        self.assertEqual(set(self.requests()), set(self.BUDGETS))
+
+    def test_routes_stay_within_budget(self):
+        for name, (authenticate, request) in self.requests().items():
+            with self.subTest(route=name):
+                self.client.credentials()
+                if authenticate:
+                    authenticate()
+
+                def cold(request=request):
+                    # Budget the token cache miss every worker pays first
+                    token_cache.clear()
+                    return request()
+
+                self.assertQueryBudget(cold, self.BUDGETS[name], grow=self.grow)
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.patients = [make_patient(f'patient{i}') for i in range(3)]
+        self.doctors = [make_doctor(f'doctor{i}') for i in range(4)]
+        self.staff = make_user('staff', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctors[0].user)
+
+    def test_read_keeps_order_and_reports_missing(self):
+        ids = [self.patients[2].pk, 999, self.patients[0].pk, self.patients[2].pk]
+        response = self.client.get('/api/patients/batch/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.patients[2].pk, self.patients[0].pk])
+        self.assertEqual(response.data['missing'], [999])
+        single = self.client.get(f'/api/patients/{self.patients[0].pk}/').data
+        self.assertEqual(json.loads(json.dumps(response.data['results'][1])), json.loads(json.dumps(single)))
+        response = self.client.get('/api/users/batch/', {'ids': f'{self.doctors[1].user.pk}'})
+        self.assertEqual(response.data['results'][0]['username'], 'doctor1')
+
+    def test_read_rejects_bad_ids_and_big_batches(self):
+        for ids in ('', '1,x', '0'):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.client.get('/api/doctors/batch/', {'ids': ids}).status_code, 400)
+        with override_settings(BATCH_REQUESTS={'MAX_ITEMS': 2}):
+            response = self.client.get('/api/doctors/batch/', {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 2', response.data['error'])
+
+    def test_users_batch_is_for_doctors(self):
+        self.client.force_authenticate(self.patients[0].user)
+        self.assertEqual(self.client.get('/api/users/batch/', {'ids': '1'}).status_code, 403)
+
+    def test_updates_are_for_staff(self):
+        items = [{'id': self.patients[0].pk, 'allergies': 'Changed'}]
+        for user in (self.doctors[0].user, self.patients[0].user):
+            self.client.force_authenticate(user)
+            self.assertEqual(self.client.patch('/api/patients/batch/', items, format='json').status_code, 403)
+            self.assertEqual(self.client.patch('/api/doctors/batch/', [{'id': self.doctors[1].pk, 'bio': 'x'}],
+                                               format='json').status_code, 403)
+        self.patients[0].refresh_from_db()
+        self.assertNotEqual(self.patients[0].allergies, 'Changed')
+
+    def test_update_reports_each_item(self):
+        first, second, third, fourth = self.doctors
+        self.client.force_authenticate(self.staff)
+        response = self.client.patch('/api/doctors/batch/', [
+            {'id': first.pk, 'bio': 'Updated', 'is_verified': False},
+            {'id': second.pk, 'experience_years': 'many'},
+            {'id': 999, 'bio': 'Nobody'},
+            {'bio': 'No id'},
+            {'id': third.pk, 'license_number': 'LIC-NEW'},
+            {'id': fourth.pk, 'license_number': 'LIC-NEW'},
+            {'id': first.pk, 'bio': 'Twice'},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.data['results']], [200, 400, 404, 400, 200, 409, 400])
+        self.assertEqual(response.data['results'][0]['data']['bio'], 'Updated')
+        self.assertIn('experience_years', response.data['results'][1]['errors'])
+        for doctor in self.doctors:
+            doctor.refresh_from_db()
+        self.assertEqual((first.bio, first.is_verified), ('Updated', True))
+        self.assertEqual(second.experience_years, 0)
+        self.assertEqual((third.license_number, fourth.license_number), ('LIC-NEW', 'LIC-doctor3'))
+        # The database's error would name the table and column
+        self.assertEqual(response.data['results'][5]['errors'],
+                         {'non_field_errors': ['This update conflicts with another record.']})
+
+    def test_update_all_valid(self):
+        items = [{'id': patient.pk, 'allergies': f'Pollen {i}'} for i, patient in enumerate(self.patients)]
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch('/api/patients/batch/', items, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(Patient.objects.values_list('allergies', flat=True)), ['Pollen 0', 'Pollen 1', 'Pollen 2'])
+        # One read for the whole batch, an UPDATE per item, one read for the response
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')]), 2)
+        self.assertEqual(response.data['results'][0]['data']['allergies'], 'Pollen 0')
+        self.assertEqual(self.client.patch('/api/patients/batch/', {'id': 1}, format='json').status_code, 400)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.patients = [
+            make_patient(f'patient{i}', medical_history='Long history. ' * 500, allergies='Pollen')
+            for i in range(3)
+        ]
+        self.doctor = make_doctor('doctor0', bio='Long bio. ' * 500, clinic_address='Somewhere')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        return response, '\n'.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_parse_fieldset(self):
+        def parse(**params):
+            return parse_fieldset(params, PATIENT_SERIALIZER)
+
+        self.assertIsNone(parse())
+        self.assertEqual(parse(fields='user.last_name, id,user.first_name'),
+                         {'id': None, 'user': {'first_name': None, 'last_name': None}})
+        self.assertEqual(parse(fields='user,user.email'), {'user': None})
+        fieldset = parse(exclude='medical_history,user.email,user')
+        self.assertNotIn('user', fieldset)
+        self.assertNotIn('medical_history', fieldset)
+        self.assertEqual(list(parse(fields='user', exclude='user.email')['user'])[:3],
+                         ['id', 'username', 'first_name'])
+        for params in ({'fields': 'nope'}, {'fields': 'user.nope'}, {'exclude': 'id.x'}, {'fields': ','}):
+            with self.subTest(params=params), self.assertRaises(ValueError):
+                parse(**params)
+
+    def test_list_reads_and_sends_only_requested_fields(self):
+        full, full_sql = self.get('/api/patients/')
+        sparse, sql = self.get('/api/patients/?fields=id,user.first_name,user.last_name')
+        self.assertEqual(sparse.data['results'][0].keys(), {'id', 'user'})
+        self.assertEqual(sparse.data['results'][0]['user'].keys(), {'first_name', 'last_name'})
+        self.assertIn('medical_history', full_sql)
+        for column in ('medical_history', 'allergies', 'email', 'profile_picture', 'date_joined'):
+            self.assertNotIn(column, sql)
+        self.assertLess(len(sparse.content) * 50, len(full.content))
+
+        response, sql = self.get('/api/doctors/?exclude=bio,clinic_address,user')
+        self.assertNotIn('bio', response.data['results'][0])
+        for column in ('"bio"', 'clinic_address', 'core_users'):
+            self.assertNotIn(column, sql)
+
+    def test_single_records_are_loaded_with_only(self):
+        patient = self.patients[0]
+        full = self.client.get(f'/api/patients/{patient.pk}/').data
+        response, sql = self.get(f'/api/patients/{patient.pk}/?fields=id,allergies')
+        self.assertEqual(response.data, {'id': patient.pk, 'allergies': 'Pollen'})
+        self.assertNotIn('medical_history', sql)
+        self.assertNotIn('core_users', sql)
+        response, sql = self.get(f'/api/patients/{patient.pk}/?fields=user.username,user.profile_picture_url')
+        self.assertEqual(response.data, {'user': {k: full['user'][k] for k in ('username', 'profile_picture_url')}})
+        self.assertNotIn('"email"', sql)
+        response, _ = self.get(f'/api/doctors/{self.doctor.pk}/?exclude=bio')
+        self.assertNotIn('bio', response.data)
+        self.assertIn('clinic_address', response.data)
+
+    def test_own_profiles_are_loaded_with_only(self):
+        response, sql = self.get('/api/doctors/my_profile/?fields=id,user.first_name')
+        self.assertEqual(response.data, {'id': self.doctor.pk, 'user': {'first_name': 'Doctor0'}})
+        for column in ('"bio"', '"clinic_address"', '"email"'):
+            self.assertNotIn(column, sql)
+        self.assertIn('ETag', response)
+        self.client.force_authenticate(self.patients[0].user)
+        response, sql = self.get('/api/patients/my_profile/?exclude=medical_history,allergies')
+        self.assertNotIn('medical_history', response.data)
+        self.assertNotIn('"medical_history"', sql)
+        self.assertNotIn('"allergies"', sql)
+        # The ETag still covers both rows
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/patients/my_profile/?exclude=medical_history,allergies',
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_other_reads_are_trimmed(self):
+        self.assertEqual(self.get('/api/users/me/?fields=email')[0].data, {'email': 'doctor0@example.com'})
+        self.assertEqual(self.get('/api/doctors/my_profile/?fields=bio&exclude=bio')[0].data, {})
+        response, sql = self.get(f'/api/patients/batch/?ids={self.patients[1].pk}&fields=allergies')
+        self.assertEqual(response.data['results'], [{'allergies': 'Pollen'}])
+        self.assertNotIn('medical_history', sql)
+        rows = self.get('/api/users/?cursor=&page_size=2&fields=username')[0].data
+        self.assertEqual(rows['results'][0].keys(), {'username'})
+        self.assertEqual(len(self.client.get(rows['next']).data['results']), 2)
+
+    def test_directory_cache_is_keyed_by_fieldset(self):
+        full = self.get('/api/doctors/verified_doctors/')[0].data['results'][0]
+        response, sql = self.get('/api/doctors/verified_doctors/?fields=id,clinic_name')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0], {'id': full['id'], 'clinic_name': full['clinic_name']})
+        self.assertNotIn('"bio"', sql)
+
+    def test_updates_still_write_every_field(self):
+        self.client.force_authenticate(self.patients[0].user)
+        response = self.client.patch('/api/patients/update_profile/?fields=id', {'allergies': 'Dust'}, format='json')
+        self.assertEqual(response.data, {'id': self.patients[0].pk})
+        self.patients[0].refresh_from_db()
+        self.assertEqual(self.patients[0].allergies, 'Dust')
+
+    def test_unknown_field(self):
+        response = self.client.get('/api/doctors/?fields=password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.data['detail'])
+
+
+class VerifiedDoctorDirectoryTests(TestCase):
+    def setUp(self):
+        verified_doctors_cache.stats.reset()
+        self.cardio = make_doctor('cardio', specialization='cardiology')
+        self.derm = make_doctor('derm', specialization='dermatology')
+        make_doctor('pending', is_verified=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.derm.user)
+
+    def get(self, **params):
+        return self.client.get('/api/doctors/verified_doctors/', params)
+
+    def test_paginates_and_filters(self):
+        response = self.get(page_size=1)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+        response = self.get(specialization='cardiology')
+        self.assertEqual([d['id'] for d in response.data['results']], [self.cardio.pk])
+        self.assertEqual(self.get(specialization='astrology').status_code, 400)
+
+    def test_links_leave_out_unrelated_params(self):
+        response = self.get(page_size=1, fields='id', utm_source='mail')
+        self.assertEqual(response.data['next'],
+                         'http://testserver/api/doctors/verified_doctors/?fields=id&page=2&page_size=1')
+        # Same page and links, so the same cache entry
+        response = self.get(page_size=1, fields='id', utm_source='other')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertNotIn('utm_source', response.data['next'])
+        previous = self.client.get(response.data['next']).data['previous']
+        self.assertEqual(previous, 'http://testserver/api/doctors/verified_doctors/?fields=id&page_size=1')
+
+    def test_read_through_cache_hits_and_misses(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get()['X-Cache'], 'HIT')
+        self.assertEqual(self.get(specialization='cardiology')['X-Cache'], 'MISS')
+        stats = verified_doctors_cache.stats.snapshot()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_doctor_and_user_writes_invalidate(self):
+        self.get()
+        self.cardio.bio = 'Now with a bio'
+        self.cardio.save()
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['bio'], 'Now with a bio')
+
+        self.cardio.user.city = 'Pune'
+        self.cardio.user.save()
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['user']['city'], 'Pune')
+
+        self.derm.delete()
+        self.assertEqual(self.get().data['count'], 1)
+
+    def test_unrelated_writes_keep_cache(self):
+        self.get()
+        make_patient('bystander')
+        self.cardio.user.save(update_fields=['last_login'])
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+
+class DirectoryInvalidationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_doctor('listed')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('reader'))
+
+    def listed(self):
+        return [row['user']['username'] for row in self.client.get('/api/doctors/verified_doctors/').data['results']]
+
+    def test_reads_between_save_and_commit_are_not_kept(self):
+        with mock.patch.object(verified_doctors_cache, 'get_or_compute',
+                               wraps=verified_doctors_cache.get_or_compute) as spy:
+            self.assertEqual(self.listed(), ['listed'])
+        parts = spy.call_args.args[0]
+        committed, _ = verified_doctors_cache.get_or_compute(parts, None)
+        with transaction.atomic():
+            self.doctor.is_verified = False
+            self.doctor.save()
+            # A concurrent request: its connection still reads the committed rows
+            verified_doctors_cache.get_or_compute(parts, lambda: committed)
+            self.assertEqual(verified_doctors_cache.get_or_compute(parts, None)[1], True)
+        self.assertEqual(self.listed(), [])
+
+
+class DoctorSearchTests(TestCase):
+    def setUp(self):
+        def doctor(username, specialization, city, years, bio=''):
+            doc = make_doctor(username, specialization=specialization, experience_years=years,
+                              clinic_name=f'{username.title()} Clinic', bio=bio)
+            Users.objects.filter(pk=doc.user_id).update(city=city)
+            return doc
+        self.heart = doctor('heart', 'cardiology', 'Pune', 12, 'Interventional cardiology and heart failure')
+        self.pulse = doctor('pulse', 'cardiology', 'Mumbai', 3, 'Preventive cardiology')
+        self.skin = doctor('skin', 'dermatology', 'Pune', 8, 'Skin care, acne and cardiology referrals')
+        make_doctor('unverified', is_verified=False, bio='cardiology')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('searcher'))
+
+    def search(self, **params):
+        response = self.client.get('/api/doctors/search/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def usernames(self, data):
+        return [row['user']['username'] for row in data['results']]
+
+    def test_text_search_is_ranked(self):
+        data = self.search(q='cardiolog')
+        # Clinic name hits weigh more than bio hits; shorter bios rank higher
+        self.assertEqual(self.usernames(data), ['pulse', 'heart', 'skin'])
+        self.assertEqual(self.usernames(self.search(q='heart fail')), ['heart'])
+        self.assertEqual(self.usernames(self.search(q='Pulse')), ['pulse'])
+
+    def test_filters_and_disjunctive_facets(self):
+        data = self.search(q='cardiology', city='pune', specialization='cardiology')
+        self.assertEqual(self.usernames(data), ['heart'])
+        self.assertEqual(data['count'], 1)
+        specializations = {f['value']: f['count'] for f in data['facets']['specialization']}
+        # Counts per specialization within Pune, per city within cardiology
+        self.assertEqual(specializations, {'cardiology': 1, 'dermatology': 1, 'neurology': 0,
+                                           'orthopedics': 0, 'general': 0})
+        self.assertEqual(data['facets']['city'], [{'value': 'Mumbai', 'count': 1}, {'value': 'Pune', 'count': 1}])
+        self.assertEqual(self.usernames(self.search(min_experience=4, max_experience=10)), ['skin'])
+
+    def test_cursor_pagination_follows_rank(self):
+        seen, url = [], '/api/doctors/search/?q=cardiology&page_size=1'
+        while url:
+            data = self.client.get(url).data
+            self.assertEqual(data['count'], 3)
+            seen += self.usernames(data)
+            url = data['next']
+        self.assertEqual(seen, self.usernames(self.search(q='cardiology')))
+
+    def test_facet_table_follows_every_write(self):
+        def counts(**params):
+            grouped = [(specialization, city or '', n) for specialization, city, n in _grouped_matches(params)]
+            return sorted(DOCTOR_FACETS.groups(params)), sorted(grouped)
+
+        Users.objects.filter(pk=self.pulse.user_id).update(city='Pune', state='Maharashtra')
+        Doctor.objects.filter(pk=self.skin.pk).update(specialization='neurology', experience_years=2)
+        self.heart.is_verified = False
+        self.heart.save()
+        unverified = Doctor.objects.get(user__username='unverified')
+        unverified.is_verified = True
+        unverified.save()
+        Doctor.objects.bulk_create([
+            Doctor(user=make_user(f'bulk{i}', user_type='doctor', city='Delhi'), specialization='general',
+                   license_number=f'BULK{i}', is_verified=True)
+            for i in range(3)
+        ])
+        self.pulse.user.delete()
+        for params in ({}, {'state': 'maharashtra'}, {'min_experience': 1, 'max_experience': 5}):
+            table, grouped = counts(**params)
+            self.assertEqual(table, grouped)
+        self.assertEqual(sorted(DOCTOR_FACETS.groups({})),
+                         [('general', '', 1), ('general', 'Delhi', 3), ('neurology', 'Pune', 1)])
+        data = self.search(state='Maharashtra')
+        self.assertEqual(data['count'], 0)
+
+    def test_invalid_params(self):
+        for params in ({'specialization': 'astrology'}, {'min_experience': 'x'},
+                       {'min_experience': 5, 'max_experience': 2}):
+            self.assertEqual(self.client.get('/api/doctors/search/', params).status_code, 400)
+
+
+class NearbyDoctorsTests(TestCase):
+    def setUp(self):
+        doctor_locations.clear()
+        self.addCleanup(doctor_locations.clear)
+        for pincode, latitude, longitude in [('560001', 12.9716, 77.5946), ('560034', 12.9352, 77.6245),
+                                             ('562110', 13.2437, 77.7172), ('400001', 18.9388, 72.8354)]:
+            Pincode.objects.create(pincode=pincode, latitude=latitude, longitude=longitude)
+
+        def doctor(username, pincode, **extra):
+            doc = make_doctor(username, **extra)
+            Users.objects.filter(pk=doc.user_id).update(pincode=pincode)
+            return doc
+        # Pincodes are free text
+        self.central = doctor('central', '560 001')
+        self.koramangala = doctor('koramangala', '560034')
+        self.airport = doctor('airport', '562110')
+        doctor('mumbai', '400001')
+        doctor('pending', '560001', is_verified=False)
+        doctor('nowhere', '999999')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('patient'))
+
+    def nearby(self, **params):
+        response = self.client.get('/api/doctors/nearby/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(row['user']['username'], row['distance_km']) for row in response.data['results']]
+
+    def test_nearest_first_within_radius(self):
+        self.assertEqual(self.nearby(pincode='560001'), [('central', 0.0), ('koramangala', 5.18)])
+        self.assertEqual([name for name, _ in self.nearby(pincode='560001', radius=50)],
+                         ['central', 'koramangala', 'airport'])
+        self.assertEqual(self.nearby(pincode='560001', radius=50, limit=1), [('central', 0.0)])
+        self.assertAlmostEqual(haversine_km(12.9716, 77.5946, 18.9388, 72.8354), 836, delta=2)
+
+    def test_saves_update_the_grid(self):
+        self.nearby(pincode='560001')
+        with self.captureOnCommitCallbacks(execute=True):
+            Users.objects.filter(pk=self.airport.user_id).update(pincode='560034')
+            self.airport.user.refresh_from_db()
+            self.airport.user.save()
+            self.koramangala.is_verified = False
+            self.koramangala.save()
+        self.assertEqual([name for name, _ in self.nearby(pincode='560001')], ['central', 'airport'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.central.delete()
+        self.assertEqual([name for name, _ in self.nearby(pincode='560001')], ['airport'])
+        self.assertEqual(len(doctor_locations), 2)
+
+    def test_saves_during_a_build_survive_the_swap(self):
+        read = doctor_locations._read
+
+        def read_then_move():
+            placed = read()
+            Users.objects.filter(pk=self.airport.user_id).update(pincode='560034')
+            doctor_locations.refresh(user_id=self.airport.user_id)
+            return placed
+        with mock.patch.object(doctor_locations, '_read', read_then_move):
+            doctor_locations.build()
+        self.assertEqual([name for name, _ in self.nearby(pincode='560001')], ['central', 'koramangala', 'airport'])
+
+    @override_settings(DOCTOR_PROXIMITY={'REBUILD_SECONDS': 0})
+    def test_stale_grid_is_rebuilt_once_in_the_background(self):
+        doctor_locations.build()
+        with mock.patch('core.proximity.threading.Thread') as thread:
+            for _ in range(3):
+                self.assertEqual(self.nearby(pincode='560001'), [('central', 0.0), ('koramangala', 5.18)])
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        self.assertEqual(thread.call_args.kwargs['target'], doctor_locations._rebuild)
+        # The thread never ran; release the build it held
+        doctor_locations._build_lock.release()
+
+    def test_invalid_params(self):
+        for params in ({}, {'pincode': '123456'}, {'pincode': '560001', 'radius': 0},
+                       {'pincode': '560001', 'radius': 500}, {'pincode': '560001', 'limit': 'x'}):
+            self.assertEqual(self.client.get('/api/doctors/nearby/', params).status_code, 400)
+
+    def test_import_pincodes(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('OfficeName,Pincode,Latitude,Longitude\n'
+                         'A,110001,28.60,77.20\nB,110001,28.64,77.22\nC,110002,NA,NA\n'
+                         'D,560001,13.00,77.60\n')
+        self.addCleanup(os.unlink, handle.name)
+        out = io.StringIO()
+        call_command('import_pincodes', handle.name, stdout=out)
+        self.assertIn('Imported 2 pincodes (1 rows skipped)', out.getvalue())
+        delhi = Pincode.objects.get(pincode='110001')
+        self.assertAlmostEqual(delhi.latitude, 28.62)
+        self.assertAlmostEqual(delhi.longitude, 77.21)
+        self.assertEqual(Pincode.objects.get(pincode='560001').latitude, 13.0)
+        self.assertEqual(Pincode.objects.count(), 5)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = make_user('cached')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_second_request_skips_token_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.me().status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.me()
+        self.assertEqual(response.data['username'], 'cached')
+        self.assertEqual(token_cache.hits, 1)
+
+    def test_deleted_token_is_rejected(self):
+        self.me()
+        self.token.delete()
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_user_updates_and_deactivation_are_seen(self):
+        self.me()
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.me().data['first_name'], 'Renamed')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_save_during_a_miss_is_not_cached_over(self):
+        load = TokenAuthentication.authenticate_credentials
+
+        def load_then_rename(auth, key):
+            user, token = load(auth, key)
+            # Another request saves the user after our row was read
+            Users.objects.get(pk=self.user.pk).save()
+            return user, token
+
+        with mock.patch.object(TokenAuthentication, 'authenticate_credentials', load_then_rename):
+            self.me()
+        self.assertEqual(len(token_cache), 0)
+
+    def test_forgotten_evictions_refuse_old_stamps(self):
+        stamp = token_cache.stamp()
+        with override_settings(TOKEN_AUTH_CACHE={'MAX_ENTRIES': 2}):
+            for user_id in range(1000, 1003):
+                token_cache.evict_user(user_id)
+        self.assertFalse(token_cache.set('key', self.user.pk, 'row', stamp))
+        self.assertTrue(token_cache.set('key', self.user.pk, 'row', token_cache.stamp()))
+
+    @override_settings(TOKEN_AUTH_CACHE={'MODE': 'bounded', 'MAX_STALENESS': 0})
+    def test_bounded_mode_expires_entries(self):
+        self.me()
+        with self.assertNumQueries(1):
+            self.me()
+
+    @override_settings(TOKEN_AUTH_CACHE={'MAX_ENTRIES': 2})
+    def test_lru_is_bounded(self):
+        for i in range(4):
+            token = Token.objects.create(user=make_user(f'lru{i}'))
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            self.me()
+        self.assertEqual(len(token_cache), 2)
+
+
+class TokenEvictionOnCommitTests(TransactionTestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = make_user('deactivated')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_load_between_save_and_commit_is_evicted(self):
+        self.assertEqual(self.me().status_code, 200)
+        committed = token_cache.get(self.token.key)
+        with transaction.atomic():
+            self.user.is_active = False
+            self.user.save()
+            # A concurrent request: its connection still reads the committed, active row
+            self.assertTrue(token_cache.set(self.token.key, self.user.pk, committed, token_cache.stamp()))
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_token_deleted_in_a_transaction_is_evicted_on_commit(self):
+        self.assertEqual(self.me().status_code, 200)
+        committed = token_cache.get(self.token.key)
+        with transaction.atomic():
+            Token.objects.filter(pk=self.token.pk).delete()
+            self.assertTrue(token_cache.set(self.token.key, self.user.pk, committed, token_cache.stamp()))
+        self.assertEqual(self.me().status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = make_user('loginuser')
+        self.user.set_password('secret-pass')
+        self.user.save()
+        self.client = APIClient()
+        throttle_buckets.clear()
+
+    def login(self, username, password='secret-pass'):
+        return self.client.post('/api/login/', {'username': username, 'password': password}, format='json')
+
+    def count_hashes(self, username, password='secret-pass'):
+        with mock.patch('django.contrib.auth.hashers.MD5PasswordHasher.encode',
+                        autospec=True, side_effect=MD5PasswordHasher.encode) as encode:
+            response = self.login(username, password)
+        return response, encode.call_count
+
+    def test_username_and_email_login_hash_once(self):
+        for identifier in ('loginuser', 'loginuser@example.com'):
+            with self.subTest(identifier=identifier):
+                response, hashes = self.count_hashes(identifier)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['user']['username'], 'loginuser')
+                self.assertEqual(hashes, 1)
+
+    def test_failures_still_hash_once(self):
+        for identifier, password in (('loginuser', 'wrong'), ('nobody', 'secret-pass')):
+            with self.subTest(identifier=identifier):
+                response, hashes = self.count_hashes(identifier, password)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(hashes, 1)
+
+    def test_email_match_wins_over_lookalike_username(self):
+        make_user('loginuser@example.com', email='other@example.com')
+        self.assertEqual(self.login('loginuser@example.com').data['user']['username'], 'loginuser')
+
+    def test_inactive_user_cannot_login(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login('loginuser').status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncAuthViewTests(TestCase):
+    def setUp(self):
+        reset_hashing_pool()
+        self.addCleanup(reset_hashing_pool)
+        self.client = APIClient()
+        throttle_buckets.clear()
+
+    def signup(self, **extra):
+        return self.client.post('/api/async/signup/', {
+            'username': 'asyncdoc', 'email': 'asyncdoc@example.com', 'password': 'secret-pass',
+            'first_name': 'Async', 'last_name': 'Doctor', 'user_type': 'doctor',
+            'license_number': 'LIC-ASYNC', 'specialization': 'neurology',
+            'address': {'city': 'Pune'}, **extra
+        }, format='json')
+
+    def test_signup_then_login(self):
+        response = self.signup()
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['user']['city'], 'Pune')
+        user = Users.objects.get(username='asyncdoc')
+        self.assertTrue(user.check_password('secret-pass'))
+        self.assertEqual(user.doctor.specialization, 'neurology')
+
+        response = self.client.post('/api/async/login/', {'username': 'asyncdoc', 'password': 'secret-pass'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['token'], body['token'])
+        response = self.client.post('/api/async/login/', {'username': 'asyncdoc', 'password': 'nope'},
+                                    format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_signup_validation_errors(self):
+        self.assertEqual(self.signup(specialization='astrology').status_code, 400)
+        self.assertEqual(self.signup(password='').json(), {'password': ['This field is required.']})
+
+    @override_settings(PASSWORD_HASHING_POOL={'WORKERS': 1, 'MAX_QUEUE': 0, 'RETRY_AFTER': 3})
+    def test_saturated_pool_returns_503(self):
+        release = threading.Event()
+        get_hashing_pool().submit(release.wait)
+        try:
+            response = self.client.post('/api/async/login/', {'username': 'x', 'password': 'y'}, format='json')
+        finally:
+            release.set()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(get_hashing_pool().rejected, 1)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    THROTTLE={'RATES': {'login.ip': '5/min', 'login.identifier': '2/min',
+                        'signup.ip': '3/hour', 'signup.identifier': '1/hour', 'availability.ip': '3/min'}},
+)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        throttle_buckets.clear()
+        self.addCleanup(throttle_buckets.clear)
+        self.client = APIClient()
+
+    def login(self, url, username, ip='10.0.0.1'):
+        return self.client.post(url, {'username': username, 'password': 'wrong'}, format='json', REMOTE_ADDR=ip)
+
+    def test_identifier_bucket_refuses_before_any_query_or_hash(self):
+        for _ in range(2):
+            self.assertEqual(self.login('/api/login/', 'Victim').status_code, 401)
+        with mock.patch('django.contrib.auth.hashers.MD5PasswordHasher.encode') as encode, \
+                self.assertNumQueries(0):
+            # Case and other addresses don't reset the identifier's bucket
+            response = self.login('/api/login/', 'victim ', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        encode.assert_not_called()
+        self.assertEqual(self.login('/api/login/', 'someone-else').status_code, 401)
+
+    def test_ip_bucket_spans_identifiers_and_ignores_forwarded_for(self):
+        for i in range(5):
+            self.assertEqual(self.login('/api/login/', f'user{i}').status_code, 401)
+        response = self.client.post('/api/login/', {'username': 'user9', 'password': 'x'}, format='json',
+                                    REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='192.0.2.7')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.login('/api/login/', 'user9', ip='10.0.0.3').status_code, 401)
+
+    def test_async_views_share_the_buckets(self):
+        self.login('/api/login/', 'victim')
+        self.login('/api/async/login/', 'victim')
+        with self.assertNumQueries(0):
+            response = self.login('/api/async/login/', 'victim')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        data = {'username': 'new', 'email': 'New@example.com', 'password': 'secret-pass',
+                'first_name': 'New', 'last_name': 'User'}
+        self.assertEqual(self.client.post('/api/async/signup/', data, format='json').status_code, 201)
+        data.update(username='new2', email='new@example.com')
+        self.assertEqual(self.client.post('/api/signup/', data, format='json').status_code, 429)
+
+    def test_availability_bucket_per_ip(self):
+        def check(name, ip='10.0.0.1'):
+            return self.client.get('/api/signup/availability/', {'username': name}, REMOTE_ADDR=ip)
+        for i in range(3):
+            self.assertEqual(check(f'name{i}').status_code, 200)
+        with self.assertNumQueries(0):
+            response = check('name9')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(check('name9', ip='10.0.0.2').status_code, 200)
+
+    def test_stats(self):
+        self.login('/api/login/', 'victim')
+        self.login('/api/login/', 'victim')
+        self.login('/api/login/', 'victim')
+        self.client.force_authenticate(Users(username='staff', is_staff=True))
+        response = self.client.get('/api/throttle/stats/')
+        self.assertEqual(response.data, {
+            'rules': {'login.ip': {'allowed': 3, 'throttled': 0},
+                      'login.identifier': {'allowed': 2, 'throttled': 1}},
+            'buckets': 2,
+        })
+        self.client.force_authenticate(make_user('plain'))
+        self.assertEqual(self.client.get('/api/throttle/stats/').status_code, 403)
+
+    def test_bucket_refills(self):
+        with mock.patch('core.throttling.time.time', return_value=1000.0):
+            self.assertEqual(throttle_buckets.take('k', 2, 0.5), 0)
+            self.assertEqual(throttle_buckets.take('k', 2, 0.5), 0)
+            self.assertEqual(throttle_buckets.take('k', 2, 0.5), 2.0)
+        with mock.patch('core.throttling.time.time', return_value=1002.0):
+            self.assertEqual(throttle_buckets.take('k', 2, 0.5), 0)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AccountAvailabilityTests(TestCase):
+    def setUp(self):
+        account_names.clear()
+        self.addCleanup(account_names.clear)
+        make_user('alice', email='alice@example.com')
+        self.client = APIClient()
+        throttle_buckets.clear()
+
+    def available(self, **params):
+        response = self.client.get('/api/signup/availability/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def signup(self, url, **extra):
+        return self.client.post(url, {
+            'username': 'newbie', 'email': 'newbie@example.com', 'password': 'secret-pass',
+            'first_name': 'New', 'last_name': 'Patient', 'user_type': 'patient', **extra
+        }, format='json')
+
+    def test_free_names_are_answered_from_the_filter(self):
+        self.assertEqual(self.available(username='alice', email='alice@EXAMPLE.com'),
+                         {'username': False, 'email': False})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.available(username='bob', email='bob@example.com'),
+                             {'username': True, 'email': True})
+        self.assertEqual(self.client.get('/api/signup/availability/').status_code, 400)
+
+    def test_filter_follows_creates_and_deletes(self):
+        self.available(username='bob')
+        bob = make_user('bob')
+        self.assertEqual(self.available(username='bob', email='bob@example.com'),
+                         {'username': False, 'email': False})
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.available(username='bob'), {'username': True})
+
+    def test_signup_rejects_taken_names_before_hashing(self):
+        with mock.patch('django.contrib.auth.base_user.make_password') as make_password:
+            response = self.signup('/api/signup/', username='alice')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'username': ['A user with that username already exists.']})
+        make_password.assert_not_called()
+        response = self.signup('/api/async/signup/', email='alice@EXAMPLE.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['A user with that email already exists.']})
+        self.assertEqual(self.signup('/api/signup/').status_code, 201)
+
+    def test_writes_during_a_build_survive_the_swap(self):
+        build = CountingBloomFilter.add_all
+
+        def add_then_write(bloom, keys):
+            build(bloom, keys)
+            make_user('bob')
+            with self.captureOnCommitCallbacks(execute=True):
+                Users.objects.get(username='alice').delete()
+        with mock.patch.object(CountingBloomFilter, 'add_all', add_then_write):
+            account_names.build()
+        self.assertTrue(account_names.might_exist('username', 'bob'))
+        self.assertFalse(account_names.might_exist('username', 'alice'))
+
+    @override_settings(ACCOUNT_NAME_FILTER={'REBUILD_SECONDS': 0})
+    def test_stale_filter_is_rebuilt_once_in_the_background(self):
+        account_names.build()
+        with mock.patch('core.availability.threading.Thread') as thread:
+            for _ in range(3):
+                self.assertEqual(self.available(username='alice'), {'username': False})
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        self.assertEqual(thread.call_args.kwargs['target'], account_names._rebuild)
+        # The thread never ran; release the build it held
+        account_names._build_lock.release()
+
+    def test_counting_bloom_filter(self):
+        bloom = CountingBloomFilter(1000, 0.01)
+        keys = [f'user{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        for key in keys[:500]:
+            bloom.remove(key)
+        # No false negatives, and removals free the slots they used
+        self.assertTrue(all(key in bloom for key in keys[500:]))
+        false_positives = sum(f'other{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportAccountsCommandTests(TestCase):
+    HEADER = 'username,email,password,first_name,last_name,user_type,license_number,specialization,city\n'
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        make_user('taken')
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return path
+
+    def run_import(self, path, *args, workers=0):
+        out = io.StringIO()
+        call_command('import_accounts', path, '--workers', str(workers), '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def rejects(self, path):
+        with open(f'{path}.rejects.jsonl') as handle:
+            return [json.loads(line) for line in handle]
+
+    def test_csv_import_creates_accounts_and_reports_rejects(self):
+        path = self.write('accounts.csv', self.HEADER + (
+            'p1,p1@example.com,pw-one,Pat,One,patient,,,Pune\n'
+            'd1,d1@example.com,pw-two,Doc,One,doctor,LIC-1,cardiology,\n'
+            'taken,new@example.com,pw,Dup,User,patient,,,\n'
+            'p2,bad-email,pw,Bad,Email,patient,,,\n'
+            'd2,d2@example.com,pw,Doc,Two,doctor,LIC-1,neurology,\n'
+        ))
+        self.run_import(path)
+        self.assertTrue(Users.objects.get(username='p1').check_password('pw-one'))
+        self.assertEqual(Patient.objects.get(user__username='p1').user.city, 'Pune')
+        self.assertEqual(Doctor.objects.get(user__username='d1').specialization, 'cardiology')
+        self.assertEqual(Token.objects.filter(user__username__in=['p1', 'd1']).count(), 2)
+        rejects = sorted(self.rejects(path), key=lambda r: r['line'])
+        self.assertEqual([r['line'] for r in rejects], [3, 4, 5])
+        self.assertIn('username', rejects[0]['errors'])
+        self.assertIn('email', rejects[1]['errors'])
+        self.assertIn('license_number', rejects[2]['errors'])
+        self.assertNotIn('password', rejects[0]['record'])
+
+    def test_process_pool_hashes_passwords(self):
+        path = self.write('accounts.csv', self.HEADER + ''.join(
+            f'w{i},w{i}@example.com,pw-{i},Worker,{i},patient,,,\n' for i in range(3)
+        ))
+        output = self.run_import(path, workers=2)
+        self.assertIn('Imported 3 accounts, rejected 0', output)
+        for i in range(3):
+            self.assertTrue(Users.objects.get(username=f'w{i}').check_password(f'pw-{i}'))
+
+    def test_jsonl_resume_from_checkpoint(self):
+        records = [
+            {'username': f'j{i}', 'email': f'j{i}@example.com', 'password': 'pw',
+             'first_name': 'J', 'last_name': str(i), 'address': {'city': 'Delhi'}}
+            for i in range(5)
+        ]
+        path = self.write('accounts.jsonl', '\n'.join(json.dumps(r) for r in records) + '\nnot json\n')
+        self.write('accounts.jsonl.checkpoint', json.dumps({'line': 2, 'created': 2, 'rejected': 0}))
+        output = self.run_import(path, '--resume')
+        self.assertIn('Imported 5 accounts, rejected 1', output)
+        self.assertEqual(sorted(Users.objects.filter(username__startswith='j').values_list('username', flat=True)),
+                         ['j2', 'j3', 'j4'])
+        self.assertEqual(Users.objects.get(username='j4').city, 'Delhi')
+        with open(f'{path}.checkpoint') as handle:
+            self.assertEqual(json.load(handle)['line'], 6)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedCommandTests(TestCase):
+    def seed(self, users):
+        call_command('seed', '--users', str(users), '--batch-size', '7', '--password', 'seeded', stdout=io.StringIO())
+
+    def test_seed_creates_profiles_and_appends(self):
+        make_user('existing')
+        self.seed(25)
+        self.seed(5)
+        seeded = Users.objects.exclude(username='existing')
+        self.assertEqual(seeded.count(), 30)
+        self.assertEqual(Patient.objects.count() + Doctor.objects.count(), 30)
+        self.assertEqual(Doctor.objects.count(), seeded.filter(user_type='doctor').count())
+        user = seeded.order_by('-pk').first()
+        self.assertTrue(user.check_password('seeded'))
+        self.assertIsNotNone(user.date_joined)
+        self.assertTrue(Pincode.objects.filter(pincode=user.pincode).exists())
+        # The search index triggers saw the raw inserts
+        matches, ranked = search_users(Users.objects.all(), user.username)
+        self.assertTrue(ranked)
+        self.assertEqual(list(matches.values_list('pk', flat=True)), [user.pk])
+        # Ids carry on after the existing rows, so the ORM can still insert
+        self.assertEqual(make_user('after').pk, user.pk + 1)
+
+
+class AdminChangelistTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.admin = Users.objects.create_superuser('admin@example.com', 'admin')
+        self.client.force_login(self.admin)
+        self.counter = 0
+        self.grow(3)
+
+    def grow(self, rows=10):
+        for _ in range(rows):
+            make_patient(f'patient{self.counter}')
+            make_doctor(f'doctor{self.counter}')
+            self.counter += 1
+
+    def test_changelists_make_constant_queries(self):
+        # session, user, count, page, first and last date
+        for url in ('/admin/core/users/', '/admin/core/patient/', '/admin/core/doctor/'):
+            with self.subTest(url=url):
+                self.assertQueryBudget(lambda: self.client.get(url), 6, grow=self.grow)
+
+    def test_search_uses_the_user_index(self):
+        response = self.client.get('/admin/core/patient/', {'q': 'patient1'})
+        self.assertEqual([p.user.username for p in response.context['cl'].result_list], ['patient1'])
+        response = self.client.get('/admin/core/doctor/', {'q': 'LIC-doctor2'})
+        self.assertEqual([d.user.username for d in response.context['cl'].result_list], ['doctor2'])
+        response = self.client.get('/admin/core/users/', {'q': 'doctor0@example'})
+        self.assertEqual([u.username for u in response.context['cl'].result_list], ['doctor0'])
+
+    def test_search_matches_whole_phone_numbers(self):
+        Patient.objects.filter(user__username='patient2').update(phone_number='5550142')
+        response = self.client.get('/admin/core/patient/', {'q': '5550142'})
+        self.assertEqual([p.user.username for p in response.context['cl'].result_list], ['patient2'])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN SELECT id FROM core_patient WHERE phone_number = %s', ['5550142'])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('patient_phone_idx', plan)
+
+    @override_settings(ROW_COUNTS={'EXACT_LIMIT': 2})
+    def test_large_counts_are_qualified(self):
+        response = self.client.get('/admin/core/patient/')
+        self.assertContains(response, 'about 3 Patients')
+        response = self.client.get('/admin/core/users/', {'q': 'Tester'})
+        self.assertContains(response, 'more than 2 userss')
+        response = self.client.get('/admin/core/users/', {'q': 'admin@example'})
+        self.assertContains(response, '1 users')
+        self.assertNotContains(response, 'about 1')
+
+    def test_date_hierarchy_spans_first_to_last_date(self):
+        Patient.objects.filter(user__username='patient0').update(
+            created_at=timezone.now() - datetime.timedelta(days=800))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/core/patient/')
+        self.assertFalse([q for q in ctx.captured_queries if 'DISTINCT' in q['sql']])
+        year = timezone.localdate().year
+        for y in range(year - 2, year + 1):
+            self.assertContains(response, f'?created_at__year={y}')
+        response = self.client.get('/admin/core/patient/', {'created_at__year': year - 2})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class ExplainHotpathsCommandTests(TestCase):
+    def test_hot_paths_use_indexes(self):
+        out = io.StringIO()
+        call_command('explain_hotpaths', stdout=out)
+        self.assertIn('doctor_verified_spec_idx', out.getvalue())
+        self.assertIn('No unexpected full table scans', out.getvalue())
+
+    def test_dropped_index_is_flagged(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX doctor_verified_idx')
+        with self.assertRaisesMessage(CommandError, 'doctors.verified'):
+            call_command('explain_hotpaths', 'doctors.verified', stdout=io.StringIO())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.patients = [make_patient(f'exp{i}', allergies='Dust' if i else '') for i in range(3)]
+        make_doctor('expdoc', bio='Line one\nline "two"')
+        self.client = APIClient()
+        self.client.force_authenticate(Users(username='staff', is_staff=True))
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.patients[0].user)
+        self.assertEqual(self.client.get('/api/patients/export/').status_code, 403)
+
+    def test_ndjson_export(self):
+        response = self.client.get('/api/patients/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([r['username'] for r in rows], ['exp0', 'exp1', 'exp2'])
+        self.assertEqual(rows[1]['allergies'], 'Dust')
+        self.assertNotIn('password', rows[0])
+
+    def test_csv_gzip_export(self):
+        response = self.client.get('/api/doctors/export/', {'export_format': 'csv', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('doctors.csv.gz', response['Content-Disposition'])
+        text = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['bio'], 'Line one\nline "two"')
+        self.assertEqual(rows[0]['license_number'], 'LIC-expdoc')
+
+    def test_updated_since_filter(self):
+        cutoff = timezone.now()
+        Patient.objects.filter(pk=self.patients[0].pk).update(updated_at=cutoff - datetime.timedelta(days=2))
+        Patient.objects.filter(pk=self.patients[1].pk).update(updated_at=cutoff + datetime.timedelta(days=1))
+        since = (cutoff - datetime.timedelta(days=1)).date().isoformat()
+        response = self.client.get('/api/patients/export/', {'updated_since': since})
+        usernames = [json.loads(line)['username'] for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(usernames, ['exp1', 'exp2'])
+        self.assertEqual(self.client.get('/api/patients/export/', {'updated_since': 'soon'}).status_code, 400)
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'patients.ndjson')
+            call_command('export_accounts', 'patients', '--output', path)
+            with open(path) as handle:
+                self.assertEqual(len(handle.readlines()), 3)
+
+
+def photo_bytes(color='red', size=(1600, 1200)):
+    """A JPEG carrying EXIF metadata, like a phone photo"""
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'  # Make
+    exif[0x0112] = 6  # Orientation: rotate 90
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, 'JPEG', exif=exif)
+    return out.getvalue()
+
+
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        for override in (override_settings(MEDIA_ROOT=media.name),
+                         override_settings(PROFILE_PICTURE_PIPELINE={'EAGER': True})):
+            override.enable()
+            self.addCleanup(override.disable)
+        self.client = APIClient()
+
+    def signup(self, username, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/signup/', {
+                'username': username, 'email': f'{username}@example.com', 'password': 'secret-pass',
+                'first_name': 'Pic', 'last_name': 'Tester', 'user_type': 'patient',
+                'profile_picture': SimpleUploadedFile('me.jpg', data, content_type='image/jpeg'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Users.objects.get(username=username)
+
+    def test_upload_is_resized_stripped_and_content_addressed(self):
+        user = self.signup('pic1', photo_bytes())
+        self.assertTrue(user.profile_picture.name.startswith(CONTENT_PREFIX))
+        self.assertFalse(default_storage.exists('profile_pictures/pic1_profile.jpg'))
+        sizes = user.profile_picture_variants['sizes']
+        self.assertEqual(set(sizes), {'large', 'medium', 'thumb'})
+        for name, edge in (('large', 512), ('thumb', 96)):
+            for fmt in ('webp', 'jpeg'):
+                with default_storage.open(sizes[name][fmt]) as handle:
+                    image = Image.open(handle)
+                    self.assertEqual(image.size, (edge, edge))
+                    self.assertEqual(len(image.getexif()), 0)
+
+        self.client.force_authenticate(user)
+        body = self.client.get('/api/users/me/').json()
+        self.assertTrue(body['profile_picture_url'].endswith(sizes['large']['jpeg']))
+        self.assertTrue(body['profile_picture_variants']['thumb']['webp'].startswith('http://testserver/media/'))
+
+    def test_raw_upload_is_never_linked(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/signup/', {
+                'username': 'pic0', 'email': 'pic0@example.com', 'password': 'secret-pass',
+                'first_name': 'Pic', 'last_name': 'Tester', 'user_type': 'patient',
+                'profile_picture': SimpleUploadedFile('me.jpg', photo_bytes(), content_type='image/jpeg'),
+            }, format='multipart')
+        user = Users.objects.get(username='pic0')
+        self.assertTrue(user.profile_picture)
+        self.client.force_authenticate(user)
+        bodies = [
+            response.json()['user'],
+            self.client.get('/api/users/me/').json(),
+            self.client.get('/api/patients/').json()['results'][0]['user'],
+        ]
+        for body in bodies:
+            for field in ('profile_picture', 'profile_picture_url', 'profile_picture_variants'):
+                self.assertIsNone(body[field], field)
+
+        for callback in callbacks:
+            callback()
+        user.refresh_from_db()
+        body = self.client.get('/api/patients/').json()['results'][0]['user']
+        self.assertTrue(body['profile_picture'].endswith(user.profile_picture.name))
+        self.assertEqual(body['profile_picture_url'], body['profile_picture'])
+
+    def test_identical_uploads_share_files(self):
+        data = photo_bytes('blue')
+        first = self.signup('pic1', data)
+        second = self.signup('pic2', data)
+        self.assertEqual(first.profile_picture.name, second.profile_picture.name)
+        directory = os.path.dirname(os.path.join(default_storage.location, first.profile_picture.name))
+        self.assertEqual(len(os.listdir(directory)), 6)
+
+    def test_stale_job_is_ignored(self):
+        user = make_user('pic3')
+        self.assertFalse(process_profile_picture(user.pk, 'profile_pictures/old.jpg'))
+
+    def test_backfill_command(self):
+        user = make_user('pic4')
+        name = default_storage.save('profile_pictures/pic4_profile.jpg', ContentFile(photo_bytes('green')))
+        Users.objects.filter(pk=user.pk).update(profile_picture=name)
+        out = io.StringIO()
+        call_command('process_profile_pictures', '--workers', '0', stdout=out)
+        self.assertIn('Processed 1 profile pictures', out.getvalue())
+        user.refresh_from_db()
+        self.assertEqual(user.profile_picture_variants['picture'], user.profile_picture.name)
+        self.assertFalse(default_storage.exists(name))
+
+    def test_force_rebuilds_from_the_original(self):
+        user = self.signup('pic5', photo_bytes('purple'))
+        original = user.profile_picture_variants['original']
+        self.assertTrue(original.startswith(ORIGINALS_PREFIX))
+        before = variant_paths(user.profile_picture_variants)
+        sources = []
+
+        def render(data):
+            sources.append(Image.open(io.BytesIO(data)).size)
+            return render_variants(data)
+
+        with mock.patch('core.images.render_variants', render), mock.patch.dict(VARIANTS, {'large': 400}):
+            call_command('process_profile_pictures', '--workers', '0', '--force', stdout=io.StringIO())
+        self.assertEqual(sources, [(1600, 1200)])
+        user.refresh_from_db()
+        self.assertEqual(user.profile_picture_variants['original'], original)
+        self.assertTrue(user.profile_picture.name.endswith('/large-400.jpg'))
+        after = variant_paths(user.profile_picture_variants)
+        self.assertTrue(all(default_storage.exists(path) for path in after))
+        self.assertFalse(any(default_storage.exists(path) for path in before - after))
+
+    def test_unreferenced_files_are_deleted(self):
+        data = photo_bytes('orange')
+        first = self.signup('pic6', data)
+        second = self.signup('pic7', data)
+        shared = variant_paths(first.profile_picture_variants)
+        first_original = first.profile_picture_variants['original']
+
+        first.profile_picture = default_storage.save('profile_pictures/pic6_new.jpg', ContentFile(photo_bytes('teal')))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertFalse(default_storage.exists(first_original))
+        # Still the second user's picture
+        self.assertTrue(all(default_storage.exists(path) for path in shared))
+
+        second_original = second.profile_picture_variants['original']
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(second_original))
+        self.assertFalse(any(default_storage.exists(path) for path in shared))
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        verified_doctors_cache.invalidate()
+        self.patient = make_patient('etag')
+        make_doctor('etagdoc')
+        token = Token.objects.create(user=self.patient.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def revalidate(self, url, queries, **headers):
+        """GET ``url``, then replay it with its ETag; returns (200 response, 304 response)"""
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(queries):
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'], **headers)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.content, b'')
+        self.assertGreater(len(first.content), 0)
+        return first, second
+
+    def test_me_revalidates_without_queries(self):
+        # The token (and so the user) is cached after the first request
+        self.revalidate('/api/users/me/', 0)
+
+    def test_my_profile_revalidates_with_one_query(self):
+        first, second = self.revalidate('/api/patients/my_profile/', 1)
+        self.assertIn('no-cache', second['Cache-Control'])
+
+    def test_if_modified_since_is_not_trusted(self):
+        first = self.client.get('/api/patients/my_profile/')
+        # An edit within the same second keeps the HTTP date
+        Patient.objects.filter(pk=self.patient.pk).update(
+            updated_at=self.patient.updated_at + datetime.timedelta(microseconds=1)
+        )
+        response = self.client.get('/api/patients/my_profile/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_write_changes_etag(self):
+        first = self.client.get('/api/patients/my_profile/')
+        Patient.objects.filter(pk=self.patient.pk).update(
+            updated_at=self.patient.updated_at + datetime.timedelta(seconds=1)
+        )
+        response = self.client.get('/api/patients/my_profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_update_profile_if_match(self):
+        etag = self.client.get('/api/patients/my_profile/')['ETag']
+        response = self.client.patch('/api/patients/update_profile/', {'allergies': 'Pollen'},
+                                     format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # A second writer still holding the old ETag loses
+        response = self.client.patch('/api/patients/update_profile/', {'allergies': 'Dust'},
+                                     format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.allergies, 'Pollen')
+
+    def test_verified_doctors_revalidates_from_cache(self):
+        first, second = self.revalidate('/api/doctors/verified_doctors/', 0)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        Doctor.objects.get().save()
+        response = self.client.get('/api/doctors/verified_doctors/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class FastJSONTests(TestCase):
+    def test_parser_errors_match_drf(self):
+        for body in (b'{"a": NaN}', b'{"a": 1', b'\xef\xbb\xbf{}', b'"\\ud800"'):
+            try:
+                expected = JSONParser().parse(io.BytesIO(body))
+            except ParseError as e:
+                with self.assertRaisesMessage(ParseError, str(e.detail)):
+                    FastJSONParser().parse(io.BytesIO(body))
+            else:
+                self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), expected)
+
+    def test_indented_and_stdlib_fallbacks(self):
+        data = {'when': timezone.now(), 'big': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+        with mock.patch('core.renderers.orjson', None), mock.patch('core.parsers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(b'[1, 2]')), [1, 2])
+
+    def test_api_uses_fast_json(self):
+        response = APIClient().post('/api/login/', {'username': 'nobody', 'password': 'x'}, format='json')
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.json(), {'error': 'Invalid credentials'})
+
+
+class SQLiteSettingsTests(TestCase):
+    def test_new_connections_get_pragmas(self):
+        connection.close()
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('busy_timeout', 'synchronous', 'temp_store', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        # synchronous=1 is NORMAL, temp_store=2 is MEMORY
+        self.assertEqual(pragmas, {'busy_timeout': 5000, 'synchronous': 1, 'temp_store': 2, 'cache_size': -20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': ['replica'], 'STICKY_SECONDS': 60})
+class ReadReplicaTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test databases were set up, so the runner doesn't
+        # create it; as a mirror it isn't flushed either
+        cls.tmp = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(cls.tmp.name, 'replica.sqlite3'),
+            'OPTIONS': {'init_command': 'PRAGMA query_only=ON'},
+            'TEST': {'MIRROR': 'default'},
+        }
+        cls.databases = cls.databases | {'replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.databases = cls.databases - {'replica'}
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.patient = make_patient('replicated', allergies='Dust')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.patient.user).key}')
+        replicate('replica')
+        # Changed on the primary only, as if replication were lagging
+        Patient.objects.filter(pk=self.patient.pk).update(emergency_contact='lagging')
+
+    def my_profile(self):
+        return self.client.get('/api/patients/my_profile/').data
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.my_profile()['emergency_contact'], '')
+        self.assertEqual(self.client.get('/api/patients/').data['results'][0]['emergency_contact'], '')
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.patch('/api/patients/update_profile/', {'allergies': 'Pollen'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.my_profile()['allergies'], 'Pollen')
+        cache.clear()
+        self.assertEqual(self.my_profile()['allergies'], 'Dust')
+
+    def test_auth_and_new_accounts_use_primary(self):
+        response = self.client.post('/api/signup/', {
+            'username': 'fresh', 'email': 'fresh@example.com', 'password': 'Str0ng-pass!',
+            'first_name': 'Fresh', 'last_name': 'Signup', 'user_type': 'patient',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+        self.assertEqual(self.my_profile()['user']['username'], 'fresh')
+
+    def test_writes_never_reach_replica(self):
+        with self.assertRaisesMessage(Exception, 'readonly'):
+            Patient.objects.using('replica').update(allergies='x')
@@ -0,0 +1,179 @@
+"""
+Token-bucket throttling for login, signup and the signup availability check.
+
+Login and signup are open to anyone and hash a password, so an unthrottled
+credential-stuffing burst buys unbounded PBKDF2 work. The availability
+check is open too and answers whether an account exists, so it is limited
+per IP against enumeration. Each rule in
+``THROTTLE['RATES']`` is a bucket per client IP or per identifier (the
+username or email being tried). ``'30/min'`` holds up to 30 tokens and
+refills at 30 a minute. A request spends a token from each of its buckets and
+is refused with 429 and Retry-After as soon as one is empty. The check runs
+before the view: no token lookup, no query, no hash.
+
+Buckets live in ``SHARDS`` dicts, each behind its own lock, so concurrent
+checks rarely wait on each other. Every check is a constant amount of work.
+Each shard keeps its most recently used buckets, ``MAX_KEYS`` in all; a
+bucket left alone long enough to refill is full anyway, so dropping it
+loses nothing. With ``CACHE_ALIAS`` set, buckets are kept in that cache
+instead and every worker draws from the same ones. The cache's get and set
+aren't atomic, so a concurrent burst can overshoot by about a token per
+worker.
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    'RATES': {
+        'login.ip': '30/min',
+        'login.identifier': '10/min',
+        'signup.ip': '20/hour',
+        'signup.identifier': '5/hour',
+        'availability.ip': '60/min',
+    },
+    'SHARDS': 16,
+    'MAX_KEYS': 100_000,
+    'CACHE_ALIAS': None,
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'THROTTLE', {}))
+    return config
+
+
+def parse_rate(rate):
+    """``'30/min'`` -> ``(30, 0.5)``: bucket capacity and tokens per second (DRF's rate syntax)"""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+class ThrottleStats:
+    """In-process allowed/throttled counters per rule"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, rule, outcome):
+        with self._lock:
+            counts = self.counts.setdefault(rule, {'allowed': 0, 'throttled': 0})
+            counts[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {rule: dict(counts) for rule, counts in self.counts.items()}
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+
+
+class BucketStore:
+    def __init__(self):
+        self._shards = []
+        self.stats = ThrottleStats()
+        self.clear()
+
+    def clear(self):
+        shards = get_config()['SHARDS']
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self.stats.reset()
+
+    def __len__(self):
+        return sum(len(buckets) for lock, buckets in self._shards)
+
+    def take(self, key, capacity, per_second):
+        """Spend a token from bucket ``key``: 0 if there was one, else seconds until there is"""
+        config = get_config()
+        lock, buckets = self._shards[zlib.crc32(key.encode('utf-8')) % len(self._shards)]
+        cache = caches[config['CACHE_ALIAS']] if config['CACHE_ALIAS'] else None
+        # Wall-clock time, so buckets shared through a cache mean the same in every worker
+        now = time.time()
+        with lock:
+            if cache is not None:
+                tokens, updated = cache.get(f'throttle:{key}') or (capacity, now)
+            else:
+                tokens, updated = buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * per_second)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / per_second
+            if cache is not None:
+                # Once refilled the bucket is full again: the entry can expire
+                cache.set(f'throttle:{key}', (tokens, now), timeout=int(capacity / per_second) + 1)
+            else:
+                buckets[key] = (tokens, now)
+                if len(buckets) > config['MAX_KEYS'] // len(self._shards):
+                    buckets.popitem(last=False)
+        return wait
+
+
+throttle_buckets = BucketStore()
+
+
+def normalize_identifier(value):
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    value = str(value).strip().casefold()
+    return value[:254] or None
+
+
+def check(endpoint, ip, identifier):
+    """
+    Spend a token from each of ``endpoint``'s buckets. Returns None when the
+    request may go ahead, else the seconds to wait.
+    """
+    rates = get_config()['RATES']
+    for scope, key in (('ip', ip), ('identifier', normalize_identifier(identifier))):
+        rule = f'{endpoint}.{scope}'
+        if key is None or not rates.get(rule):
+            continue
+        wait = throttle_buckets.take(f'{rule}:{key}', *parse_rate(rates[rule]))
+        if wait:
+            throttle_buckets.stats.record(rule, 'throttled')
+            return wait
+        throttle_buckets.stats.record(rule, 'allowed')
+    return None
+
+
+class BucketThrottle(BaseThrottle):
+    """DRF throttle over ``check``; subclasses name the endpoint and its identifier field"""
+
+    endpoint = None
+    identifier_field = None
+
+    def allow_request(self, request, view):
+        data = request.data
+        identifier = data.get(self.identifier_field) if hasattr(data, 'get') else None
+        self._wait = check(self.endpoint, self.get_ident(request), identifier)
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+class LoginThrottle(BucketThrottle):
+    endpoint = 'login'
+    identifier_field = 'username'
+
+
+class SignupThrottle(BucketThrottle):
+    endpoint = 'signup'
+    identifier_field = 'email'
+
+
+class AvailabilityThrottle(BucketThrottle):
+    endpoint = 'availability'
@@ -1,6 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, PatientViewSet, DoctorViewSet, signup_view, login_view
+from .async_views import async_signup_view, async_login_view
+from .views import (
+    UserViewSet, PatientViewSet, DoctorViewSet, availability_view, signup_view, login_view,
+    throttle_stats_view,
+)
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -10,5 +14,10 @@ router.register(r'doctors', DoctorViewSet, basename='doctor')
 urlpatterns = [
     path('', include(router.urls)),
     path('signup/', signup_view, name='signup'),
+    path('signup/availability/', availability_view, name='signup-availability'),
     path('login/', login_view, name='login'),
+    path('throttle/stats/', throttle_stats_view, name='throttle-stats'),
+    # Async variants for ASGI: password hashing runs in a bounded pool
+    path('async/signup/', async_signup_view, name='async-signup'),
+    path('async/login/', async_login_view, name='async-login'),
 ]
\ No newline at end of file
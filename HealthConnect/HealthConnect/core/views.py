@@ -1,25 +1,44 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (
+    action, api_view, authentication_classes, permission_classes, throttle_classes
+)
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.hashers import make_password
-from django.db.models import Q
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from .availability import FIELDS as ACCOUNT_NAME_FIELDS, account_names, normalize, taken_errors
+from .batch import batch_read, batch_update, parse_ids, parse_updates
+from .cache import verified_doctors_cache
+from .conditional import make_etag, precondition_response, profile_validators, set_validators
+from .doctor_search import facet_counts, filtered_doctors, parse_search_params
+from .exports import FORMATS, export_filename, parse_updated_since, stream_export
+from .fast_serializers import DOCTOR_SERIALIZER, PATIENT_SERIALIZER, USER_SERIALIZER
+from .fieldsets import EXCLUDE_PARAM, FIELDS_PARAM, SparseFieldsetMixin
 from .models import Patient, Doctor
+from .pagination import CachedCountPagination, DirectoryPagination, DoctorSearchPagination, KeysetCursorPagination
+from .proximity import doctor_locations, parse_nearby_params, pincode_location
+from .replicas import ReplicaReadsMixin, primary_reads
+from .search import search_users
 from .serializers import (
     UserSerializer, PatientSerializer, PatientCreateSerializer,
-    DoctorSerializer, DoctorCreateSerializer
+    DoctorSerializer, DoctorCreateSerializer, trim_fields
 )
+from .throttling import AvailabilityThrottle, LoginThrottle, SignupThrottle, throttle_buckets
 
 User = get_user_model()
 
+SIGNUP_REQUIRED_FIELDS = ['username', 'email', 'password', 'first_name', 'last_name']
+
 
-class UserViewSet(viewsets.ViewSet):
+class UserViewSet(SparseFieldsetMixin, ReplicaReadsMixin, viewsets.ViewSet):
     permission_classes = [AllowAny]
+    row_serializer = USER_SERIALIZER
 
-    def list(self, request):
-        """List all users"""
+    def directory_denied(self, request):
+        """Error response unless the user may read other users' records"""
         if not request.user.is_authenticated:
             return Response(
                 {'error': 'Not authenticated'},
@@ -32,6 +51,13 @@ class UserViewSet(viewsets.ViewSet):
                 {'error': 'Permission denied. Only doctors can view all users.'},
                 status=status.HTTP_403_FORBIDDEN
             )
+        return None
+
+    def list(self, request):
+        """List all users"""
+        denied = self.directory_denied(request)
+        if denied is not None:
+            return denied
 
         # Apply filters based on query parameters
         user_type = request.query_params.get('user_type', None)
@@ -42,30 +68,42 @@ class UserViewSet(viewsets.ViewSet):
         if user_type:
             users = users.filter(user_type=user_type)
 
+        ranked = False
         if search:
-            users = users.filter(
-                Q(username__icontains=search) |
-                Q(email__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search)
-            )
+            users, ranked = search_users(users, search)
 
-        # Pagination
-        page = request.query_params.get('page', 1)
-        page_size = 10  # Default page size
-        start = (int(page) - 1) * page_size
-        end = start + page_size
+        # Cursor (keyset) pagination is opt-in via ?cursor=
+        if 'cursor' in request.query_params:
+            paginator = KeysetCursorPagination()
+            serializer = self.get_row_serializer(extra=[field.lstrip('-') for field in paginator.ordering])
+            page = paginator.paginate_queryset(serializer.rows(users), request, view=self)
+            return paginator.get_paginated_response(serializer.many(page, request))
 
-        total_count = users.count()
-        users = users[start:end]
+        if ranked:
+            users = users.order_by('search_rank', '-date_joined', '-id')
 
-        serializer = UserSerializer(users, many=True, context={'request': request})
-        return Response({
-            'results': serializer.data,
-            'count': total_count,
-            'next': f'?page={int(page) + 1}' if end < total_count else None,
-            'previous': f'?page={int(page) - 1}' if int(page) > 1 else None,
-        })
+        paginator = CachedCountPagination()
+        # Past the last page the user list has always answered with no results
+        paginator.empty_past_end = True
+        serializer = self.get_row_serializer()
+        page = paginator.paginate_queryset(serializer.rows(users), request, view=self)
+        return paginator.get_paginated_response(serializer.many(page, request))
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """Users by ?ids=1,2,3 in one query"""
+        denied = self.directory_denied(request)
+        if denied is not None:
+            return denied
+        return batch_response(request, User.objects.all(), self.get_row_serializer())
+
+    def user_response(self, request):
+        etag, last_modified = profile_validators(request, request.user)
+        response = precondition_response(request, etag, last_modified)
+        if response is None:
+            serializer = UserSerializer(request.user, context={'request': request}, fieldset=self.fieldset)
+            response = set_validators(Response(serializer.data), etag, last_modified)
+        return response
 
     @action(detail=False, methods=['get'])
     def current_user(self, request):
@@ -74,8 +112,7 @@ class UserViewSet(viewsets.ViewSet):
                 {'error': 'Not authenticated'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
-        serializer = UserSerializer(request.user, context={'request': request})
-        return Response(serializer.data)
+        return self.user_response(request)
 
     @action(detail=False, methods=['get'], url_path='me')
     def me(self, request):
@@ -84,18 +121,13 @@ class UserViewSet(viewsets.ViewSet):
                 {'error': 'Not authenticated'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
-        serializer = UserSerializer(request.user, context={'request': request})
-        return Response(serializer.data)
+        return self.user_response(request)
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def signup_view(request):
-    """Unified signup endpoint for both patients and doctors"""
-    user_type = request.data.get('user_type', 'patient')
-    
+def prepare_signup_data(raw_data):
+    """Flatten address formats and coerce optional fields for the create serializers"""
     # Handle address fields - convert from nested format to flat format
-    data = request.data.copy()
+    data = raw_data.copy()
     
     # Handle address[line1] format from FormData (most common case)
     if 'address[line1]' in data or 'address[city]' in data or 'address[state]' in data or 'address[pincode]' in data:
@@ -131,10 +163,36 @@ def signup_view(request):
                 data[field] = ''
             elif not isinstance(data[field], str):
                 data[field] = str(data[field]) if data[field] else ''
+    return data
+
+
+def signup_error_detail(e):
+    """Error payload for an exception raised while creating an account"""
+    # Handle DRF ValidationError
+    if hasattr(e, 'detail'):
+        # This is a DRF ValidationError with field-specific errors
+        return e.detail
+    # Handle Django ValidationError
+    elif hasattr(e, 'message_dict'):
+        return e.message_dict
+    # Handle other exceptions
+    error_message = str(e)
+    return {'error': error_message, 'detail': error_message}
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+# No authentication: a token header would cost a query before the throttle runs
+@authentication_classes([])
+@throttle_classes([SignupThrottle])
+def signup_view(request):
+    """Unified signup endpoint for both patients and doctors"""
+    user_type = request.data.get('user_type', 'patient')
+    
+    data = prepare_signup_data(request.data)
     
     # Ensure required fields are present and not empty
-    required_fields = ['username', 'email', 'password', 'first_name', 'last_name']
-    missing_fields = [field for field in required_fields if not data.get(field)]
+    missing_fields = [field for field in SIGNUP_REQUIRED_FIELDS if not data.get(field)]
     if missing_fields:
         return Response(
             {field: ['This field is required.'] for field in missing_fields},
@@ -158,6 +216,11 @@ def signup_view(request):
                 serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        # Refuse taken names before paying for the password hash
+        errors = taken_errors(serializer.validated_data)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
         
         if user_type == 'patient':
             patient = serializer.save()
@@ -178,30 +241,29 @@ def signup_view(request):
         }, status=status.HTTP_201_CREATED)
         
     except Exception as e:
-        # Handle DRF ValidationError
-        if hasattr(e, 'detail'):
-            # This is a DRF ValidationError with field-specific errors
-            return Response(
-                e.detail,
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        # Handle Django ValidationError
-        elif hasattr(e, 'message_dict'):
-            return Response(
-                e.message_dict,
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        # Handle other exceptions
-        else:
-            error_message = str(e)
-            return Response(
-                {'error': error_message, 'detail': error_message},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(signup_error_detail(e), status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([AvailabilityThrottle])
+def availability_view(request):
+    """Whether ?username= and/or ?email= are free, for the signup form"""
+    values = {field: normalize(field, request.query_params.get(field)) for field in ACCOUNT_NAME_FIELDS}
+    values = {field: value for field, value in values.items() if value}
+    if not values:
+        return Response(
+            {'error': 'Provide a username and/or an email.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    taken = account_names.taken(**values)
+    return Response({field: not taken[field] for field in values})
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@authentication_classes([])
+@throttle_classes([LoginThrottle])
 def login_view(request):
     """Login endpoint that accepts both email and username"""
     username = request.data.get('username')
@@ -213,18 +275,9 @@ def login_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Try authenticating with email first (since email is USERNAME_FIELD)
+    # EmailOrUsernameBackend resolves either identifier and hashes once
     user = authenticate(request, username=username, password=password)
 
-    if user is None:
-        # If email authentication fails, try looking up by username
-        try:
-            user_by_username = User.objects.get(username=username)
-            # Authenticate using the found user's email
-            user = authenticate(request, username=user_by_username.email, password=password)
-        except User.DoesNotExist:
-            user = None
-
     if user is None:
         return Response(
             {'error': 'Invalid credentials'},
@@ -250,13 +303,92 @@ def login_view(request):
     })
 
 
-class PatientViewSet(viewsets.ModelViewSet):
-    queryset = Patient.objects.all()
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def throttle_stats_view(request):
+    """Allowed/throttled counts per throttle rule, for this process"""
+    return Response({'rules': throttle_buckets.stats.snapshot(), 'buckets': len(throttle_buckets)})
+
+
+def export_response(request, kind):
+    """Staff-only streaming dump of patients or doctors (NDJSON or CSV)"""
+    fmt = request.query_params.get('export_format', 'ndjson')
+    if fmt not in FORMATS:
+        return Response(
+            {'error': 'Invalid export_format. Must be "ndjson" or "csv".'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    updated_since = request.query_params.get('updated_since')
+    if updated_since:
+        try:
+            updated_since = parse_updated_since(updated_since)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    gzip = request.query_params.get('gzip') in ('1', 'true', 'True')
+
+    response = StreamingHttpResponse(
+        stream_export(kind, fmt, gzip=gzip, updated_since=updated_since or None),
+        content_type='application/gzip' if gzip else FORMATS[fmt][0]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, fmt, gzip)}"'
+    return response
+
+
+def batch_response(request, queryset, row_serializer, serializer_class=None):
+    """GET reads the records in ?ids=; PATCH applies a list of partial updates (see core.batch)"""
+    try:
+        if request.method == 'GET':
+            ids = parse_ids(request.query_params.get('ids'))
+        else:
+            items = parse_updates(request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if request.method == 'GET':
+        return Response(batch_read(queryset, ids, row_serializer, request))
+    results, ok = batch_update(queryset, items, serializer_class, row_serializer, request)
+    return Response(
+        {'results': results},
+        status=status.HTTP_200_OK if ok else status.HTTP_207_MULTI_STATUS
+    )
+
+
+def update_profile_response(request, model, serializer_class, fieldset=None):
+    """PUT/PATCH the caller's own patient or doctor profile"""
+    # If-Match makes concurrent edits fail with 412 instead of overwriting.
+    # The check and the save share one transaction, with the row locked
+    # from the read on, so no other write can land between them.
+    with transaction.atomic():
+        try:
+            profile = model.objects.select_related('user').select_for_update(of=('self',)).get(user=request.user)
+        except model.DoesNotExist:
+            return Response(
+                {'error': f'{model.__name__} profile not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        etag, last_modified = profile_validators(request, profile, profile.user)
+        response = precondition_response(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        serializer = serializer_class(profile, data=request.data, partial=True, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+    if fieldset is not None:
+        trim_fields(serializer, fieldset)
+    return set_validators(Response(serializer.data), *profile_validators(request, profile, profile.user))
+
+
+class PatientViewSet(SparseFieldsetMixin, ReplicaReadsMixin, viewsets.ModelViewSet):
+    queryset = Patient.objects.select_related('user')
     serializer_class = PatientSerializer
+    row_serializer = PATIENT_SERIALIZER
     
     def get_permissions(self):
         if self.action in ['create']:
             permission_classes = [AllowAny]
+        elif self.action == 'export' or (self.action == 'batch' and self.request.method == 'PATCH'):
+            permission_classes = [IsAdminUser]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
@@ -275,41 +407,57 @@ class PatientViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
     
+    def list(self, request, *args, **kwargs):
+        # Read-only fast path; same output as PatientSerializer(many=True)
+        serializer = self.get_row_serializer()
+        rows = serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page, request))
+        return Response(serializer.many(rows, request))
+
     @action(detail=False, methods=['get'])
     def my_profile(self, request):
         try:
-            patient = Patient.objects.get(user=request.user)
-            serializer = PatientSerializer(patient, context={'request': request})
-            return Response(serializer.data)
+            patient = self.get_profile_queryset(Patient.objects.select_related('user')).get(user=request.user)
         except Patient.DoesNotExist:
             return Response(
                 {'error': 'Patient profile not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        # Answer revalidation before serializing anything
+        etag, last_modified = profile_validators(request, patient, patient.user)
+        response = precondition_response(request, etag, last_modified)
+        if response is None:
+            serializer = PatientSerializer(patient, context={'request': request}, fieldset=self.fieldset)
+            response = set_validators(Response(serializer.data), etag, last_modified)
+        return response
     
     @action(detail=False, methods=['put', 'patch'])
     def update_profile(self, request):
-        try:
-            patient = Patient.objects.get(user=request.user)
-        except Patient.DoesNotExist:
-            return Response(
-                {'error': 'Patient profile not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        serializer = PatientSerializer(patient, data=request.data, partial=True, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        return update_profile_response(request, Patient, PatientSerializer, self.fieldset)
+
+    @action(detail=False, methods=['get', 'patch'])
+    def batch(self, request):
+        """GET ?ids=1,2,3 or (staff only) PATCH [{"id": 1, ...}, ...]: many patients in one request"""
+        return batch_response(request, self.get_queryset(), self.get_row_serializer(), PatientSerializer)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return export_response(request, 'patients')
 
 
-class DoctorViewSet(viewsets.ModelViewSet):
-    queryset = Doctor.objects.all()
+class DoctorViewSet(SparseFieldsetMixin, ReplicaReadsMixin, viewsets.ModelViewSet):
+    queryset = Doctor.objects.select_related('user')
     serializer_class = DoctorSerializer
+    row_serializer = DOCTOR_SERIALIZER
     
     def get_permissions(self):
         if self.action in ['create']:
             permission_classes = [AllowAny]
+        elif self.action in ['directory_cache_stats', 'export'] or (
+                self.action == 'batch' and self.request.method == 'PATCH'):
+            permission_classes = [IsAdminUser]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
@@ -328,35 +476,143 @@ class DoctorViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
     
+    def list(self, request, *args, **kwargs):
+        # Read-only fast path; same output as DoctorSerializer(many=True)
+        serializer = self.get_row_serializer()
+        rows = serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page, request))
+        return Response(serializer.many(rows, request))
+
     @action(detail=False, methods=['get'])
     def my_profile(self, request):
         try:
-            doctor = Doctor.objects.get(user=request.user)
-            serializer = DoctorSerializer(doctor, context={'request': request})
-            return Response(serializer.data)
+            doctor = self.get_profile_queryset(Doctor.objects.select_related('user')).get(user=request.user)
         except Doctor.DoesNotExist:
             return Response(
                 {'error': 'Doctor profile not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        # Answer revalidation before serializing anything
+        etag, last_modified = profile_validators(request, doctor, doctor.user)
+        response = precondition_response(request, etag, last_modified)
+        if response is None:
+            serializer = DoctorSerializer(doctor, context={'request': request}, fieldset=self.fieldset)
+            response = set_validators(Response(serializer.data), etag, last_modified)
+        return response
     
     @action(detail=False, methods=['put', 'patch'])
     def update_profile(self, request):
-        try:
-            doctor = Doctor.objects.get(user=request.user)
-        except Doctor.DoesNotExist:
-            return Response(
-                {'error': 'Doctor profile not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        serializer = DoctorSerializer(doctor, data=request.data, partial=True, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        return update_profile_response(request, Doctor, DoctorSerializer, self.fieldset)
     
     @action(detail=False, methods=['get'])
     def verified_doctors(self, request):
-        doctors = Doctor.objects.filter(is_verified=True)
-        serializer = DoctorSerializer(doctors, many=True, context={'request': request})
-        return Response(serializer.data)
\ No newline at end of file
+        specialization = request.query_params.get('specialization')
+        if specialization and specialization not in dict(Doctor.SPECIALIZATION_CHOICES):
+            return Response(
+                {'error': 'Invalid specialization.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        paginator = DirectoryPagination()
+        paginator.link_params = ('specialization', FIELDS_PARAM, EXCLUDE_PARAM)
+
+        def render():
+            doctors = Doctor.objects.select_related('user').filter(is_verified=True).order_by('id')
+            if specialization:
+                doctors = doctors.filter(specialization=specialization)
+            serializer = self.get_row_serializer(extra=['updated_at'])
+            # user__updated_at rides along after the plan's columns, for the ETag
+            rows = doctors.values_list(*serializer.lookups, 'user__updated_at', named=True)
+            page = paginator.paginate_queryset(rows, request, view=self)
+            # Everything the page body depends on, for the ETag
+            versions = [(row.id, row.updated_at, row.user__updated_at) for row in page]
+            last_modified = max((max(v[1:]) for v in versions), default=None)
+            return {
+                'data': paginator.get_paginated_response(serializer.many(page, request)).data,
+                'versions': (paginator.page.paginator.count, tuple(versions)),
+                'last_modified': last_modified,
+            }
+
+        # Links and picture URLs are absolute, so the host is part of the key.
+        # The rest is what the links carry: other params don't change the page.
+        key = (request.scheme, request.get_host(), paginator.link_query(request))
+        # Fill the cache from the primary: a page rendered from a lagging
+        # replica would outlive the invalidation its write triggered
+        with primary_reads():
+            cached, hit = verified_doctors_cache.get_or_compute(key, render)
+        etag = make_etag(request, 'verified_doctors', cached['versions'])
+        response = precondition_response(request, etag, cached['last_modified'])
+        if response is None:
+            response = set_validators(Response(cached['data']), etag, cached['last_modified'])
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Verified doctors by text, specialization, location and experience, with facet counts"""
+        try:
+            params = parse_search_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        def render():
+            doctors, ranked = filtered_doctors(params)
+            paginator = DoctorSearchPagination()
+            serializer = self.get_row_serializer()
+            lookups = serializer.lookups
+            if ranked:
+                paginator.ordering = paginator.ranked_ordering
+                lookups = lookups + ['search_rank']
+            page = paginator.paginate_queryset(doctors.values_list(*lookups, named=True), request, view=self)
+            data = paginator.get_paginated_response(serializer.many(page, request)).data
+            data['count'], data['facets'] = facet_counts(params)
+            return data
+
+        # As verified_doctors: absolute links, filled from the primary
+        key = (
+            'search', request.scheme, request.get_host(), tuple(sorted(params.items())),
+            request.query_params.get('cursor', ''), request.query_params.get('page_size', ''), self.fieldset,
+        )
+        with primary_reads():
+            data, hit = verified_doctors_cache.get_or_compute(key, render)
+        response = Response(data)
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """The verified doctors nearest to ?pincode=, within ?radius= km"""
+        try:
+            pincode, radius_km, limit = parse_nearby_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        location = pincode_location(pincode)
+        if location is None:
+            return Response({'error': 'Unknown pincode.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        nearest = doctor_locations.nearest(*location, radius_km, limit)
+        # The grid may lag other workers' writes; the row query has the last word on verification
+        doctors = Doctor.objects.filter(pk__in=[doctor_id for _, doctor_id in nearest], is_verified=True)
+        serializer = self.get_row_serializer()
+        rows = list(serializer.rows(doctors))
+        by_id = {row.id: doctor for row, doctor in zip(rows, serializer.many(rows, request))}
+        results = []
+        for distance, doctor_id in nearest:
+            if doctor_id in by_id:
+                results.append({**by_id[doctor_id], 'distance_km': round(distance, 2)})
+        return Response({'pincode': pincode, 'radius_km': radius_km, 'results': results})
+
+    @action(detail=False, methods=['get', 'patch'])
+    def batch(self, request):
+        """GET ?ids=1,2,3 or (staff only) PATCH [{"id": 1, ...}, ...]: many doctors in one request"""
+        return batch_response(request, self.get_queryset(), self.get_row_serializer(), DoctorSerializer)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return export_response(request, 'doctors')
+
+    @action(detail=False, methods=['get'])
+    def directory_cache_stats(self, request):
+        return Response(verified_doctors_cache.stats.snapshot())
\ No newline at end of file
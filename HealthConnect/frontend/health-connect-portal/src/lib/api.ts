@@ -166,7 +166,13 @@ class ApiService {
     search?: string;
     ordering?: string;
     page?: number;
-  }): Promise<{ results: User[]; count: number; next: string | null; previous: string | null }> {
+  }): Promise<{
+    results: User[];
+    count: number;
+    count_exact: boolean;
+    next: string | null;
+    previous: string | null;
+  }> {
     const queryParams = new URLSearchParams();
     if (params?.user_type) queryParams.append('user_type', params.user_type);
     if (params?.search) queryParams.append('search', params.search);
@@ -20,6 +20,9 @@ export default function Users() {
   const [userType, setUserType] = useState<string>('all');
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // False when the API estimated the count (or, for a filtered list, capped it)
+  const [countExact, setCountExact] = useState(true);
+  const [hasNext, setHasNext] = useState(false);
 
   useEffect(() => {
     loadUsers();
@@ -33,8 +36,15 @@ export default function Users() {
       if (userType !== 'all') params.user_type = userType;
 
       const response = await api.getUsers(params);
+      // Rows were deleted since the count: past the last page the API returns none
+      if (response.results.length === 0 && page > 1) {
+        setPage(1);
+        return;
+      }
       setUsers(response.results);
-      setTotalPages(Math.ceil(response.count / 10));
+      setTotalPages(Math.max(1, Math.ceil(response.count / 10)));
+      setCountExact(response.count_exact);
+      setHasNext(response.next !== null);
     } catch (error) {
       console.error('Failed to load users:', error);
     } finally {
@@ -42,6 +52,22 @@ export default function Users() {
     }
   };
 
+  // A new filter starts from its first page
+  const handleSearch = (value: string) => {
+    setSearch(value);
+    setPage(1);
+  };
+
+  const handleUserType = (value: string) => {
+    setUserType(value);
+    setPage(1);
+  };
+
+  const filtered = search !== '' || userType !== 'all';
+  const pageLabel = countExact
+    ? `Page ${page} of ${totalPages}`
+    : `Page ${page} of ${filtered ? 'at least' : 'about'} ${totalPages}`;
+
   const exportToCSV = () => {
     const headers = ['Username', 'Email', 'Name', 'User Type'];
     const rows = users.map(user => [
@@ -91,8 +117,8 @@ export default function Users() {
             <div className="flex flex-col md:flex-row gap-4 items-start md:items-center justify-between">
               <CardTitle>All Users</CardTitle>
               <div className="flex gap-2 w-full md:w-auto">
-                <SearchBar onSearch={setSearch} placeholder="Search users..." />
-                <Select value={userType} onValueChange={setUserType}>
+                <SearchBar onSearch={handleSearch} placeholder="Search users..." />
+                <Select value={userType} onValueChange={handleUserType}>
                   <SelectTrigger className="w-[150px]">
                     <SelectValue placeholder="Filter by type" />
                   </SelectTrigger>
@@ -172,7 +198,7 @@ export default function Users() {
                 {/* Pagination */}
                 <div className="flex items-center justify-between mt-4">
                   <p className="text-sm text-muted-foreground">
-                    Page {page} of {totalPages}
+                    {pageLabel}
                   </p>
                   <div className="flex gap-2">
                     <Button
@@ -186,8 +212,8 @@ export default function Users() {
                     <Button
                       variant="outline"
                       size="icon"
-                      onClick={() => setPage(p => Math.min(totalPages, p + 1))}
-                      disabled={page === totalPages}
+                      onClick={() => setPage(p => p + 1)}
+                      disabled={!hasNext}
                     >
                       <ChevronRight className="h-4 w-4" />
                     </Button>